@@ -1,26 +1,52 @@
 import sys
 import os
+import io
 import json
 import base64
 import re
+import mmap
+import hashlib
+import mimetypes
 import socket
+import smtplib
+import ssl
+import sqlite3
 import openpyxl
 from openpyxl.styles import PatternFill
 import threading
 import time
+import random
+import datetime
+import heapq
+import zoneinfo
+import queue
+import shutil
+import tempfile
+import cProfile
+import pstats
+import tracemalloc
+import traceback
+import asyncio
+import importlib.util
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import requests
+from collections import OrderedDict, deque
+from itertools import zip_longest
+from html.parser import HTMLParser
+from contextlib import contextmanager
 
 # --- PyQt5 Imports ---
 try:
     from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                                 QHBoxLayout, QPushButton, QLabel, QListWidget, 
+                                 QHBoxLayout, QPushButton, QLabel, QListWidget, QListWidgetItem, 
                                  QTextEdit, QMessageBox, QFileDialog, QInputDialog, 
                                  QCheckBox, QDialog, QFrame, QGridLayout, QGraphicsDropShadowEffect, 
                                  QSizePolicy, QProgressBar, QDialogButtonBox, QLineEdit, QTableWidget, 
-                                 QTableWidgetItem, QHeaderView, QAbstractItemView, QAction, QMenu, QStackedLayout)
+                                 QTableWidgetItem, QHeaderView, QAbstractItemView, QAction, QActionGroup, QMenu, QStackedLayout,
+                                 QFormLayout, QSpinBox, QDateTimeEdit, QComboBox)
     from PyQt5.QtWebEngineWidgets import QWebEngineView
-    from PyQt5.QtCore import Qt, QThread, pyqtSignal, QObject, QMutex, QWaitCondition, QSize, QPropertyAnimation, QRectF, QTimer, QRect
-    from PyQt5.QtGui import QPixmap, QIcon, QFont, QColor, QPalette, QLinearGradient, QBrush, QGradient, QCursor, QTextCursor, QPainter, QPen
+    from PyQt5.QtCore import Qt, QThread, pyqtSignal, QObject, QMutex, QWaitCondition, QSize, QPropertyAnimation, QRectF, QTimer, QRect, QUrl, QDateTime
+    from PyQt5.QtGui import QPixmap, QIcon, QFont, QColor, QPalette, QLinearGradient, QBrush, QGradient, QCursor, QTextCursor, QPainter, QPen, QDesktopServices
 except ImportError:
     print("CRITICAL ERROR: PyQt5 or PyQtWebEngine is missing.")
     print("Please run: pip install PyQt5 PyQtWebEngine")
@@ -31,17 +57,92 @@ from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email.mime.image import MIMEImage
-from email import encoders
+from email.parser import BytesHeaderParser
+from email.utils import getaddresses, make_msgid, parseaddr
+
+# --- Optional: async HTTP client for the async Gmail transport ---
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# --- Optional: Pillow for inline image recompression ---
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 # --- GLOBALS & CONSTANTS ---
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly',
           'https://www.googleapis.com/auth/gmail.send',
           'https://www.googleapis.com/auth/userinfo.profile']
+SMTP_SCOPE = 'https://mail.google.com/' # Only scope Gmail accepts for SMTP XOAUTH2; requested when the SMTP backend is chosen
 PROGRESS_FILE = "mail_merge_progress.json"
+RESUME_INDEX_FILE = "mail_merge_progress.idx" # Completed / failed row bitmaps for Resume
+CHECKPOINT_ROWS = 200 # Journal status changes at least every N recorded rows...
+CHECKPOINT_SECONDS = 15 # ...or every T seconds, whichever comes first
+RECONCILE_BATCH = 100 # messages.get calls per batch request when reconciling (Gmail's hard cap)
+RECONCILE_WORKERS = 2 # Reconciliation batch requests in flight at once
+RECONCILE_BUSY_DELAY = 2.0 # Pause before each reconciliation batch while a campaign is sending
+BOUNCE_SENDER_RE = re.compile(r'mailer-daemon|postmaster', re.IGNORECASE) # From of delivery status notifications
+RATE_LIMIT_POLL = 0.25 # Seconds between Stop checks while a campaign waits for shared quota
+RATE_LIMIT_BURST_SECONDS = 10 # Seconds of quota that may go out at once (Gmail's per-user rate is a moving average)
+CAMPAIGN_MAX_WEIGHT = 10 # Highest priority weight in the Campaign Manager
+SUPPRESSION_DB = "mail_merge_suppression.db"
+PROFILE_CACHE_FILE = "mail_merge_profile.json" # Profile, send-as aliases and avatar of the signed-in account
+PROFILE_CACHE_TTL = 24 * 3600 # Seconds before the cached profile is fetched again
+DRAFT_CACHE_FILE = "mail_merge_drafts.json" # Draft subjects + the historyId they are current as of
+DRAFT_FETCH_BATCH = 50 # drafts.get calls per batch request when subjects must be (re)fetched
+HTTP_TIMEOUT = (5, 15) # (connect, read) seconds for plain HTTP fetches such as the avatar
+SCHEDULE_FILE = "mail_merge_schedule.json" # Queued (scheduled) campaigns
+SCHEDULE_CHECK_MS = 30000 # How often the app looks for a due scheduled campaign
+METRICS_DIR = "mail_merge_metrics" # Per-campaign JSON / Prometheus snapshots
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30) # Send latency histogram bounds (seconds)
+DIAGNOSTICS_DIR = "mail_merge_diagnostics" # cProfile / tracemalloc dumps (one timestamped folder per session)
+GMAIL_SEND_URL = "https://gmail.googleapis.com/gmail/v1/users/me/messages/send"
+ASYNC_MAX_IN_FLIGHT = 200 # Concurrent sends on the async transport's event loop
+API_SEND_WORKERS = 16 # Max concurrent sends on the standard Gmail API backend (one service per thread)
+BATCH_MAX_CALLS = 50 # Sub-requests per Gmail batch request (Gmail's recommended ceiling; the hard cap is 100)
+BATCH_MAX_BYTES = 8 * 1024 * 1024 # Encoded payload per batch request
+BATCH_SINGLE_MAX_BYTES = 4 * 1024 * 1024 # Encoded messages above this go alone through media upload
+BATCH_PART_OVERHEAD = 600 # Multipart framing + JSON envelope per sub-request (bytes)
+BATCH_LOOKAHEAD = 150 # Submitted messages packed together (first-fit decreasing)
+BATCH_FLUSH_SECONDS = 0.25 # A partial window is packed after this long without new submits
+BATCH_WORKERS = 4 # Batch requests in flight at once
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587 # STARTTLS submission port
+SMTP_POOL_SIZE = 4 # Persistent SMTP connections (one per sender thread)
+SMTP_MESSAGES_PER_SESSION = 100 # Messages sent on one connection before it is reopened
+SMTP_TIMEOUT = 60 # Seconds per SMTP command
+SMTP_SEND_QUOTA_UNITS = 25 # Share of the account-wide send budget per SMTP message (no API quota; caps SMTP at ~10/s)
+AIMD_INITIAL_LIMIT = 4 # In-flight sends the adaptive controller starts with
+AIMD_WINDOW = 20 # Completed sends between additive increases
+AIMD_P95_TARGET_SECONDS = 5.0 # Rolling p95 send latency above this halves the limit
+SEND_MAX_RETRIES = 5 # Retries of a throttled (429 / rate limit / 5xx) send before the row fails
+SEND_RETRY_MAX_DELAY = 32 # Cap on the exponential retry backoff (seconds)
+PIPELINE_WORKERS = {'validate': 1, 'render': 2, 'mime': 2} # Threads per send-pipeline stage
+PIPELINE_QUEUE_SIZE = 64 # Bound on each inter-stage queue (backpressure)
+TOKEN_REFRESH_MARGIN = 300 # Refresh the access token this many seconds before it expires
+ATTACHMENT_CACHE_BYTES = 256 * 1024 * 1024 # Encoded attachment parts kept in memory (LRU, shared by all campaigns)
+ATTACHMENT_FILE_COLUMNS = ['attachment files', 'attachment file', 'attach files', 'attach file'] # Per-row files; a plain 'File' column is ordinary data
+IMAGE_MAX_WIDTH = 1200 # Inline images wider than this are scaled down (email bodies rarely show more)
+IMAGE_JPEG_QUALITY = 82 # Re-encode quality for inline JPEGs
+IMAGE_MIN_SAVINGS = 0.10 # Keep a recompressed image only if it is at least 10% smaller
+IMAGE_CACHE_SIZE = 64 # Optimized images kept in memory by content hash (LRU)
+PREVIEW_CACHE_SIZE = 64 # Rendered preview rows kept in memory (LRU)
+PREVIEW_PREFETCH_RADIUS = 3 # Neighbours rendered ahead of Prev/Next clicks
+
+# Gmail limits used by the pre-flight check
+GMAIL_MAX_MESSAGE_BYTES = 25 * 1024 * 1024 # Total message size incl. attachments
+GMAIL_SEND_QUOTA_UNITS = 100 # Quota units per messages.send call
+GMAIL_QUOTA_UNITS_PER_SECOND = 250 # Per-user quota rate
+GMAIL_DAILY_SEND_LIMIT = 500 # Consumer accounts (Workspace allows 2000)
+EMAIL_RE = re.compile(r'^[^@\s<>(),;:"\[\]]+@[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}$')
 
 # --- UTILITY FUNCTIONS ---
 def resource_path(relative_path):
@@ -80,10 +181,14 @@ def extract_body_and_attachments(payload, msg_id, service):
 
     return html, attachments
 
+def placeholder_name(header):
+    """Name a header is written as inside {{...}}: clean_placeholders strips the same outer whitespace."""
+    return str(header).strip()
+
 def personalize(text, row_data, headers):
     for i, header in enumerate(headers):
         value = row_data[i]
-        placeholder = f"{{{{{header}}}}}"
+        placeholder = f"{{{{{placeholder_name(header)}}}}}"
         
         if value is not None and str(value).strip() != "":
             text = text.replace(placeholder, str(value))
@@ -101,10 +206,10 @@ def personalize(text, row_data, headers):
     text = re.sub(r'^\s*[,.]\s*', '', text)
     return text
 
-def clean_personalization(text, row_data, headers):
+def clean_placeholders(text):
     """
-    Robust cleaning: Finds {{...}} blocks and strips internal HTML tags/whitespace
-    before passing to the standard personalize function.
+    Robust cleaning: Finds {{...}} blocks and strips internal HTML tags/whitespace.
+    Row independent, so callers rendering many rows should run it once per template.
     """
     if not text: return ""
 
@@ -128,9 +233,338 @@ def clean_personalization(text, row_data, headers):
 
     # Regex: Matches {{...}} where ... is distinct from just }}
     # Using non-greedy match to find minimal pairs
-    text = re.sub(r'\{\{(.+?)\}\}', strip_tags, text, flags=re.DOTALL)
-    
-    return personalize(text, row_data, headers)
+    return re.sub(r'\{\{(.+?)\}\}', strip_tags, text, flags=re.DOTALL)
+
+def template_placeholders(*texts):
+    """Placeholder names in the templates, one per occurrence, as personalize() will look them up."""
+    return [name for text in texts for name in re.findall(r'\{\{(.+?)\}\}', clean_placeholders(text), flags=re.DOTALL)]
+
+def clean_personalization(text, row_data, headers):
+    """
+    Cleans {{...}} blocks (see clean_placeholders) before passing to the standard personalize function.
+    """
+    if not text: return ""
+    return personalize(clean_placeholders(text), row_data, headers)
+
+def resolve_inline_images(html, attachments, target_dir):
+    """
+    Writes inline (Content-ID) images to target_dir once and rewrites their
+    cid: references to local file URLs, so a web view can render them.
+    """
+    if not html: return ""
+    for mime, fname, fdata, cid in attachments:
+        if not (mime.startswith('image/') and cid):
+            continue
+        cid_value = cid.strip('<>')
+        safe_name = re.sub(r'[^A-Za-z0-9._-]', '_', cid_value)
+        ext = mime.split('/')[1]
+        path = os.path.join(target_dir, f"{safe_name}.{ext}")
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(fdata)
+        html = html.replace(f"cid:{cid_value}", QUrl.fromLocalFile(path).toString())
+    return html
+
+# --- TEMPLATE OPTIMIZATION ---
+# One pass over a campaign's HTML body before any row is rendered: every byte saved here
+# is saved (base64-inflated) once per recipient.
+BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'body', 'br', 'center', 'dd', 'div', 'dl', 'dt', 'footer',
+              'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'head', 'header', 'hr', 'html', 'li', 'meta', 'ol', 'p',
+              'pre', 'section', 'style', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'title', 'tr', 'ul'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+SIMPLE_SELECTOR_RE = re.compile(r'([a-zA-Z][a-zA-Z0-9]*)?((?:[.#][A-Za-z_][-\w]*)*)')
+
+def parse_style(text):
+    """Inline style text -> {property: value}; later duplicates win unless the earlier one is !important."""
+    declarations = {}
+    for chunk in re.split(r';(?![^(]*\))', text or ""):
+        if ':' not in chunk: continue
+        prop, value = chunk.split(':', 1)
+        prop, value = prop.strip().lower(), re.sub(r'\s+', ' ', value.strip())
+        if not prop or not value: continue
+        if '!important' in declarations.get(prop, '') and '!important' not in value: continue
+        declarations.pop(prop, None) # Re-insert so the surviving declaration keeps its last position
+        declarations[prop] = value
+    return declarations
+
+def format_style(declarations):
+    return ";".join(f"{k}:{v}" for k, v in declarations.items())
+
+def parse_css_rules(css):
+    """
+    Splits <style> text into (rules, leftover): rules are (specificity, order, tag, classes, id, declarations)
+    for simple selectors (tag, .class, #id, tag.class); @-rules, pseudo-classes and combinators stay as CSS.
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    rules, leftover, pos = [], [], 0
+    while True:
+        brace = css.find('{', pos)
+        if brace == -1: break
+        depth, end = 1, brace + 1
+        while end < len(css) and depth:
+            depth += {'{': 1, '}': -1}.get(css[end], 0)
+            end += 1
+        prelude, body = css[pos:brace].strip(), css[brace + 1:end - 1]
+        pos = end
+        if prelude.startswith('@'):
+            leftover.append(f"{prelude}{{{body.strip()}}}")
+            continue
+        declarations = parse_style(body)
+        for selector in (sel.strip() for sel in prelude.split(',')):
+            match = SIMPLE_SELECTOR_RE.fullmatch(selector)
+            if not selector or not match:
+                if selector: leftover.append(f"{selector}{{{format_style(declarations)}}}")
+                continue
+            tag, rest = (match.group(1) or "").lower(), match.group(2)
+            classes = set(re.findall(r'\.([-\w]+)', rest))
+            ids = re.findall(r'#([-\w]+)', rest)
+            specificity = (len(ids), len(classes), 1 if tag else 0)
+            rules.append((specificity, len(rules), tag, classes, ids[0] if ids else None, declarations))
+    return rules, "".join(leftover)
+
+class TemplateOptimizer(HTMLParser):
+    """
+    Rebuilds HTML minified: comments (except Outlook conditionals) and scripts dropped, whitespace
+    collapsed, simple <style> rules inlined and merged with each element's own style, classes no
+    longer styled by anything removed, attribute-less and empty <span>s unwrapped or dropped.
+    Use optimize_template(), which also keeps {{placeholders}} intact.
+    """
+
+    def __init__(self, rules, leftover_css):
+        super().__init__(convert_charrefs=False)
+        self.rules = rules
+        self.leftover_css = leftover_css
+        self.tokens = [] # ('start', tag, attrs) / ('end', tag) / ('text', s, inside <pre>) / ('raw', s)
+        self.pre_depth = 0
+        self.skip_depth = 0 # Inside <script> / <style>
+        self.style_emitted = False
+        self.spans = [] # Per open <span>: True when its tags were dropped
+        self.stats = {'comments': 0, 'spans': 0, 'inlined': 0}
+
+    def emit_start(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = set((attrs.get('class') or "").split())
+        matched = sorted(r for r in self.rules if (not r[2] or r[2] == tag) and r[3] <= classes and (not r[4] or r[4] == attrs.get('id')))
+        style = {}
+        for rule in matched:
+            style.update(rule[5])
+        if matched: self.stats['inlined'] += 1
+        style.update(parse_style(attrs.get('style')))
+        if style: attrs['style'] = format_style(style)
+        else: attrs.pop('style', None)
+        # Classes only matter to leftover CSS (or Gmail's own gmail_* markers)
+        kept = [c for c in (attrs.get('class') or "").split() if c.startswith('gmail') or f".{c}" in self.leftover_css]
+        if kept: attrs['class'] = " ".join(kept)
+        else: attrs.pop('class', None)
+        return attrs
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self.skip_depth += 1
+            if tag == 'style' and not self.style_emitted:
+                self.style_emitted = True
+                if self.leftover_css: self.tokens.append(('raw', f"<style>{self.leftover_css}</style>"))
+            return
+        if self.skip_depth: return
+        attrs = self.emit_start(tag, attrs)
+        if tag == 'span':
+            self.spans.append(not attrs)
+            if not attrs:
+                self.stats['spans'] += 1
+                return
+        if tag in ('pre', 'textarea'): self.pre_depth += 1
+        self.tokens.append(('start', tag, attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        if self.skip_depth or tag in ('script', 'style'): return
+        self.tokens.append(('start', tag, self.emit_start(tag, attrs)))
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style'):
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth or tag in VOID_TAGS: return
+        if tag == 'span' and self.spans and self.spans.pop():
+            return # Unwrapped
+        if tag == 'span' and self.tokens and self.tokens[-1][:2] == ('start', 'span'):
+            self.tokens.pop() # <span ...></span> with nothing inside
+            self.stats['spans'] += 1
+            return
+        if tag in ('pre', 'textarea'): self.pre_depth = max(0, self.pre_depth - 1)
+        self.tokens.append(('end', tag))
+
+    def handle_data(self, data):
+        if self.skip_depth: return
+        self.tokens.append(('text', data if self.pre_depth else re.sub(r'\s+', ' ', data), bool(self.pre_depth)))
+
+    def handle_entityref(self, name):
+        if not self.skip_depth: self.tokens.append(('raw', f"&{name};"))
+
+    def handle_charref(self, name):
+        if not self.skip_depth: self.tokens.append(('raw', f"&#{name};"))
+
+    def handle_comment(self, data):
+        if data.startswith('[if') or data.startswith('<![endif]'):
+            self.tokens.append(('raw', f"<!--{data}-->")) # Outlook conditional comment
+        else:
+            self.stats['comments'] += 1
+
+    def handle_decl(self, decl):
+        self.tokens.append(('raw', f"<!{decl}>"))
+
+    def unknown_decl(self, data):
+        self.tokens.append(('raw', f"<![{data}]>"))
+
+    def handle_pi(self, data):
+        self.tokens.append(('raw', f"<?{data}>"))
+
+    def render(self):
+        def is_block(token):
+            return token is None or (token[0] in ('start', 'end') and token[1] in BLOCK_TAGS)
+
+        out = []
+        tokens = self.tokens
+        for i, token in enumerate(tokens):
+            kind = token[0]
+            if kind == 'text':
+                text = token[1]
+                if not token[2] and not text.strip():
+                    # Whitespace next to block-level tags is not rendered
+                    prev_token = tokens[i - 1] if i else None
+                    next_token = tokens[i + 1] if i + 1 < len(tokens) else None
+                    if is_block(prev_token) or is_block(next_token): continue
+                out.append(text)
+            elif kind == 'start':
+                attrs = "".join(f' {k}' if v is None else f' {k}="{v.replace("&", "&amp;").replace(chr(34), "&quot;")}"'
+                                for k, v in token[2].items())
+                out.append(f"<{token[1]}{attrs}>")
+            elif kind == 'end':
+                out.append(f"</{token[1]}>")
+            else:
+                out.append(token[1])
+        return "".join(out)
+
+def optimize_template(html):
+    """
+    Returns (optimized html, report) for a campaign body. {{placeholders}} are cleaned
+    (clean_placeholders) and shielded from the parser, so personalize() sees them unchanged.
+    Inlining copies a rule onto every element it matches, so when that makes the body bigger
+    the <style> block is kept instead; if nothing makes it smaller the cleaned html is returned.
+    report: original_bytes, optimized_bytes, saved_bytes, inlined, comments, spans.
+    """
+    html = clean_placeholders(html)
+    original = len(html.encode('utf-8'))
+    placeholders = []
+
+    def shield(match):
+        placeholders.append(match.group(0))
+        return f"MMPH{len(placeholders) - 1}Q"
+
+    shielded = re.sub(r'\{\{.+?\}\}', shield, html, flags=re.DOTALL)
+    styles = re.findall(r'<style[^>]*>(.*?)</style>', shielded, flags=re.DOTALL | re.IGNORECASE)
+    css = "\n".join(styles)
+
+    def rewrite(rules, leftover_css):
+        parser = TemplateOptimizer(rules, leftover_css)
+        parser.feed(shielded)
+        parser.close()
+        return re.sub(r'MMPH(\d+)Q', lambda m: placeholders[int(m.group(1))], parser.render().strip()), parser.stats
+
+    rules, leftover_css = parse_css_rules(css)
+    optimized, stats = rewrite(rules, leftover_css)
+    if rules and len(optimized.encode('utf-8')) >= original:
+        optimized, stats = rewrite([], re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL).strip())
+    if len(optimized.encode('utf-8')) >= original:
+        optimized, stats = html, dict.fromkeys(stats, 0)
+    size = len(optimized.encode('utf-8'))
+    report = dict(stats, original_bytes=original, optimized_bytes=size, saved_bytes=original - size)
+    return optimized, report
+
+def describe_template_savings(report, recipients):
+    """One log line: bytes saved per message and, base64-inflated, across the campaign."""
+    per_message = report['saved_bytes']
+    if per_message <= 0:
+        return f"🗜 Template kept as is ({report['original_bytes']:,} bytes): optimizing would not make it smaller."
+    pct = per_message / report['original_bytes'] * 100 if report['original_bytes'] else 0
+    campaign = per_message * 4 / 3 * max(recipients, 0)
+    campaign_text = f"{campaign / (1024 * 1024):.1f} MB" if campaign >= 1024 * 1024 else f"{campaign / 1024:.0f} KB"
+    return (f"🗜 Template optimized: {report['original_bytes']:,} → {report['optimized_bytes']:,} bytes "
+            f"per message (-{pct:.0f}%), ~{campaign_text} less upload across {recipients} recipient(s). "
+            f"{report['inlined']} element(s) got inlined CSS, {report['comments']} comment(s) and {report['spans']} empty span(s) removed.")
+
+IMAGE_CACHE = OrderedDict() # sha256 of the original bytes -> optimized bytes
+IMAGE_CACHE_LOCK = threading.Lock()
+
+def recompress_image(data, mime):
+    """
+    Smaller PNG/JPEG bytes for an inline image (scaled to IMAGE_MAX_WIDTH, re-encoded), or the
+    original when Pillow is missing, the format is anything else, or the gain is under IMAGE_MIN_SAVINGS.
+    Results are cached by content hash, so the same logo is only processed once per process.
+    """
+    if Image is None or mime not in ('image/png', 'image/jpeg', 'image/jpg'):
+        return data
+    digest = hashlib.sha256(data).hexdigest()
+    with IMAGE_CACHE_LOCK:
+        if digest in IMAGE_CACHE:
+            IMAGE_CACHE.move_to_end(digest)
+            return IMAGE_CACHE[digest]
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            if img.width > IMAGE_MAX_WIDTH:
+                img = img.resize((IMAGE_MAX_WIDTH, max(1, round(img.height * IMAGE_MAX_WIDTH / img.width))), Image.LANCZOS)
+            out = io.BytesIO()
+            if mime == 'image/png':
+                img.save(out, format='PNG', optimize=True)
+            else:
+                img.convert('RGB').save(out, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+        result = out.getvalue() if len(out.getvalue()) <= len(data) * (1 - IMAGE_MIN_SAVINGS) else data
+    except Exception:
+        result = data # Unreadable image: send it as it came
+    with IMAGE_CACHE_LOCK:
+        IMAGE_CACHE[digest] = result
+        while len(IMAGE_CACHE) > IMAGE_CACHE_SIZE: IMAGE_CACHE.popitem(last=False)
+    return result
+
+def optimize_inline_images(html, attachments, recompress=True):
+    """
+    Once per campaign: inline images with identical bytes are merged into one part (their cid:
+    references rewritten to the kept Content-ID) and, with Pillow installed, PNG/JPEG are
+    recompressed. Returns (html, attachments, report); other attachments pass through untouched.
+    """
+    report = {'images': 0, 'duplicates': 0, 'recompressed': 0, 'original_bytes': 0, 'optimized_bytes': 0}
+    kept_by_hash = {}
+    result = []
+    for mime, fname, fdata, cid in attachments:
+        if not (mime.startswith('image/') and cid):
+            result.append((mime, fname, fdata, cid))
+            continue
+        report['images'] += 1
+        report['original_bytes'] += len(fdata)
+        digest = hashlib.sha256(fdata).hexdigest()
+        if digest in kept_by_hash:
+            kept_cid = kept_by_hash[digest].strip('<>')
+            html = re.sub(r'cid:' + re.escape(cid.strip('<>')) + r'(?=["\'\s)>]|$)', f"cid:{kept_cid}", html)
+            report['duplicates'] += 1
+            continue
+        kept_by_hash[digest] = cid
+        if recompress:
+            smaller = recompress_image(fdata, mime.lower())
+            if len(smaller) < len(fdata): # The cache hands back an equal copy for images it could not shrink
+                report['recompressed'] += 1
+                fdata = smaller
+        report['optimized_bytes'] += len(fdata)
+        result.append((mime, fname, fdata, cid))
+    report['saved_bytes'] = report['original_bytes'] - report['optimized_bytes']
+    return html, result, report
+
+def describe_image_savings(report, recipients):
+    campaign = report['saved_bytes'] * 4 / 3 * max(recipients, 0)
+    campaign_text = f"{campaign / (1024 * 1024):.1f} MB" if campaign >= 1024 * 1024 else f"{campaign / 1024:.0f} KB"
+    return (f"🖼 Inline images: {report['images']} → {report['images'] - report['duplicates']} part(s), "
+            f"{report['original_bytes'] / 1024:.0f} → {report['optimized_bytes'] / 1024:.0f} KB per message "
+            f"({report['duplicates']} duplicate(s) merged, {report['recompressed']} recompressed); "
+            f"~{campaign_text} less upload across {recipients} recipient(s).")
 
 def get_email_recipients(row_values, all_headers, cc_mode, global_cc, bcc_mode, global_bcc):
     """
@@ -183,6 +617,2378 @@ def get_email_recipients(row_values, all_headers, cc_mode, global_cc, bcc_mode,
         
     return recipient, cc_str, bcc_str
 
+# --- METRICS & STAGE TIMING ---
+def histogram_percentile(hist, pct):
+    """Upper bound of the bucket holding the pct-th observation of a snapshot histogram."""
+    target = hist['count'] * pct / 100.0
+    running = 0
+    for bound, n in zip(list(hist['bounds']) + [float('inf')], hist['buckets']):
+        running += n
+        if running >= target:
+            return bound
+    return float('inf')
+
+class CampaignMetrics:
+    """
+    Thread-safe per-stage timers, counters, gauges and latency histograms for one worker run.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.timers = {} # stage -> [calls, total seconds, max seconds]
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {} # name -> {'buckets': [...], 'sum': s, 'count': n}
+        self.history = {} # name -> [[elapsed seconds, value], ...] (e.g. concurrency limit changes)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def record_history(self, name, value, limit=500):
+        with self.lock:
+            points = self.history.setdefault(name, [])
+            points.append([round(time.time() - self.started, 2), value])
+            del points[:-limit]
+
+    def observe(self, name, seconds):
+        with self.lock:
+            hist = self.histograms.setdefault(name, {'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'sum': 0.0, 'count': 0})
+            slot = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            hist['buckets'][slot] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            return {
+                'name': self.name,
+                'started': self.started,
+                'elapsed_seconds': elapsed,
+                'stages': {k: {'calls': v[0], 'total_seconds': v[1], 'max_seconds': v[2]} for k, v in self.timers.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {k: {'bounds': list(LATENCY_BUCKETS), 'buckets': list(v['buckets']), 'sum': v['sum'], 'count': v['count']}
+                               for k, v in self.histograms.items()},
+                'history': {k: [list(p) for p in v] for k, v in self.history.items()},
+            }
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        label = f'campaign="{self.name}"'
+        lines = []
+        for stage, t in snap['stages'].items():
+            lines.append(f'mail_merge_stage_seconds_total{{{label},stage="{stage}"}} {t["total_seconds"]:.6f}')
+            lines.append(f'mail_merge_stage_calls_total{{{label},stage="{stage}"}} {t["calls"]}')
+        for name, value in snap['counters'].items():
+            lines.append(f'mail_merge_{name}_total{{{label}}} {value}')
+        for name, value in snap['gauges'].items():
+            lines.append(f'mail_merge_{name}{{{label}}} {value}')
+        for name, hist in snap['histograms'].items():
+            running = 0
+            for bound, n in zip(list(hist['bounds']) + ['+Inf'], hist['buckets']):
+                running += n
+                lines.append(f'mail_merge_{name}_bucket{{{label},le="{bound}"}} {running}')
+            lines.append(f'mail_merge_{name}_sum{{{label}}} {hist["sum"]:.6f}')
+            lines.append(f'mail_merge_{name}_count{{{label}}} {hist["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, folder=METRICS_DIR):
+        """Writes <name>_<timestamp>.json and .prom snapshots; returns the JSON path."""
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, f"{self.name}_{time.strftime('%Y%m%d_%H%M%S')}")
+        with open(base + ".json", 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        with open(base + ".prom", 'w') as f:
+            f.write(self.to_prometheus())
+        return base + ".json"
+
+# --- DIAGNOSTICS (PROFILING) ---
+class DiagnosticsSession:
+    """
+    Process-wide profiling switch toggled from the Diagnostics menu.
+    Worker threads run under profiled(); while active each run gets its own
+    cProfile dump, and tracemalloc top allocations are written per run and on stop.
+    Helper threads (pipeline stages, transport pools) profile into one cProfile per
+    thread under a group name (profiled_thread / call); save_groups() merges each
+    group's threads into a single dump.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.folder = None
+        self.lock = threading.Lock()
+        self.run_count = 0
+        self.thread_profilers = {} # (group, thread id) -> [cProfile.Profile, busy]
+
+    def start(self):
+        with self.lock:
+            self.folder = os.path.join(DIAGNOSTICS_DIR, time.strftime('%Y%m%d_%H%M%S'))
+            os.makedirs(self.folder, exist_ok=True)
+            self.run_count = 0
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25) # Keep 25 frames per allocation
+            self.active = True
+        return self.folder
+
+    def stop(self):
+        with self.lock:
+            if not self.active: return None
+            self.active = False
+            if tracemalloc.is_tracing():
+                self.write_allocations(tracemalloc.take_snapshot(), "tracemalloc_final")
+                tracemalloc.stop()
+            return self.folder
+
+    @contextmanager
+    def profiled(self, name):
+        if not self.active:
+            yield
+            return
+        profiler = cProfile.Profile() # cProfile only sees the thread that enables it
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.save_run(name, profiler)
+
+    @contextmanager
+    def profiled_thread(self, group):
+        """Profiles the block into this thread's profiler for `group` (kept for save_groups)."""
+        if not self.active:
+            yield
+            return
+        key = (group, threading.get_ident())
+        with self.lock:
+            entry = self.thread_profilers.setdefault(key, [cProfile.Profile(), False])
+            entry[1] = True
+        entry[0].enable()
+        try:
+            yield
+        finally:
+            entry[0].disable()
+            entry[1] = False
+
+    def call(self, group, fn, *args):
+        """Runs fn(*args) profiled under `group`; for tasks submitted to thread pools."""
+        with self.profiled_thread(group):
+            return fn(*args)
+
+    def save_groups(self):
+        """Writes one merged dump per group from every thread that is idle, and forgets those threads."""
+        with self.lock:
+            idle = [(key, entry[0]) for key, entry in self.thread_profilers.items() if not entry[1]]
+            for key, _ in idle: del self.thread_profilers[key]
+        groups = {}
+        for (group, _), profiler in idle:
+            if group in groups: groups[group].add(profiler)
+            else: groups[group] = pstats.Stats(profiler)
+        for group, stats in groups.items():
+            self.save_run(group, stats)
+
+    def save_run(self, name, profiler):
+        with self.lock:
+            if not self.folder: return
+            self.run_count += 1
+            base = os.path.join(self.folder, f"{self.run_count:02d}_{name}")
+        profiler.dump_stats(base + ".prof")
+        with open(base + "_top.txt", 'w') as f:
+            stats = pstats.Stats(profiler, stream=f) if isinstance(profiler, cProfile.Profile) else profiler
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(40)
+        if tracemalloc.is_tracing():
+            self.write_allocations(tracemalloc.take_snapshot(), os.path.basename(base) + "_tracemalloc")
+
+    def write_allocations(self, snapshot, name, limit=30):
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        with open(os.path.join(self.folder, name + ".txt"), 'w') as f:
+            current, peak = tracemalloc.get_traced_memory()
+            f.write(f"Current: {current / 1024:.0f} KiB, Peak: {peak / 1024:.0f} KiB\n\n")
+            for stat in snapshot.statistics('traceback')[:limit]:
+                f.write(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                f.write("\n".join(stat.traceback.format(limit=8)) + "\n\n")
+
+DIAGNOSTICS = DiagnosticsSession()
+
+# --- RECIPIENT DE-DUPLICATION & SUPPRESSION ---
+def normalize_address(address, fold_plus=False):
+    """
+    Canonical form used for duplicate/suppression matching:
+    'Name <A.User+tag@Mail.com >' -> 'a.user+tag@mail.com' ('a.user@mail.com' with fold_plus).
+    """
+    if not address: return ""
+    address = str(address).strip()
+    match = re.search(r'<([^>]+)>', address)
+    if match:
+        address = match.group(1)
+    address = address.strip().lower()
+    if fold_plus and '@' in address:
+        local, domain = address.rsplit('@', 1)
+        address = local.split('+', 1)[0] + '@' + domain
+    return address
+
+def build_recipient_index(addresses, fold_plus=False):
+    """
+    Hash index over a campaign's recipients: normalized address -> first row it appears on.
+    addresses is an iterable of (row_number, raw_address).
+    """
+    index = {}
+    for row, address in addresses:
+        key = normalize_address(address, fold_plus)
+        if key and key not in index:
+            index[key] = row
+    return index
+
+class SuppressionList:
+    """Persistent unsubscribe/do-not-mail list stored in SQLite."""
+
+    def __init__(self, path=SUPPRESSION_DB):
+        self.path = path
+        with self.connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS suppressed ("
+                         "address TEXT PRIMARY KEY, reason TEXT, added_at REAL)")
+
+    def connect(self):
+        return sqlite3.connect(self.path)
+
+    def load(self, fold_plus=False):
+        """Loads the whole list once into a set for O(1) lookups during a campaign."""
+        with self.connect() as conn:
+            return frozenset(normalize_address(a, fold_plus) for (a,) in conn.execute("SELECT address FROM suppressed"))
+
+    def add(self, addresses, reason="manual"):
+        rows = [(normalize_address(a), reason, time.time()) for a in addresses if normalize_address(a)]
+        with self.connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO suppressed VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def clear(self):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM suppressed")
+
+    def count(self):
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+
+# --- PER-ROW ATTACHMENTS ---
+def split_attachment_cell(value):
+    """Entries of a per-row attachment cell: separated by ';' or one per line."""
+    if value is None: return []
+    return [p.strip().strip('"') for p in re.split(r'[;\n]', str(value)) if p.strip().strip('"')]
+
+def resolve_row_attachments(value, draft_attachments, base_dir):
+    """
+    Maps a per-row attachment cell to [('draft', i) | ('file', path)]. An entry matching a draft
+    attachment's filename (case-insensitive) selects that attachment; anything else is a file
+    path, relative paths being resolved against base_dir (the Excel file's folder).
+    Raises FileNotFoundError naming the first entry that is neither.
+    """
+    by_name = {a[1].lower(): i for i, a in enumerate(draft_attachments) if a[1]}
+    resolved = []
+    for entry in split_attachment_cell(value):
+        if entry.lower() in by_name:
+            resolved.append(('draft', by_name[entry.lower()]))
+            continue
+        path = os.path.join(base_dir, os.path.expanduser(entry))
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Attachment not found: {entry}")
+        resolved.append(('file', os.path.abspath(path)))
+    return resolved
+
+class AttachmentCache:
+    """
+    Process-wide cache of base64-encoded attachment payloads keyed by content hash, so a file
+    attached to thousands of rows is read (through mmap) and encoded once. Paths are memoised
+    by size + mtime, so unchanged files are not re-hashed per row either.
+    """
+
+    def __init__(self, max_bytes=ATTACHMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.paths = {} # path -> (size, mtime_ns, sha256)
+        self.blobs = OrderedDict() # sha256 -> base64 text (LRU)
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, digest):
+        with self.lock:
+            encoded = self.blobs.get(digest)
+            if encoded is not None:
+                self.blobs.move_to_end(digest)
+                self.hits += 1
+            return encoded
+
+    def store(self, digest, data):
+        encoded = base64.encodebytes(data).decode('ascii').rstrip('\n')
+        with self.lock:
+            self.misses += 1
+            if digest not in self.blobs:
+                self.blobs[digest] = encoded
+                self.total += len(encoded)
+                while self.total > self.max_bytes and len(self.blobs) > 1:
+                    self.total -= len(self.blobs.popitem(last=False)[1])
+        return encoded
+
+    def encoded_bytes(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        return self.lookup(digest) or self.store(digest, data)
+
+    def encoded_file(self, path):
+        stat = os.stat(path)
+        with self.lock:
+            known = self.paths.get(path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            encoded = self.lookup(known[2])
+            if encoded is not None: return encoded
+        with open(path, 'rb') as f:
+            if not stat.st_size: # mmap cannot map an empty file
+                digest = hashlib.sha256(b"").hexdigest()
+                encoded = self.lookup(digest) or self.store(digest, b"")
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    digest = hashlib.sha256(data).hexdigest()
+                    encoded = self.lookup(digest) or self.store(digest, data)
+        with self.lock:
+            self.paths[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return encoded
+
+ATTACHMENT_CACHE = AttachmentCache()
+
+def encoded_part(mime, filename, encoded, cid=None):
+    """MIME part around an already base64-encoded payload (inline when it has a Content-ID)."""
+    maintype, subtype = mime.split('/', 1) if '/' in mime else ('application', 'octet-stream')
+    part = MIMEBase(maintype, subtype)
+    part.set_payload(encoded)
+    part['Content-Transfer-Encoding'] = 'base64'
+    if cid:
+        part.add_header('Content-ID', cid)
+        part.add_header('Content-Disposition', 'inline', filename=filename)
+    else:
+        part.add_header('Content-Disposition', 'attachment', filename=filename)
+    return part
+
+# --- PRE-FLIGHT VALIDATION ---
+def run_preflight(draft_data, all_headers, visible_headers, table, attachment_mode=True, attachment_empty_rule="yes", suppressed=frozenset(), fold_plus=False, base_dir="."):
+    """
+    Validates a whole campaign in one column-wise sweep before anything is sent.
+    table is a list of {'values': [...], 'index': excel_row} for every data row
+    (including rows without an Email). Returns a report dict.
+    """
+    started = time.perf_counter()
+    headers_lower = [str(h).strip().lower() for h in all_headers]
+    n_cols = len(all_headers)
+    row_numbers = [r['index'] for r in table]
+    
+    # Columnar view: one tuple per header, short rows padded with None
+    columns = list(zip_longest(*[r['values'] for r in table]))[:n_cols]
+    columns += [(None,) * len(table)] * (n_cols - len(columns))
+    
+    def column(names):
+        for name in names:
+            if name in headers_lower: return columns[headers_lower.index(name)]
+        return None
+
+    report = {'rows': len(table)}
+    
+    # 1. Addresses: missing, malformed, duplicated
+    emails = column(['email'])
+    if emails is None:
+        emails = [None] * len(table)
+        report['email_column_missing'] = True
+    addresses = [str(e).strip() if e is not None else "" for e in emails]
+    report['missing_email'] = [row for row, a in zip(row_numbers, addresses) if not a]
+    report['invalid_email'] = [(row, a) for row, a in zip(row_numbers, addresses) if a and not EMAIL_RE.match(a)]
+    
+    keys = [normalize_address(a, fold_plus) for a in addresses]
+    seen = {}
+    for row, key in zip(row_numbers, keys):
+        if key: seen.setdefault(key, []).append(row)
+    report['duplicates'] = {a: rows for a, rows in seen.items() if len(rows) > 1}
+    report['suppressed'] = [row for row, key in zip(row_numbers, keys) if key in suppressed]
+    sendable = [i for i, a in enumerate(addresses) if a]
+    report['sendable'] = len(sendable)
+    
+    # 2. Placeholders in the (cleaned) template vs. available headers
+    subject = clean_placeholders(draft_data.get('subject', ''))
+    body = clean_placeholders(draft_data.get('body', ''))
+    placeholders = template_placeholders(subject, body)
+    visible = set(placeholder_name(h) for h in visible_headers if h is not None)
+    report['unresolved_placeholders'] = sorted(set(p for p in placeholders if p not in visible))
+    
+    used = {p: placeholders.count(p) for p in set(placeholders) if p in visible}
+    report['empty_placeholder_cells'] = {}
+    
+    # 3. Message size: fixed template part + substituted values + attachments (base64 inflated)
+    template_bytes = len((subject + body).encode('utf-8')) - sum((len(p) + 4) * c for p, c in used.items())
+    sizes = [template_bytes] * len(table)
+    header_index = {}
+    for i, h in enumerate(all_headers):
+        if h is not None: header_index.setdefault(placeholder_name(h), i) # personalize() uses the first match
+    for name, count in used.items():
+        idx = header_index.get(name, -1)
+        if idx == -1: continue
+        lengths = [len(str(v).encode('utf-8')) if v is not None else 0 for v in columns[idx]]
+        sizes = [s + count * l for s, l in zip(sizes, lengths)]
+        empty = sum(1 for i in sendable if not lengths[i])
+        if empty: report['empty_placeholder_cells'][name] = empty
+    
+    attachments = draft_data.get('attachments', [])
+    attachment_bytes = sum(len(a[2]) for a in attachments)
+    col_att = column(['attachment', 'attachments', 'send attachment', 'send attachments', 'include attachments'])
+    report['empty_attachment_cells'] = []
+    if attachment_mode or not attachments:
+        with_attachments = [True] * len(table)
+    elif col_att is None:
+        with_attachments = [False] * len(table) # Worker skips attachments when the column is missing
+    else:
+        flags = [str(v).strip().lower() if v else "" for v in col_att]
+        report['empty_attachment_cells'] = [row_numbers[i] for i in sendable if not flags[i]]
+        with_attachments = [(f not in ['no', 'n', 'false', '0']) if f else attachment_empty_rule != "no" for f in flags]
+    
+    row_attachment_bytes = [attachment_bytes if w else 0 for w in with_attachments]
+    
+    # Per-row attachment files replace the draft's attachments for that row
+    col_files = column(ATTACHMENT_FILE_COLUMNS)
+    report['missing_attachment_files'] = []
+    if col_files is not None:
+        inline_bytes = sum(len(a[2]) for a in attachments if a[0].startswith('image/') and a[3])
+        file_sizes = {}
+        for i in sendable:
+            if not split_attachment_cell(col_files[i]): continue
+            try:
+                entries = resolve_row_attachments(col_files[i], attachments, base_dir)
+            except FileNotFoundError as e:
+                report['missing_attachment_files'].append((row_numbers[i], str(e).split(": ", 1)[-1]))
+                continue
+            total = inline_bytes
+            for kind, ref in entries:
+                if kind == 'draft':
+                    total += 0 if attachments[ref][3] else len(attachments[ref][2])
+                else:
+                    if ref not in file_sizes: file_sizes[ref] = os.path.getsize(ref)
+                    total += file_sizes[ref]
+            row_attachment_bytes[i] = total
+    
+    # MIME base64 encoding adds ~4/3 on top of the raw bytes
+    sizes = [int((s + a) * 4 / 3) for s, a in zip(sizes, row_attachment_bytes)]
+    sendable_sizes = [sizes[i] for i in sendable]
+    report['oversized'] = [(row_numbers[i], sizes[i]) for i in sendable if sizes[i] > GMAIL_MAX_MESSAGE_BYTES]
+    report['max_size'] = max(sendable_sizes) if sendable_sizes else 0
+    report['total_bytes'] = sum(sendable_sizes)
+    
+    # 4. Quota
+    report['quota_units'] = len(sendable) * GMAIL_SEND_QUOTA_UNITS
+    report['min_seconds'] = report['quota_units'] / GMAIL_QUOTA_UNITS_PER_SECOND
+    report['over_daily_limit'] = len(sendable) > GMAIL_DAILY_SEND_LIMIT
+    
+    report['elapsed'] = time.perf_counter() - started
+    return report
+
+def preflight_summary(report):
+    """Returns (one-line text, color) for a pre-flight report."""
+    errors = len(report['invalid_email']) + len(report['oversized']) + len(report['unresolved_placeholders'])
+    errors += len(report.get('missing_attachment_files', [])) + len(report.get('sheet_problems', []))
+    if report.get('email_column_missing'):
+        errors += 1
+    warnings = len(report['duplicates']) + len(report['empty_attachment_cells']) + (1 if report['over_daily_limit'] else 0)
+    if errors:
+        return f"❌ {errors} problem(s), {warnings} warning(s)", "#DC3545"
+    if warnings:
+        return f"⚠️ {warnings} warning(s)", "#FD7E14"
+    return f"✅ All {report['sendable']} recipients passed", "#198754"
+
+def format_preflight_report(report, limit=20):
+    """Renders a pre-flight report as HTML for ModernInfoDialog."""
+    def rows_text(rows):
+        shown = ", ".join(str(r - 1) for r in rows[:limit]) # Email # = excel row - 1 (same as logs)
+        return shown + (f" … (+{len(rows) - limit} more)" if len(rows) > limit else "")
+
+    lines = [f"<b>Recipients:</b> {report['sendable']} of {report['rows']} rows"]
+    if report.get('sheets'):
+        lines.append(f"<b>Sheets:</b> {', '.join(report['sheets'])}")
+    for title, problem in report.get('sheet_problems', []):
+        lines.append(f"❌ Sheet '{title}': {problem}")
+    if report.get('email_column_missing'):
+        lines.append("❌ <b>No 'Email' column found.</b>")
+    elif report['missing_email']:
+        lines.append(f"ℹ️ Rows without Email (skipped): {len(report['missing_email'])}")
+    if report['invalid_email']:
+        shown = ", ".join(f"#{r - 1} {a}" for r, a in report['invalid_email'][:limit])
+        lines.append(f"❌ Malformed addresses ({len(report['invalid_email'])}): {shown}")
+    if report['duplicates']:
+        shown = ", ".join(f"{a} ×{len(rows)}" for a, rows in list(report['duplicates'].items())[:limit])
+        lines.append(f"⚠️ Duplicate recipients ({len(report['duplicates'])}): {shown}")
+    if report['suppressed']:
+        lines.append(f"ℹ️ On the suppression list (will be skipped): {len(report['suppressed'])}")
+    if report['unresolved_placeholders']:
+        names = ", ".join("{{" + p + "}}" for p in report['unresolved_placeholders'])
+        lines.append(f"❌ Placeholders with no matching column: {names}")
+    for name, count in report['empty_placeholder_cells'].items():
+        lines.append(f"ℹ️ {{{{{name}}}}} is empty for {count} recipient(s)")
+    if report['empty_attachment_cells']:
+        lines.append(f"⚠️ Empty 'Send Attachments' cells ({len(report['empty_attachment_cells'])}): Email #{rows_text(report['empty_attachment_cells'])}")
+    if report.get('missing_attachment_files'):
+        shown = ", ".join(f"#{r - 1} {name}" for r, name in report['missing_attachment_files'][:limit])
+        lines.append(f"❌ Attachment files not found ({len(report['missing_attachment_files'])}): {shown}")
+    if report['oversized']:
+        lines.append(f"❌ Over Gmail's 25 MB limit: {len(report['oversized'])} message(s)")
+    lines.append(f"<b>Largest message:</b> ~{report['max_size'] / 1024:.0f} KB, <b>total upload:</b> ~{report['total_bytes'] / (1024 * 1024):.1f} MB")
+    lines.append(f"<b>Quota:</b> {report['quota_units']:,} units (≥ {report['min_seconds']:.0f}s at the per-user rate)")
+    if report['over_daily_limit']:
+        lines.append(f"⚠️ More than {GMAIL_DAILY_SEND_LIMIT} emails - may exceed the daily sending limit.")
+    return "<br>".join(lines)
+
+# --- CREDENTIALS ---
+def write_token_file(creds, path):
+    """Atomically replaces token.json (temp file + rename) so a crash never leaves it half-written."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".token_", suffix=".json", dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(creds.to_json())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def saved_token_scopes(path):
+    """SCOPES, plus SMTP_SCOPE when the saved token was granted it (SMTP sending backend)."""
+    try:
+        with open(path) as f:
+            granted = json.load(f).get('scopes') or []
+    except (OSError, ValueError):
+        granted = []
+    return SCOPES + [SMTP_SCOPE] if SMTP_SCOPE in granted else SCOPES
+
+class CredentialManager:
+    """
+    Owns the session's OAuth Credentials during long campaigns.
+    A background timer refreshes the access token TOKEN_REFRESH_MARGIN seconds before
+    expiry, so senders never stall on an expired token. Senders read .token (a plain
+    attribute, no lock); refresh(stale) is only needed when a server rejects a token,
+    and concurrent callers holding the same stale token trigger one refresh between them.
+    """
+
+    def __init__(self, creds, token_path, on_error=None):
+        self.creds = creds
+        self.token_path = token_path
+        self.on_error = on_error # Called with the exception when a refresh fails
+        self.lock = threading.Lock()
+        self.timer_lock = threading.Lock() # Guards self.timer; never held during a network call
+        self.timer = None # The only pending refresh; rescheduling cancels it first
+        self.stopped = False
+        self.token = creds.token
+
+    def start(self):
+        self.schedule()
+        return self
+
+    def schedule(self, delay=None):
+        if delay is None:
+            expiry = self.creds.expiry
+            if expiry:
+                # google-auth keeps expiry as a naive UTC datetime
+                if expiry.tzinfo is None: expiry = expiry.replace(tzinfo=datetime.timezone.utc)
+                remaining = (expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+                delay = max(5, remaining - TOKEN_REFRESH_MARGIN)
+            else:
+                delay = 45 * 60
+        with self.timer_lock:
+            if self.stopped: return
+            if self.timer: self.timer.cancel() # Senders refreshing on their own must not start extra timer chains
+            self.timer = threading.Timer(delay, self.refresh)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def refresh(self, stale_token=None):
+        try:
+            with self.lock:
+                if stale_token is not None and self.token != stale_token:
+                    return self.token # Another sender already refreshed
+                if not self.creds.refresh_token:
+                    return self.token
+                self.creds.refresh(Request())
+                self.token = self.creds.token
+                write_token_file(self.creds, self.token_path)
+        except Exception as e:
+            if self.on_error: self.on_error(e)
+            self.schedule(60) # Retry soon; senders keep using the current token meanwhile
+            return self.token
+        self.schedule()
+        return self.token
+
+    def stop(self):
+        with self.timer_lock:
+            self.stopped = True
+            if self.timer: self.timer.cancel()
+
+# --- SESSION PROFILE CACHE ---
+def make_http_session(pool_size=4):
+    """Pooled requests.Session for the app's plain HTTP fetches (keep-alive, a couple of retries)."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+HTTP_SESSION = make_http_session()
+
+def account_key(creds):
+    """Non-secret id of the signed-in grant, so a cached profile is never shown for another account."""
+    secret = getattr(creds, 'refresh_token', None) or getattr(creds, 'client_id', None) or ""
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:16]
+
+def fetch_session_profile(service, creds):
+    """Profile, verified send-as aliases (default first) and avatar bytes of the signed-in account."""
+    profile = service.users().getProfile(userId='me').execute()
+    user_info = build('oauth2', 'v2', credentials=creds).userinfo().get().execute()
+    email, name = profile.get('emailAddress'), user_info.get('name')
+    
+    try:
+        aliases = service.users().settings().sendAs().list(userId='me').execute().get('sendAs', [])
+    except Exception:
+        aliases = [] # Not fatal: sending still works from the primary address
+    send_as = [{'email': a['sendAsEmail'], 'name': a.get('displayName') or name, 'default': a.get('isDefault', False)}
+               for a in aliases if a.get('verificationStatus', 'accepted') == 'accepted']
+    if not any(a['email'] == email for a in send_as):
+        send_as.append({'email': email, 'name': name, 'default': not send_as})
+    send_as.sort(key=lambda a: not a['default'])
+    
+    avatar_bytes = None
+    if user_info.get('picture'):
+        try:
+            response = HTTP_SESSION.get(user_info['picture'], timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            avatar_bytes = response.content
+        except requests.RequestException:
+            pass
+    return {'email': email, 'name': name, 'picture': user_info.get('picture'), 'send_as': send_as, 'avatar_bytes': avatar_bytes}
+
+class ProfileCache:
+    """
+    The session profile persisted to PROFILE_CACHE_FILE for `ttl` seconds, so repeat launches
+    make no profile / userinfo / sendAs / avatar round trips. Keyed by account_key().
+    """
+
+    def __init__(self, path=PROFILE_CACHE_FILE, ttl=PROFILE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def load(self, key):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('account') != key or time.time() - data.get('fetched_at', 0) > self.ttl:
+            return None
+        user_data = data['profile']
+        avatar = user_data.pop('avatar_b64', None)
+        user_data['avatar_bytes'] = base64.b64decode(avatar) if avatar else None
+        return user_data
+
+    def save(self, key, user_data):
+        profile = {k: v for k, v in user_data.items() if k != 'avatar_bytes'}
+        if user_data.get('avatar_bytes'):
+            profile['avatar_b64'] = base64.b64encode(user_data['avatar_bytes']).decode('ascii')
+        write_json_atomic(self.path, {'account': key, 'fetched_at': time.time(), 'profile': profile})
+
+    def clear(self):
+        if os.path.exists(self.path): os.remove(self.path)
+
+def load_session_profile(service, creds, refresh=False):
+    """Returns (user_data, from_cache); fetches and caches the profile when missing, stale or forced."""
+    cache, key = ProfileCache(), account_key(creds)
+    user_data = None if refresh else cache.load(key)
+    if user_data: return user_data, True
+    user_data = fetch_session_profile(service, creds)
+    cache.save(key, user_data)
+    return user_data, False
+
+# --- INCREMENTAL DRAFT SYNC ---
+DRAFT_HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+def draft_label(draft_id, subject):
+    return f"{subject} [ID: {draft_id}]"
+
+class DraftSync:
+    """
+    Keeps the draft list in DRAFT_CACHE_FILE in step with Gmail through users.history.list:
+    a refresh with no draft changes costs one request. When something changed, drafts.list
+    shows which drafts are new or edited (a new message id) and only those are fetched, in
+    batch requests. A full resync happens only when the stored historyId has expired (404)
+    or there is no cache for this account.
+    """
+
+    def __init__(self, service, account, path=DRAFT_CACHE_FILE):
+        self.service = service
+        self.account = account
+        self.path = path
+        self.requests = 0 # HTTP requests made by the last sync()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cache if cache.get('account') == self.account and cache.get('history_id') else None
+
+    def save(self, cache):
+        cache['account'] = self.account
+        write_json_atomic(self.path, cache)
+
+    def clear(self):
+        if os.path.exists(self.path): os.remove(self.path)
+
+    def sync(self):
+        """Returns (entries, mode): entries is [(draft_id, subject)] in Gmail's order; mode is 'unchanged', 'patched' or 'full'."""
+        self.requests = 0
+        cache = self.load()
+        mode = 'full'
+        if cache:
+            known = {d['message_id'] for d in cache['drafts'].values()}
+            try:
+                changed, history_id = self.changed_since(cache['history_id'], known)
+            except HttpError as e:
+                if e.resp.status != 404: raise
+                cache = None # History expired: start over
+            else:
+                if changed:
+                    self.patch(cache)
+                    mode = 'patched'
+                else:
+                    mode = 'unchanged'
+                cache['history_id'] = history_id
+        if cache is None:
+            history_id = self.service.users().getProfile(userId='me').execute()['historyId'] # Before listing, so nothing is missed
+            self.requests += 1
+            cache = {'history_id': history_id, 'drafts': {}, 'order': []}
+            self.patch(cache)
+        self.save(cache)
+        return [(d, cache['drafts'][d]['subject']) for d in cache['order']], mode
+
+    def changed_since(self, history_id, known_message_ids):
+        """(any draft touched, latest historyId) from users.history.list since history_id."""
+        changed, page = False, None
+        while True:
+            response = self.service.users().history().list(
+                userId='me', startHistoryId=history_id, historyTypes=DRAFT_HISTORY_TYPES,
+                maxResults=500, pageToken=page).execute()
+            self.requests += 1
+            for record in response.get('history', []):
+                for key in ('messagesAdded', 'messagesDeleted', 'labelsAdded', 'labelsRemoved'):
+                    for change in record.get(key, []):
+                        message = change.get('message', {})
+                        if ('DRAFT' in message.get('labelIds', []) or 'DRAFT' in change.get('labelIds', [])
+                                or message.get('id') in known_message_ids):
+                            changed = True
+            page = response.get('nextPageToken')
+            if not page:
+                return changed, response.get('historyId', history_id)
+
+    def patch(self, cache):
+        """Re-lists the drafts and fetches subjects only for drafts that are new or have a new message."""
+        listed, page = [], None
+        while True:
+            response = self.service.users().drafts().list(userId='me', maxResults=500, pageToken=page).execute()
+            self.requests += 1
+            listed.extend((d['id'], d.get('message', {}).get('id')) for d in response.get('drafts', []))
+            page = response.get('nextPageToken')
+            if not page: break
+        
+        stale = [d for d, message_id in listed if cache['drafts'].get(d, {}).get('message_id') != message_id]
+        fetched = self.fetch_subjects(stale)
+        drafts = {}
+        for draft_id, message_id in listed:
+            if draft_id in fetched: drafts[draft_id] = fetched[draft_id]
+            elif draft_id in cache['drafts'] and draft_id not in stale: drafts[draft_id] = cache['drafts'][draft_id]
+        cache['drafts'] = drafts
+        cache['order'] = [d for d, _ in listed if d in drafts]
+
+    def fetch_subjects(self, draft_ids):
+        """{draft_id: {'message_id', 'subject'}} via batched drafts.get (drafts deleted meanwhile are left out)."""
+        fetched = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None: return
+            message = response['message']
+            headers = message.get('payload', {}).get('headers', [])
+            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(No Subject)')
+            fetched[response['id']] = {'message_id': message['id'], 'subject': subject}
+
+        for start in range(0, len(draft_ids), DRAFT_FETCH_BATCH):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for draft_id in draft_ids[start:start + DRAFT_FETCH_BATCH]:
+                batch.add(self.service.users().drafts().get(userId='me', id=draft_id, format='metadata'))
+            batch.execute()
+            self.requests += 1
+        return fetched
+
+# --- SEND TRANSPORTS ---
+# A transport takes a finished RFC 822 message and returns a concurrent.futures.Future
+# resolving to the Gmail response ({'id', 'threadId', ...}). max_in_flight tells
+# EmailWorker how many sends it may keep outstanding before new submits must wait.
+
+class TransportError(Exception):
+    """A send rejected by the server, with the HTTP status and Gmail error reason."""
+
+    def __init__(self, status, reason, message=""):
+        super().__init__(f"HTTP {status} {reason}: {message}".strip())
+        self.status = status
+        self.reason = reason
+
+class GmailApiTransport:
+    """
+    Sends through googleapiclient. Given the CredentialManager, `workers` threads send in
+    parallel, each with its own service (httplib2 connections are not thread-safe);
+    otherwise sends block on the shared service (the original behaviour).
+    """
+    name = "Gmail API"
+
+    def __init__(self, service, credentials=None, workers=1):
+        self.service = service
+        self.credentials = credentials
+        self.max_in_flight = workers if credentials else 1
+        self.local = threading.local()
+        self.pool = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="GmailApiSend") if self.max_in_flight > 1 else None
+
+    def thread_service(self):
+        if not hasattr(self.local, 'service'):
+            self.local.service = build('gmail', 'v1', credentials=self.credentials.creds, cache_discovery=False)
+        return self.local.service
+
+    def send(self, raw_bytes, service):
+        raw = base64.urlsafe_b64encode(raw_bytes).decode()
+        return service.users().messages().send(userId='me', body={'raw': raw}).execute()
+
+    def submit(self, raw_bytes, msg=None):
+        if self.pool:
+            return self.pool.submit(DIAGNOSTICS.call, "send_pool", lambda: self.send(raw_bytes, self.thread_service()))
+        future = Future()
+        try:
+            future.set_result(self.send(raw_bytes, self.service))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        if self.pool: self.pool.shutdown(wait=True)
+
+class AsyncGmailTransport:
+    """
+    Direct REST messages.send on a private asyncio loop with a pooled httpx client
+    (HTTP/2 when the h2 package is installed, otherwise HTTP/1.1 keep-alive).
+    Hundreds of sends can be in flight at once; tokens come from the shared
+    CredentialManager, which is asked to refresh when the server answers 401.
+    """
+    name = "Async Gmail REST"
+
+    def __init__(self, credentials, max_in_flight=ASYNC_MAX_IN_FLIGHT):
+        if httpx is None:
+            raise RuntimeError("The async transport needs httpx: pip install httpx[http2]")
+        self.credentials = credentials
+        self.max_in_flight = max_in_flight
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="AsyncGmailTransport", daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.setup(), self.loop).result()
+
+    async def setup(self):
+        # Loop-bound primitives must be created on the loop itself
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight))
+
+    async def send(self, raw_bytes):
+        body = {'raw': base64.urlsafe_b64encode(raw_bytes).decode()}
+        async with self.slots:
+            token = self.credentials.token
+            response = await self.client.post(GMAIL_SEND_URL, json=body, headers={'Authorization': f"Bearer {token}"})
+            if response.status_code == 401:
+                token = await self.loop.run_in_executor(None, self.credentials.refresh, token)
+                response = await self.client.post(GMAIL_SEND_URL, json=body, headers={'Authorization': f"Bearer {token}"})
+            if response.status_code >= 400:
+                try:
+                    error = response.json().get('error', {})
+                    reason = (error.get('errors') or [{}])[0].get('reason', error.get('status', ''))
+                    message = error.get('message', '')
+                except ValueError:
+                    reason, message = "", response.text[:200]
+                raise TransportError(response.status_code, reason, message)
+            return response.json()
+
+    def submit(self, raw_bytes, msg=None):
+        return asyncio.run_coroutine_threadsafe(self.send(raw_bytes), self.loop)
+
+    def close(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result(10)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(5)
+
+def batch_payload_size(raw_len):
+    """Bytes a message adds to a batch request: base64url of the raw message plus framing."""
+    return (raw_len + 2) // 3 * 4 + BATCH_PART_OVERHEAD
+
+def pack_batches(sizes, max_bytes=BATCH_MAX_BYTES, max_calls=BATCH_MAX_CALLS):
+    """
+    First-fit decreasing: groups item indices into batches of at most max_calls items and
+    max_bytes in total, placing the largest first so small items fill the gaps left behind.
+    """
+    bins = [] # [bytes left, [indices]]
+    for i in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        for b in bins:
+            if len(b[1]) < max_calls and sizes[i] <= b[0]:
+                b[0] -= sizes[i]
+                b[1].append(i)
+                break
+        else:
+            bins.append([max_bytes - sizes[i], [i]])
+    return [b[1] for b in bins]
+
+class BatchGmailTransport(GmailApiTransport):
+    """
+    Packs messages.send calls into Gmail batch requests. Submitted messages gather in a
+    look-ahead window that is packed first-fit decreasing by encoded size and count, so each
+    HTTP request goes out close to BATCH_MAX_BYTES / BATCH_MAX_CALLS without exceeding either;
+    messages over BATCH_SINGLE_MAX_BYTES are sent on their own through media upload.
+    A window is packed when full, or after BATCH_FLUSH_SECONDS without new submits; a mostly
+    empty leftover batch is carried into the next window once rather than sent half-full.
+    Quota is taken per packed request from the RateShare each message was submitted with.
+    """
+    name = "Gmail API (batched)"
+    packs_quota = True # EmailWorker passes its RateShare to submit() instead of waiting per message
+
+    def __init__(self, service, credentials=None, lookahead=BATCH_LOOKAHEAD, workers=BATCH_WORKERS):
+        super().__init__(service, credentials, workers=workers)
+        self.lookahead = lookahead
+        self.max_in_flight = self.initial_in_flight = lookahead # Batching needs a full window from the start
+        self.cond = threading.Condition()
+        self.pending = [] # (future, raw bytes, batch payload size)
+        self.last_submit = 0.0
+        self.closed = False
+        self.stats = {'batches': 0, 'batched_messages': 0, 'batched_bytes': 0, 'uploads': 0}
+        self.rate_shares = {} # Future -> RateShare charged when its message is packed
+        self.packer = threading.Thread(target=self.run, name="GmailBatchPacker", daemon=True)
+        self.packer.start()
+
+    def submit(self, raw_bytes, msg=None, rate_share=None):
+        future = Future()
+        with self.cond:
+            if rate_share: self.rate_shares[future] = rate_share
+            self.pending.append((future, raw_bytes, batch_payload_size(len(raw_bytes))))
+            self.last_submit = time.monotonic()
+            self.cond.notify()
+        return future
+
+    def run(self):
+        held = []
+        while True:
+            with self.cond:
+                while not self.closed and len(self.pending) < self.lookahead:
+                    idle = time.monotonic() - self.last_submit
+                    if self.pending and idle >= BATCH_FLUSH_SECONDS: break
+                    self.cond.wait(BATCH_FLUSH_SECONDS - idle if self.pending else None)
+                if self.closed and not self.pending: return
+                items, self.pending = self.pending, []
+            # Leftovers wait for one more window at most (never at shutdown)
+            held = self.dispatch(items, hold_partial=not held and not self.closed)
+            with self.cond:
+                self.pending[:0] = held
+                self.last_submit = time.monotonic() # Sends just freed slots: give the pipeline a moment to refill
+
+    def dispatch(self, items, hold_partial=False):
+        """Sends one packed window; with hold_partial, a mostly empty batch is returned to wait for the next one."""
+        singles = [item for item in items if item[2] > BATCH_SINGLE_MAX_BYTES]
+        rest = [item for item in items if item[2] <= BATCH_SINGLE_MAX_BYTES]
+        batches = [[rest[i] for i in b] for b in pack_batches([item[2] for item in rest])]
+        held = []
+        if hold_partial and batches:
+            emptiest = min(batches, key=lambda b: max(len(b) / BATCH_MAX_CALLS, sum(i[2] for i in b) / BATCH_MAX_BYTES))
+            if len(emptiest) < BATCH_MAX_CALLS / 2 and sum(i[2] for i in emptiest) < BATCH_MAX_BYTES / 2:
+                batches.remove(emptiest)
+                held = emptiest
+        for item in singles:
+            self.take_quota([item])
+            self.run_request(self.send_upload, item)
+        for batch in batches:
+            self.take_quota(batch)
+            self.run_request(self.send_batch, batch)
+        return held
+
+    def take_quota(self, items):
+        """Charges each campaign's RateShare for its messages in one packed request."""
+        units = {}
+        with self.cond:
+            for future, _, _ in items:
+                share = self.rate_shares.pop(future, None)
+                if share: units[share] = units.get(share, 0) + GMAIL_SEND_QUOTA_UNITS
+        for share, n in units.items():
+            share.acquire(n) # False once that campaign stopped; messages it already submitted still go out
+
+    def run_request(self, fn, arg):
+        if self.pool: self.pool.submit(DIAGNOSTICS.call, "send_pool", fn, arg)
+        else: fn(arg)
+
+    def request_service(self):
+        return self.thread_service() if self.pool else self.service
+
+    def send_batch(self, items):
+        service = self.request_service()
+
+        def callback(request_id, response, exception):
+            future = items[int(request_id)][0]
+            if exception is not None: future.set_exception(exception)
+            else: future.set_result(response)
+
+        try:
+            batch = service.new_batch_http_request(callback=callback)
+            for n, (future, raw_bytes, size) in enumerate(items):
+                raw = base64.urlsafe_b64encode(raw_bytes).decode()
+                batch.add(service.users().messages().send(userId='me', body={'raw': raw}), request_id=str(n))
+            with self.cond:
+                self.stats['batches'] += 1
+                self.stats['batched_messages'] += len(items)
+                self.stats['batched_bytes'] += sum(item[2] for item in items)
+            batch.execute()
+        except Exception as e:
+            for future, _, _ in items:
+                if not future.done(): future.set_exception(e)
+
+    def send_upload(self, item):
+        future, raw_bytes, _ = item
+        try:
+            with self.cond: self.stats['uploads'] += 1
+            media = MediaIoBaseUpload(io.BytesIO(raw_bytes), mimetype='message/rfc822', resumable=True)
+            future.set_result(self.request_service().users().messages().send(userId='me', body={}, media_body=media).execute())
+        except Exception as e:
+            future.set_exception(e)
+
+    def describe_stats(self):
+        s = self.stats
+        if not s['batches'] and not s['uploads']: return ""
+        avg_calls = s['batched_messages'] / s['batches'] if s['batches'] else 0
+        avg_mb = s['batched_bytes'] / s['batches'] / (1024 * 1024) if s['batches'] else 0
+        return (f"📦 {s['batches']} batch request(s), avg {avg_calls:.0f}/{BATCH_MAX_CALLS} calls and "
+                f"{avg_mb:.1f}/{BATCH_MAX_BYTES // (1024 * 1024)} MB each; {s['uploads']} large message(s) sent by upload.")
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.packer.join()
+        super().close()
+
+def smtp_envelope(msg):
+    """(sender, recipients) of a message: the From address and every To / Cc / Bcc address."""
+    sender = parseaddr(str(msg['From'] or ""))[1]
+    fields = [str(v) for name in ('To', 'Cc', 'Bcc') for v in msg.get_all(name, [])]
+    return sender, [addr for _, addr in getaddresses(fields) if addr]
+
+def stamp_message_id(raw_bytes, msg, domain=None):
+    """
+    (raw_bytes, Message-ID) with a Message-ID header added when the message has none. SMTP
+    returns no Gmail id, so this header is what later finds the sent message (rfc822msgid:).
+    A retry of the same msg keeps the id it was given the first time.
+    """
+    message_id = msg['Message-ID']
+    if not message_id:
+        message_id = make_msgid(domain=domain)
+        msg['Message-ID'] = message_id
+    header_end = re.search(rb"\r?\n\r?\n", raw_bytes)
+    if not re.search(rb"^Message-ID:", raw_bytes[:header_end.start() if header_end else len(raw_bytes)], re.I | re.M):
+        eol = b"\r\n" if b"\r\n" in raw_bytes[:header_end.end() if header_end else len(raw_bytes)] else b"\n"
+        raw_bytes = b"Message-ID: " + str(message_id).encode() + eol + raw_bytes
+    return raw_bytes, str(message_id)
+
+def xoauth2_string(account, token):
+    return f"user={account}\x01auth=Bearer {token}\x01\x01"
+
+class SmtpTransport:
+    """
+    Sends the finished RFC 822 bytes over SMTP, authenticated with XOAUTH2 from the
+    CredentialManager, without the base64/JSON envelope of the REST API. Each of pool_size
+    sender threads keeps one persistent connection and sends many messages on it, opening a
+    new session after per_session messages or when the server drops the connection.
+    Host, port and STARTTLS are parameters so a local SMTP server can stand in for Gmail.
+    The response's 'id' is the message's Message-ID header (SMTP has no Gmail id to return);
+    resolve_message_ids() swaps it for the Gmail ids when sends are reconciled or tracked.
+    """
+    name = "Gmail SMTP (XOAUTH2)"
+    quota_units = SMTP_SEND_QUOTA_UNITS # Rate limiter cost per message (API transports: GMAIL_SEND_QUOTA_UNITS)
+
+    def __init__(self, credentials, account, host=SMTP_HOST, port=SMTP_PORT, pool_size=SMTP_POOL_SIZE,
+                 starttls=True, per_session=SMTP_MESSAGES_PER_SESSION, timeout=SMTP_TIMEOUT):
+        if credentials is None:
+            raise RuntimeError("The SMTP backend needs a signed-in session.")
+        if SMTP_SCOPE not in (credentials.creds.scopes or []):
+            raise RuntimeError("SMTP sending needs full Gmail access, which this sign-in did not grant. "
+                               "Choose Options → Sending Backend → SMTP again to sign in with it.")
+        self.credentials = credentials
+        self.account = account # XOAUTH2 user: the signed-in address (aliases go in the From header)
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.per_session = per_session
+        self.timeout = timeout
+        self.max_in_flight = pool_size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = set() # Open sessions of every sender thread, closed together
+        self.stats = {'messages': 0, 'sessions': 0, 'reconnects': 0}
+        self.pool = ThreadPoolExecutor(pool_size, thread_name_prefix="SmtpSend")
+
+    def connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            self.authenticate(smtp)
+        except Exception:
+            smtp.close()
+            raise
+        with self.lock:
+            self.connections.add(smtp)
+            self.stats['sessions'] += 1
+        self.local.smtp, self.local.sent = smtp, 0
+        return smtp
+
+    def authenticate(self, smtp):
+        token = self.credentials.token
+        try:
+            # On a rejected token Gmail sends a 334 challenge; an empty reply ends the exchange with 535
+            smtp.auth('XOAUTH2', lambda challenge=None: xoauth2_string(self.account, token) if challenge is None else "")
+        except smtplib.SMTPAuthenticationError:
+            token = self.credentials.refresh(token) # Concurrent senders share one refresh
+            smtp.auth('XOAUTH2', lambda challenge=None: xoauth2_string(self.account, token) if challenge is None else "")
+
+    def disconnect(self, smtp, polite=True):
+        with self.lock:
+            self.connections.discard(smtp)
+        try:
+            if polite: smtp.quit()
+            else: smtp.close()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+        if getattr(self.local, 'smtp', None) is smtp: self.local.smtp = None
+
+    def session(self):
+        smtp = getattr(self.local, 'smtp', None)
+        if smtp is not None and self.local.sent >= self.per_session:
+            self.disconnect(smtp)
+            smtp = None
+        return smtp or self.connect()
+
+    def send(self, raw_bytes, msg=None):
+        if msg is None: msg = BytesHeaderParser().parsebytes(raw_bytes)
+        raw_bytes, message_id = stamp_message_id(raw_bytes, msg, self.account.rpartition('@')[2] or None)
+        for attempt in range(2):
+            smtp = None
+            try:
+                smtp = self.session()
+                if msg['Bcc']:
+                    refused = smtp.send_message(msg) # Flattened again without the Bcc header
+                else:
+                    sender, recipients = smtp_envelope(msg)
+                    refused = smtp.sendmail(sender, recipients, raw_bytes)
+            except smtplib.SMTPAuthenticationError as e:
+                # Rejected even with a freshly refreshed token: retrying will not help
+                raise TransportError(401, "smtpAuthFailed", f"{e.smtp_code} {e.smtp_error!r}")
+            except smtplib.SMTPServerDisconnected as e:
+                if smtp: self.disconnect(smtp, polite=False)
+                if attempt: raise TransportError(503, "smtpDisconnected", str(e)) # Retried with backoff
+                with self.lock:
+                    self.stats['reconnects'] += 1
+                continue
+            except smtplib.SMTPRecipientsRefused as e:
+                raise TransportError(400, "smtpRecipientsRefused", ", ".join(e.recipients))
+            except smtplib.SMTPConnectError as e:
+                raise TransportError(503, "smtpConnectFailed", f"{e.smtp_code} {e.smtp_error!r}") # Greeting refused: retried with backoff
+            except smtplib.SMTPResponseException as e:
+                if smtp and e.smtp_code == 421: self.disconnect(smtp, polite=False) # Server is closing the session
+                text = e.smtp_error.decode(errors='replace') if isinstance(e.smtp_error, bytes) else str(e.smtp_error)
+                # 4xx is temporary (retried like a 429); 5xx is a permanent rejection of this message
+                if 400 <= e.smtp_code < 500:
+                    raise TransportError(429, "smtpTemporaryFailure", f"{e.smtp_code} {text}")
+                raise TransportError(400, "smtpRejected", f"{e.smtp_code} {text}")
+            except smtplib.SMTPException as e:
+                raise TransportError(400, "smtpError", str(e)) # e.g. the server offers no XOAUTH2
+            except OSError as e:
+                # Network down, timeout, TLS failure: the session is unusable, the send is retried with backoff
+                if smtp: self.disconnect(smtp, polite=False)
+                raise TransportError(503, "smtpConnectionError", str(e) or type(e).__name__)
+            self.local.sent += 1
+            with self.lock:
+                self.stats['messages'] += 1
+            response = {'id': message_id}
+            if refused: response['refused'] = refused
+            return response
+
+    def submit(self, raw_bytes, msg=None):
+        return self.pool.submit(DIAGNOSTICS.call, "send_pool", self.send, raw_bytes, msg)
+
+    def describe_stats(self):
+        s = self.stats
+        if not s['messages']: return ""
+        return (f"📮 SMTP: {s['messages']} message(s) over {s['sessions']} connection(s), "
+                f"{s['messages'] / max(1, s['sessions']):.0f} per session; {s['reconnects']} reconnect(s).")
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for smtp in list(self.connections):
+            self.disconnect(smtp)
+
+SEND_BACKENDS = {
+    'api': "Gmail API (standard)",
+    'batch': "Gmail API batched (size-aware packing)",
+    'async': "Async Gmail REST (httpx, high concurrency)",
+    'smtp': "Gmail SMTP (XOAUTH2, pooled connections)",
+}
+
+def create_transport(backend, service, credentials, account=None):
+    """`account` is the signed-in address, needed by the SMTP backend (XOAUTH2 user)."""
+    if backend == 'async':
+        return AsyncGmailTransport(credentials)
+    if backend == 'smtp':
+        if not account: raise RuntimeError("The SMTP backend needs the signed-in Gmail address.")
+        return SmtpTransport(credentials, account)
+    if backend == 'batch':
+        return BatchGmailTransport(service, credentials)
+    return GmailApiTransport(service, credentials, workers=API_SEND_WORKERS)
+
+class SharedTransport:
+    """
+    One campaign's lease on a transport that concurrent campaigns send through, so they
+    share one connection pool. close() returns the lease; the last one closes the transport.
+    """
+
+    def __init__(self, transport, release):
+        self.transport = transport
+        self.release = release
+        self.released = False
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.release()
+
+class DryRunTransport:
+    """
+    Stands in for messages.send during a dry run: enforces Gmail's size limit, records
+    every payload size and optionally writes each message to `eml_dir`. Nothing is sent.
+    """
+    name = "Dry Run"
+    max_in_flight = 1
+
+    def __init__(self, eml_dir=None):
+        self.eml_dir = eml_dir
+        self.sizes = []
+        self.lock = threading.Lock()
+        if eml_dir: os.makedirs(eml_dir, exist_ok=True)
+
+    def submit(self, raw_bytes, msg=None):
+        future = Future()
+        with self.lock:
+            self.sizes.append(len(raw_bytes))
+            n = len(self.sizes)
+        try:
+            if len(raw_bytes) > GMAIL_MAX_MESSAGE_BYTES:
+                raise TransportError(413, "messageTooLarge", f"{len(raw_bytes) / (1024 * 1024):.1f} MB is over Gmail's 25 MB limit")
+            if self.eml_dir:
+                recipient = re.sub(r'[^\w.@-]', '_', str(msg['To']) if msg else "")
+                with open(os.path.join(self.eml_dir, f"{n:06d}_{recipient}.eml"), 'wb') as f:
+                    f.write(raw_bytes)
+            future.set_result({'id': f"dry-run-{n}", 'threadId': f"dry-run-{n}"})
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        pass
+
+def build_dry_run_report(snapshot, sizes):
+    """Throughput and size summary of a dry run from its metrics snapshot and payload sizes."""
+    counters = snapshot.get('counters', {})
+    elapsed = max(snapshot.get('elapsed_seconds', 0), 0.001)
+    ordered = sorted(sizes)
+    built = counters.get('sent', 0)
+    return {
+        'rows': counters.get('rows_processed', 0),
+        'built': built,
+        'failed': counters.get('failed', 0),
+        'skipped': counters.get('skipped', 0),
+        'elapsed_seconds': elapsed,
+        'messages_per_second': built / elapsed,
+        'total_bytes': sum(ordered),
+        'avg_bytes': sum(ordered) / len(ordered) if ordered else 0,
+        'p95_bytes': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0,
+        'max_bytes': ordered[-1] if ordered else 0,
+        'oversized': sum(1 for n in ordered if n > GMAIL_MAX_MESSAGE_BYTES),
+        'min_send_seconds': built * GMAIL_SEND_QUOTA_UNITS / GMAIL_QUOTA_UNITS_PER_SECOND,
+        'stages': {k: v['total_seconds'] for k, v in snapshot.get('stages', {}).items()},
+    }
+
+def format_dry_run_report(report):
+    """Renders a dry-run report as HTML for ModernInfoDialog."""
+    lines = [
+        f"<b>Messages built:</b> {report['built']} of {report['rows']} rows"
+        f" (❌ {report['failed']} failed, ⏭ {report['skipped']} skipped)",
+        f"<b>Pipeline throughput:</b> {report['messages_per_second']:.1f} msg/s ({report['elapsed_seconds']:.1f}s total)",
+        f"<b>Size:</b> avg {report['avg_bytes'] / 1024:.0f} KB, p95 {report['p95_bytes'] / 1024:.0f} KB,"
+        f" max {report['max_bytes'] / 1024:.0f} KB, total {report['total_bytes'] / (1024 * 1024):.1f} MB",
+        f"<b>Gmail quota floor:</b> ≥ {report['min_send_seconds']:.0f}s to send for real",
+    ]
+    if report['oversized']:
+        lines.append(f"❌ Over Gmail's 25 MB limit: {report['oversized']} message(s)")
+    if report['stages']:
+        lines.append("<b>Stages:</b> " + ", ".join(f"{k} {v:.2f}s" for k, v in report['stages'].items()))
+    return "<br>".join(lines)
+
+# --- SCHEDULING ---
+def resolve_timezone(name):
+    """ZoneInfo for an IANA name such as 'Europe/Berlin'; None (system local time) when blank or unknown."""
+    if not name or not str(name).strip(): return None
+    try:
+        return zoneinfo.ZoneInfo(str(name).strip())
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return None
+
+def parse_send_at(value, tz=None):
+    """'Send At' cell -> aware datetime. Naive values are read in the row's time zone."""
+    if value in (None, ""): return None
+    if isinstance(value, datetime.datetime):
+        dt = value
+    elif isinstance(value, datetime.date):
+        dt = datetime.datetime.combine(value, datetime.time())
+    else:
+        try:
+            dt = datetime.datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz) if tz else dt.astimezone()
+    return dt
+
+class SendWindow:
+    """Hours (in each recipient's time zone) in which mail may go out, plus an hourly send cap."""
+
+    def __init__(self, start_hour=9, end_hour=17, weekdays_only=True, hourly_cap=0, timezone=""):
+        self.start_hour = start_hour
+        self.end_hour = end_hour # Exclusive; 0-24 means any time
+        self.weekdays_only = weekdays_only
+        self.hourly_cap = hourly_cap # 0 = no cap
+        self.timezone = timezone # Default for rows without a Timezone cell ("" = system local)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def is_open(self, local):
+        return (not self.weekdays_only or local.weekday() < 5) and self.start_hour <= local.hour < self.end_hour
+
+    def next_open(self, when, tz=None):
+        """Earliest moment at or after `when` that falls inside the window in `tz`."""
+        local = when.astimezone(tz) if tz else when.astimezone()
+        for _ in range(8): # At most a weekend plus a day
+            if self.is_open(local):
+                return local
+            day_ok = not self.weekdays_only or local.weekday() < 5
+            if day_ok and local.hour < self.start_hour:
+                local = local.replace(hour=self.start_hour, minute=0, second=0, microsecond=0)
+            else:
+                local = (local + datetime.timedelta(days=1)).replace(hour=self.start_hour, minute=0, second=0, microsecond=0)
+        return local
+
+    def describe(self):
+        days = "Mon-Fri" if self.weekdays_only else "daily"
+        cap = f", max {self.hourly_cap}/hour" if self.hourly_cap else ""
+        return f"{self.start_hour:02d}:00-{self.end_hour:02d}:00 {days}{cap} ({self.timezone or 'local time'})"
+
+class RowScheduler:
+    """
+    Releases rows in time order from a heap of (due_timestamp, row_index).
+    A row is due at its Send At (or the campaign start), moved into the send window
+    of its own time zone. Releases are spaced 3600/hourly_cap seconds apart so the cap
+    is reached as a steady rate instead of a burst at the top of each hour.
+    """
+
+    def __init__(self, window, not_before=None):
+        self.window = window
+        self.default_tz = resolve_timezone(window.timezone)
+        self.not_before = not_before or datetime.datetime.now(datetime.timezone.utc)
+        self.interval = 3600.0 / window.hourly_cap if window.hourly_cap else 0.0
+        self.next_release = 0.0
+        self.heap = []
+        self.zones = {}
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, idx, send_at=None, tz_name=None):
+        tz = resolve_timezone(tz_name) or self.default_tz
+        requested = max(self.not_before, parse_send_at(send_at, tz) or self.not_before)
+        self.zones[idx] = tz
+        heapq.heappush(self.heap, (self.window.next_open(requested, tz).timestamp(), idx))
+
+    def peek(self):
+        return self.heap[0][1]
+
+    def first_due(self):
+        return datetime.datetime.fromtimestamp(self.heap[0][0]) if self.heap else None
+
+    def pop_due(self, now=None):
+        """(row_index, 0) when a row may be sent now, else (None, seconds_to_wait)."""
+        now = time.time() if now is None else now
+        while self.heap:
+            due, idx = self.heap[0]
+            if self.interval and due < self.next_release:
+                # Pacing pushed this row later; it must still land inside its window
+                slot = datetime.datetime.fromtimestamp(self.next_release, datetime.timezone.utc)
+                due = max(self.next_release, self.window.next_open(slot, self.zones[idx]).timestamp())
+                heapq.heapreplace(self.heap, (due, idx))
+                continue
+            if due > now:
+                return None, due - now
+            heapq.heappop(self.heap)
+            self.next_release = now + self.interval
+            return idx, 0
+        return None, None
+
+class CampaignQueue:
+    """Scheduled campaigns persisted in SCHEDULE_FILE, so an overnight queue survives restarts."""
+
+    def __init__(self, path=SCHEDULE_FILE):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path): return []
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def save(self, campaigns):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(campaigns, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, campaign):
+        campaigns = self.load()
+        campaign['id'] = max((c['id'] for c in campaigns), default=0) + 1
+        campaign.setdefault('status', 'queued')
+        campaigns.append(campaign)
+        self.save(campaigns)
+        return campaign
+
+    def update(self, campaign_id, **fields):
+        campaigns = self.load()
+        for c in campaigns:
+            if c['id'] == campaign_id: c.update(fields)
+        self.save(campaigns)
+
+    def remove(self, campaign_id):
+        self.save([c for c in self.load() if c['id'] != campaign_id])
+
+    def next_due(self, now=None):
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        due = [c for c in self.load() if c.get('status') == 'queued' and datetime.datetime.fromisoformat(c['start_at']) <= now]
+        return min(due, key=lambda c: c['start_at'], default=None)
+
+# --- MULTI-SHEET WORKBOOKS ---
+ALL_SHEETS = '*' # Campaign sheet selection: every worksheet, including ones added later
+
+def resolve_campaign_sheets(wb, sheets=None):
+    """Worksheets a campaign covers, in workbook order: the active sheet (None), every sheet (ALL_SHEETS) or the named ones."""
+    if not sheets: return [wb.active]
+    if sheets == ALL_SHEETS: return list(wb.worksheets)
+    missing = [name for name in sheets if name not in wb.sheetnames]
+    if missing: raise ValueError(f"Sheet(s) not found in the workbook: {', '.join(missing)}")
+    return [ws for ws in wb.worksheets if ws.title in sheets]
+
+class SheetSchema:
+    """
+    Header row of one worksheet, resolved once per campaign. With several sheets every row is
+    projected into one campaign layout (see build_campaign_layout), so placeholders, CC/BCC and
+    attachment columns are looked up the same way whichever sheet a row comes from.
+    """
+
+    def __init__(self, ws, header_values, hidden=()):
+        self.ws = ws
+        self.title = ws.title
+        self.all_headers = list(header_values)
+        self.lower = [str(h).strip().lower() for h in self.all_headers]
+        self.hidden = set(hidden) # Column indexes left out of personalization
+        self.layout = None # Campaign column -> column in this sheet (None: the sheet lacks it); None when not projected
+
+    def col(self, names):
+        for name in names:
+            if name in self.lower: return self.lower.index(name)
+        return -1
+
+    def ensure(self, names, title):
+        """Index of the first column in `names`, adding a `title` column to the header row when there is none."""
+        idx = self.col(names)
+        if idx == -1:
+            self.ws.cell(row=1, column=len(self.all_headers) + 1).value = title
+            self.all_headers.append(title)
+            self.lower.append(title.lower())
+            idx = len(self.all_headers) - 1
+            self.hidden.add(idx) # Status columns are not placeholders
+        return idx
+
+    def project(self, values):
+        if self.layout is None: return list(values)
+        return [values[j] if j is not None and j < len(values) else None for j in self.layout]
+
+def build_campaign_layout(schemas):
+    """
+    (all_headers, visible_indexes) shared by a campaign's sheets: the first sheet's columns, then
+    columns only later sheets have, matched by name. Sets each schema's projection; a single
+    sheet keeps its own layout.
+    """
+    first = schemas[0]
+    all_headers, lower, hidden = list(first.all_headers), list(first.lower), set(first.hidden)
+    for schema in schemas[1:]:
+        for i, (header, name) in enumerate(zip(schema.all_headers, schema.lower)):
+            if header is None or name in lower: continue
+            all_headers.append(header)
+            lower.append(name)
+            if i in schema.hidden: hidden.add(len(all_headers) - 1)
+    if len(schemas) > 1:
+        for schema in schemas:
+            schema.layout = [schema.lower.index(name) if name in schema.lower else None for name in lower]
+    return all_headers, [i for i in range(len(all_headers)) if i not in hidden]
+
+def validate_sheet_schemas(schemas, subject, body):
+    """[(sheet title, problem)]: sheets without an Email column, or lacking a placeholder column another sheet has."""
+    placeholders = set(template_placeholders(subject, body))
+    visible = [{placeholder_name(h) for i, h in enumerate(schema.all_headers) if h is not None and i not in schema.hidden} for schema in schemas]
+    available = set().union(*visible)
+    problems = []
+    for schema, names in zip(schemas, visible):
+        if 'email' not in schema.lower:
+            problems.append((schema.title, "no 'Email' column"))
+        missing = sorted(p for p in placeholders if p in available and p not in names)
+        if missing:
+            problems.append((schema.title, "no column for " + ", ".join("{{" + p + "}}" for p in missing)))
+    return problems
+
+# --- WORKBOOK CHECKPOINTING ---
+def status_journal_path(excel_path):
+    return excel_path + ".status.jsonl"
+
+def campaign_progress_files(excel_path):
+    """Progress + resume index kept beside the workbook, for campaigns run from the Campaign Manager."""
+    return excel_path + ".progress.json", excel_path + ".progress.idx"
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def save_workbook_atomic(wb, path):
+    """wb.save into a temp file next to `path`, then rename over it: a crash mid-save keeps the old file intact."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".~", suffix=".xlsx", dir=folder)
+    os.close(fd)
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+def solid_fill(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+# Status cell styles, built once and shared by every row: openpyxl hashes each assigned
+# fill/font into the workbook's style table, and fresh objects per cell made that 4x slower.
+STATUS_STYLES = {
+    'sent': (solid_fill("198754"), openpyxl.styles.Font(color="FFFFFF", bold=True)), # Dark Green (with Attachment)
+    'sent_no_attachment': (solid_fill("C6EFCE"), openpyxl.styles.Font(color="006100")), # Light Green
+    'error': (solid_fill("FFFF9999"), None), # Red
+    'stopped': (solid_fill("FFFF9999"), None), # Red
+    'resumed': (solid_fill("FFFFFF99"), None), # Yellow
+    'skipped': (solid_fill("E9ECEF"), None), # Grey
+    'bounced': (solid_fill("DC3545"), openpyxl.styles.Font(color="FFFFFF", bold=True)), # Red (Response column)
+    'replied': (solid_fill("CFE2FF"), openpyxl.styles.Font(color="084298")), # Light Blue (Response column)
+}
+
+def apply_status_cell(ws, row, col, value, style=None):
+    """Writes one Status/Stop/Resume cell, styled from STATUS_STYLES."""
+    cell = ws.cell(row=row, column=col + 1)
+    cell.value = value
+    if style:
+        fill, font = STATUS_STYLES[style]
+        cell.fill = fill
+        if font: cell.font = font
+    return cell
+
+def replay_status_journal(wb, excel_path):
+    """
+    Re-applies status cells journaled by a run that never reached its final save. Returns the count.
+    A journal no newer than the workbook is rejected and removed: the file was saved or edited since,
+    and replaying would overwrite that. Once applied, the caller saves the workbook and removes it.
+    """
+    path = status_journal_path(excel_path)
+    if not os.path.exists(path): return 0
+    if os.path.getmtime(path) <= os.path.getmtime(excel_path):
+        os.remove(path)
+        return 0
+    applied = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break # Torn last line from a crash mid-write
+            if entry.get('ws') and entry['ws'] not in wb.sheetnames: continue
+            apply_status_cell(wb[entry['ws']] if entry.get('ws') else wb.active, entry['r'], entry['c'], entry['v'], entry.get('s'))
+            applied += 1
+    return applied
+
+def progress_record(last_row, total_rows=None, excel_path=None):
+    return {"last_row": last_row, "total_rows": total_rows, "excel_path": os.path.abspath(excel_path) if excel_path else None}
+
+class ResumeIndex:
+    """
+    Completed and failed row numbers as two bitmaps (one bit per sheet row), stored in
+    RESUME_INDEX_FILE beside PROGRESS_FILE. Resume walks the bits to reach pending rows
+    directly, and can pick failed rows up again for a retry.
+    """
+
+    def __init__(self, excel_path, max_row=0):
+        self.excel_path = os.path.abspath(excel_path)
+        size = (max_row >> 3) + 1
+        self.completed = bytearray(size)
+        self.failed = bytearray(size)
+
+    def grow(self, row):
+        size = (row >> 3) + 1
+        if size > len(self.completed):
+            self.completed.extend(bytes(size - len(self.completed)))
+            self.failed.extend(bytes(size - len(self.failed)))
+
+    def mark(self, row, ok=True):
+        self.grow(row)
+        byte, bit = row >> 3, 1 << (row & 7)
+        if ok:
+            self.completed[byte] |= bit
+            self.failed[byte] &= ~bit
+        else:
+            self.failed[byte] |= bit
+
+    def is_set(self, bitmap, row):
+        byte = row >> 3
+        return byte < len(bitmap) and bool(bitmap[byte] & (1 << (row & 7)))
+
+    def failed_count(self):
+        return sum(bin(b).count("1") for b in self.failed)
+
+    def pending_rows(self, start_row, end_row, retry_failed=False):
+        """Rows in [start_row, end_row] not yet completed (failed rows only with retry_failed)."""
+        first = 2 if retry_failed else start_row # Failures before the stop point come back too
+        for row in range(first, end_row + 1):
+            if self.is_set(self.completed, row): continue
+            if self.is_set(self.failed, row):
+                if retry_failed: yield row
+                continue
+            if row >= start_row: yield row
+
+    def save(self, path=RESUME_INDEX_FILE):
+        header = json.dumps({"excel_path": self.excel_path, "size": len(self.completed)}).encode()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(header + b"\n" + bytes(self.completed) + bytes(self.failed))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, excel_path, path=RESUME_INDEX_FILE):
+        """The saved index for this workbook, or None (missing, unreadable or for another file)."""
+        try:
+            with open(path, 'rb') as f:
+                header, _, bitmaps = f.read().partition(b"\n")
+            meta = json.loads(header)
+        except (OSError, ValueError):
+            return None
+        if meta.get("excel_path") != os.path.abspath(excel_path): return None
+        size = meta["size"]
+        index = cls(excel_path)
+        index.completed = bytearray(bitmaps[:size])
+        index.failed = bytearray(bitmaps[size:2 * size])
+        return index
+
+    @staticmethod
+    def discard(path=RESUME_INDEX_FILE):
+        if os.path.exists(path): os.remove(path)
+
+class StatusCheckpointer:
+    """
+    Journals status cell changes on a background thread so a crash loses at most
+    CHECKPOINT_ROWS rows / CHECKPOINT_SECONDS of results, without re-saving the workbook.
+    Each flush appends to <excel>.status.jsonl (replayed on the next run), moves
+    PROGRESS_FILE past the last recorded row and saves the ResumeIndex. The journal
+    is discarded once the workbook itself has been saved.
+    """
+    CLOSE = object()
+
+    def __init__(self, excel_path, metrics=None, track_progress=True, resume_index=None, every_rows=CHECKPOINT_ROWS, every_seconds=CHECKPOINT_SECONDS, enabled=True, progress_files=(PROGRESS_FILE, RESUME_INDEX_FILE)):
+        self.enabled = enabled # False (dry run): nothing is written
+        self.excel_path = excel_path
+        self.progress_file, self.resume_index_file = progress_files
+        self.path = status_journal_path(excel_path)
+        self.metrics = metrics
+        self.resume_index = resume_index
+        self.total_rows = None # Stored with the progress so Resume need not recount
+        self.track_progress = track_progress # Off for scheduled runs (rows complete out of order)
+        self.every_rows = every_rows
+        self.every_seconds = every_seconds
+        self.queue = queue.Queue()
+        self.pending = []
+        self.next_row = None
+        self.thread = threading.Thread(target=self.run, name="StatusCheckpointer", daemon=True)
+
+    def start(self):
+        if self.enabled: self.thread.start()
+        return self
+
+    def record(self, row, col, value, style=None, sheet=None):
+        if not self.enabled: return
+        entry = {'r': row, 'c': col, 'v': value}
+        if style: entry['s'] = style
+        if sheet: entry['ws'] = sheet # Multi-sheet campaigns; otherwise the active sheet
+        self.queue.put(entry)
+
+    def row_done(self, row, ok=True):
+        if self.enabled: self.queue.put((row, ok))
+
+    def run(self):
+        last_flush = time.monotonic()
+        rows_since_flush = 0
+        while True:
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                item = None
+            if item is self.CLOSE:
+                self.flush()
+                return
+            if isinstance(item, dict):
+                self.pending.append(item)
+            elif item is not None:
+                row, ok = item
+                if self.resume_index: self.resume_index.mark(row, ok)
+                self.next_row = row + 1
+                rows_since_flush += 1
+            if self.pending and (rows_since_flush >= self.every_rows or time.monotonic() - last_flush >= self.every_seconds):
+                self.flush()
+                last_flush = time.monotonic()
+                rows_since_flush = 0
+
+    def flush(self):
+        if not self.pending: return
+        started = time.perf_counter()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entry, default=str) + "\n" for entry in self.pending))
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending = []
+        if self.track_progress and self.next_row:
+            if self.resume_index: self.resume_index.save(self.resume_index_file)
+            write_json_atomic(self.progress_file, progress_record(self.next_row, self.total_rows, self.excel_path))
+        if self.metrics:
+            self.metrics.add_time("checkpoint", time.perf_counter() - started)
+            self.metrics.incr("checkpoints")
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(self.CLOSE)
+            self.thread.join()
+
+    def discard(self):
+        if self.enabled and os.path.exists(self.path): os.remove(self.path)
+
+# --- DELIVERY RECONCILIATION ---
+def sent_log_path(excel_path):
+    return excel_path + ".sent.jsonl"
+
+class SentMessageLog:
+    """
+    Gmail message / thread ids of sent rows, one JSON line per send in <excel>.sent.jsonl.
+    Lines are buffered and appended every CHECKPOINT_ROWS sends and on close; later lines
+    for the same row supersede earlier ones (a row sent again by a retry or a new campaign).
+    """
+
+    def __init__(self, excel_path, enabled=True, every_rows=CHECKPOINT_ROWS):
+        self.path = sent_log_path(excel_path)
+        self.enabled = enabled # False (dry run): nothing is written
+        self.every_rows = every_rows
+        self.pending = []
+
+    def record(self, row, recipient, response, sheet=None):
+        if not self.enabled or not response or not response.get('id'): return
+        entry = {'row': row, 'to': recipient, 'id': response['id'], 'thread_id': response.get('threadId'), 'sent_at': time.time()}
+        if sheet: entry['sheet'] = sheet # Multi-sheet campaigns; otherwise the active sheet
+        self.pending.append(entry)
+        if len(self.pending) >= self.every_rows: self.flush()
+
+    def flush(self):
+        if not self.pending: return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in self.pending))
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+    @staticmethod
+    def load(excel_path):
+        """{(sheet, row): entry} for the workbook (latest send per row; sheet is "" for the active sheet)."""
+        entries = {}
+        try:
+            with open(sent_log_path(excel_path), encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # Torn line from a crash mid-write
+                    entries[(entry.get('sheet', ""), entry['row'])] = entry
+        except OSError:
+            pass
+        return entries
+
+    @staticmethod
+    def save(excel_path, entries):
+        """Rewrites the log compacted to one line per row (reconciliation results included)."""
+        path = sent_log_path(excel_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write("".join(json.dumps(entries[key]) + "\n" for key in sorted(entries)))
+        os.replace(tmp_path, path)
+
+def is_header_message_id(message_id):
+    """True for a logged Message-ID header (SMTP sends) rather than a Gmail message id."""
+    return message_id.startswith('<')
+
+def resolve_message_ids(service, entries):
+    """
+    Replaces the Message-ID headers logged for SMTP sends with the Gmail message / thread ids,
+    found by batched messages.list searches for rfc822msgid:. The header is kept as 'message_id'.
+    Returns (resolved, requests); ids not found yet stay as they are for the next run.
+    """
+    pending = [e for e in entries if is_header_message_id(e['id'])]
+    resolved = requests = 0
+    for start in range(0, len(pending), RECONCILE_BATCH):
+        chunk = pending[start:start + RECONCILE_BATCH]
+        found = {}
+
+        def callback(request_id, response, exception):
+            if exception is None and response.get('messages'):
+                found[int(request_id)] = response['messages'][0]
+
+        batch = service.new_batch_http_request(callback=callback)
+        for n, entry in enumerate(chunk):
+            batch.add(service.users().messages().list(userId='me', q=f"rfc822msgid:{entry['id'].strip('<>')}", maxResults=1),
+                      request_id=str(n))
+        batch.execute()
+        requests += 1
+        for n, message in found.items():
+            chunk[n].update(message_id=chunk[n]['id'], id=message['id'], thread_id=message.get('threadId'))
+            resolved += 1
+    return resolved, requests
+
+def delivery_state(message):
+    labels = message.get('labelIds', [])
+    if 'TRASH' in labels: return 'trashed'
+    return 'sent' if 'SENT' in labels else 'not_in_sent'
+
+def batch_get_messages(service, message_ids, **params):
+    """
+    ({message_id: message}, requests made) for up to RECONCILE_BATCH ids in one batch request
+    of messages.get(**params). Deleted messages map to None; throttled sub-requests are
+    retried with backoff, other failures are left out (picked up by the next run).
+    """
+    results = {}
+    remaining = list(message_ids)
+    requests = 0
+    for attempt in range(SEND_MAX_RETRIES + 1):
+        throttled = []
+
+        def callback(request_id, response, exception):
+            message_id = remaining[int(request_id)]
+            if exception is None:
+                results[message_id] = response
+            elif send_error_status(exception)[0] == 404:
+                results[message_id] = None
+            elif is_throttle_error(exception):
+                throttled.append(message_id)
+
+        batch = service.new_batch_http_request(callback=callback)
+        for n, message_id in enumerate(remaining):
+            batch.add(service.users().messages().get(userId='me', id=message_id, **params), request_id=str(n))
+        batch.execute()
+        requests += 1
+        if not throttled: break
+        remaining = throttled
+        time.sleep(retry_delay(attempt + 1))
+    return results, requests
+
+def check_sent_batch(service, message_ids):
+    """{message_id: (state, labelIds)} via batched messages.get(format='minimal'); deleted messages are 'missing'."""
+    messages, requests = batch_get_messages(service, message_ids, format='minimal')
+    return {message_id: (delivery_state(m), m.get('labelIds', [])) if m else ('missing', [])
+            for message_id, m in messages.items()}, requests
+
+def format_reconcile_report(report):
+    lines = [
+        f"Messages checked: {report['checked']} in {report['requests']} batch request(s), {report['elapsed_seconds']:.1f} s",
+        f"✅ In Sent: {report['sent']}",
+    ]
+    if report['not_in_sent']: lines.append(f"⚠️ Present but not labelled Sent: {report['not_in_sent']}")
+    if report['trashed']: lines.append(f"🗑 In Trash: {report['trashed']}")
+    if report['missing']: lines.append(f"❌ Not found (deleted): {report['missing']}")
+    if report['unchecked']: lines.append(f"⏳ Not checked (errors or stopped): {report['unchecked']}")
+    if report['already_confirmed']: lines.append(f"Previously confirmed, skipped: {report['already_confirmed']}")
+    return "\n".join(lines)
+
+# --- BOUNCE & REPLY TRACKING ---
+def tracker_state_path(excel_path):
+    return excel_path + ".tracker.json"
+
+def message_header(message, name):
+    return next((h['value'] for h in message.get('payload', {}).get('headers', []) if h['name'].lower() == name.lower()), "")
+
+class ResponseTracker:
+    """
+    Finds bounces and replies to a campaign's sends. <excel>.tracker.json holds the mailbox
+    historyId from before the first send; each sync lists only messages added since then
+    (users.history.list, 500 per page) and matches them in memory against {threadId: row}
+    built from <excel>.sent.jsonl. Headers are fetched, in batches, only for messages in a
+    campaign thread or from mailer-daemon; bounces name the failed address, which is matched
+    through {address: row}. When the stored historyId has expired, messages.list after the
+    stored time stands in for the history.
+    """
+
+    def __init__(self, service, excel_path):
+        self.service = service
+        self.excel_path = excel_path
+        self.path = tracker_state_path(excel_path)
+        self.requests = 0 # HTTP requests made by the last sync()
+
+    def load_state(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_state(self, history_id, since):
+        write_json_atomic(self.path, {'history_id': history_id, 'since': since})
+
+    def current_history_id(self):
+        self.requests += 1
+        return self.service.users().getProfile(userId='me').execute()['historyId']
+
+    def mark_start(self):
+        """Stores the mailbox position before a campaign sends, unless an earlier campaign already did."""
+        if self.load_state() is None:
+            self.save_state(self.current_history_id(), time.time())
+
+    def added_since(self, history_id):
+        """([(message_id, threadId, labelIds)], latest historyId) from users.history.list."""
+        added, page = {}, None
+        while True:
+            response = self.service.users().history().list(
+                userId='me', startHistoryId=history_id, historyTypes=['messageAdded'],
+                maxResults=500, pageToken=page).execute()
+            self.requests += 1
+            for record in response.get('history', []):
+                for change in record.get('messagesAdded', []):
+                    message = change['message']
+                    added[message['id']] = (message['id'], message.get('threadId'), message.get('labelIds', []))
+            page = response.get('nextPageToken')
+            if not page:
+                return list(added.values()), response.get('historyId', history_id)
+
+    def list_ids(self, query):
+        """[(message_id, threadId, None)] for a messages.list search (used when history has expired)."""
+        found, page = [], None
+        while True:
+            response = self.service.users().messages().list(userId='me', q=query, maxResults=500, pageToken=page).execute()
+            self.requests += 1
+            found.extend((m['id'], m.get('threadId'), None) for m in response.get('messages', []))
+            page = response.get('nextPageToken')
+            if not page: return found
+
+    def sync(self):
+        """
+        Returns ({(sheet, row): 'Bounced' | 'Replied'}, report, commit). Nothing is stored until
+        commit() is called, so a failed workbook save leaves the next sync to find them again.
+        """
+        self.requests = 0
+        report = {'mode': 'incremental', 'new_messages': 0, 'examined': 0, 'replies': 0, 'bounces': 0, 'requests': 0}
+        state = self.load_state()
+        if state is None:
+            self.mark_start()
+            report.update(mode='baseline', requests=self.requests)
+            return {}, report, lambda: None
+
+        entries = SentMessageLog.load(self.excel_path)
+        resolved, requests = resolve_message_ids(self.service, entries.values()) # SMTP sends carry no thread id until resolved
+        self.requests += requests
+        if resolved: SentMessageLog.save(self.excel_path, entries)
+        thread_rows = {e['thread_id']: key for key, e in entries.items() if e.get('thread_id')}
+        address_rows = build_recipient_index((key, e['to']) for key, e in entries.items())
+        sent_ids = {e['id'] for e in entries.values()}
+        started = time.time()
+        try:
+            added, history_id = self.added_since(state['history_id'])
+        except HttpError as e:
+            if e.resp.status != 404: raise
+            history_id = self.current_history_id() # History expired: search from the stored time instead
+            added = self.list_ids(f"after:{int(state['since'])}")
+            report['mode'] = 'full'
+        added = [m for m in added if m[0] not in sent_ids and not {'SENT', 'DRAFT'} & set(m[2] or ())]
+        report['new_messages'] = len(added)
+
+        candidates = [m[0] for m in added if m[1] in thread_rows]
+        if len(candidates) < len(added):
+            # Bounces usually thread with the original, but some open a thread of their own
+            daemon_ids = {m[0] for m in self.list_ids(f"from:(mailer-daemon OR postmaster) after:{int(state['since'])}")}
+            candidates += [m[0] for m in added if m[1] not in thread_rows and m[0] in daemon_ids]
+
+        results = {}
+        for start in range(0, len(candidates), RECONCILE_BATCH):
+            messages, requests = batch_get_messages(self.service, candidates[start:start + RECONCILE_BATCH],
+                                                    format='metadata', metadataHeaders=['From', 'X-Failed-Recipients'])
+            self.requests += requests
+            for message in filter(None, messages.values()):
+                if 'SENT' in message.get('labelIds', []): continue
+                report['examined'] += 1
+                failed = message_header(message, 'X-Failed-Recipients')
+                if failed or BOUNCE_SENDER_RE.search(message_header(message, 'From')):
+                    rows = [address_rows[a] for a in map(normalize_address, failed.split(',')) if a in address_rows]
+                    if not rows and message.get('threadId') in thread_rows: rows = [thread_rows[message['threadId']]]
+                    for row in rows: results[row] = 'Bounced'
+                    report['bounces'] += bool(rows)
+                elif message.get('threadId') in thread_rows:
+                    row = thread_rows[message['threadId']]
+                    results.setdefault(row, 'Replied') # A bounce on the same row wins
+                    report['replies'] += 1
+        report['requests'] = self.requests
+        return results, report, lambda: self.save_state(history_id, started)
+
+def apply_responses(excel_path, results):
+    """
+    Writes 'Bounced' / 'Replied' into each sheet's Response column (created when missing) with a
+    single workbook save. 'Bounced' is never downgraded to 'Replied'. Returns the bounced addresses.
+    """
+    wb = openpyxl.load_workbook(excel_path)
+    replay_status_journal(wb, excel_path) # Keep statuses an interrupted run has not saved yet
+    columns = {} # sheet -> (ws, Response column, Email column), resolved once per sheet
+    bounced = []
+    for (sheet, row), value in sorted(results.items()):
+        if sheet not in columns:
+            if sheet and sheet not in wb.sheetnames: columns[sheet] = None
+            else:
+                ws = wb[sheet] if sheet else wb.active
+                schema = SheetSchema(ws, [c.value for c in ws[1]])
+                columns[sheet] = (ws, schema.ensure(['response', 'responses'], "Response"), schema.col(['email']))
+        if columns[sheet] is None: continue # Sheet renamed or removed since the send
+        ws, col, email_col = columns[sheet]
+        if value == 'Replied' and ws.cell(row=row, column=col + 1).value == 'Bounced': continue
+        apply_status_cell(ws, row, col, value, value.lower())
+        if value == 'Bounced' and email_col != -1:
+            bounced.append(ws.cell(row=row, column=email_col + 1).value)
+    save_workbook_atomic(wb, excel_path)
+    if os.path.exists(status_journal_path(excel_path)): os.remove(status_journal_path(excel_path))
+    return bounced
+
+# --- ADAPTIVE CONCURRENCY ---
+THROTTLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+def send_error_status(e):
+    """(HTTP status, Gmail error reason) of a failed send; (None, "") when it never reached the server."""
+    if isinstance(e, TransportError):
+        return e.status, e.reason
+    if isinstance(e, HttpError):
+        try:
+            reason = (json.loads(e.content).get('error', {}).get('errors') or [{}])[0].get('reason', '')
+        except (ValueError, AttributeError, TypeError):
+            reason = ""
+        return e.resp.status, reason
+    return None, ""
+
+def is_throttle_error(e):
+    status, reason = send_error_status(e)
+    return status == 429 or (status or 0) >= 500 or reason in THROTTLE_REASONS
+
+def retry_delay(attempt):
+    """Exponential backoff with jitter for the n-th retry of a throttled send."""
+    return min(SEND_RETRY_MAX_DELAY, 2 ** attempt) * (0.5 + random.random() / 2)
+
+class ConcurrencyController:
+    """
+    AIMD limit on in-flight sends, replacing a fixed semaphore. Every `window` completed sends
+    the limit grows by one while nothing was throttled and the rolling p95 latency stays under
+    `latency_target`; a throttled send (429, rateLimitExceeded / userRateLimitExceeded, 5xx) or
+    a slow p95 halves it. Only sends submitted after the last decrease can trigger another, so
+    one wave of 429s halves the limit once.
+    """
+
+    def __init__(self, maximum, initial=AIMD_INITIAL_LIMIT, window=AIMD_WINDOW, latency_target=AIMD_P95_TARGET_SECONDS, metrics=None, on_change=None):
+        self.maximum = max(1, maximum)
+        self.limit = max(1, min(initial, self.maximum))
+        self.window = window
+        self.latency_target = latency_target
+        self.metrics = metrics
+        self.on_change = on_change # (old, new, reason), called on the sending thread
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window * 5)
+        self.since_change = 0
+        self.last_decrease = 0.0 # perf_counter of the last decrease
+        self.history = [(0.0, self.limit, "start")]
+        self.started = time.perf_counter()
+        if metrics:
+            metrics.set_gauge("concurrency_limit", self.limit)
+            metrics.record_history("concurrency_limit", self.limit)
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+            if self.metrics: self.metrics.set_gauge("in_flight", self.in_flight)
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            if self.metrics: self.metrics.set_gauge("in_flight", self.in_flight)
+            self.cond.notify_all()
+
+    def p95(self):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+
+    def on_result(self, latency, error=None, submitted_at=None):
+        """Feeds one finished send attempt (latency in seconds, its exception if it failed)."""
+        with self.cond:
+            if error is not None and is_throttle_error(error):
+                if self.metrics: self.metrics.incr("throttled")
+                if submitted_at is None or submitted_at >= self.last_decrease:
+                    status, reason = send_error_status(error)
+                    self.change(max(1, self.limit // 2), f"throttled (HTTP {status} {reason})".replace(" )", ")"), decrease=True)
+                return
+            self.latencies.append(latency)
+            self.since_change += 1
+            if self.since_change < self.window:
+                return
+            p95 = self.p95()
+            if p95 > self.latency_target:
+                self.change(max(1, self.limit // 2), f"p95 latency {p95:.1f}s", decrease=True)
+            elif self.limit < self.maximum:
+                self.change(self.limit + 1, "healthy")
+            else:
+                self.since_change = 0
+
+    def change(self, new_limit, reason, decrease=False):
+        old, self.limit = self.limit, new_limit
+        self.since_change = 0
+        if decrease:
+            self.last_decrease = time.perf_counter()
+            self.latencies.clear()
+        self.cond.notify_all()
+        if old == new_limit: return
+        self.history.append((round(time.perf_counter() - self.started, 2), new_limit, reason))
+        if self.metrics:
+            self.metrics.set_gauge("concurrency_limit", new_limit)
+            self.metrics.record_history("concurrency_limit", new_limit)
+        if self.on_change: self.on_change(old, new_limit, reason)
+
+# --- SHARED RATE LIMITING ---
+# Campaigns running side by side draw on one per-account quota. A token bucket refills at
+# GMAIL_QUOTA_UNITS_PER_SECOND; while several campaigns wait, the one with the lowest
+# virtual time goes next (weighted fair queuing). Each grant moves a campaign's virtual
+# time by units / weight, so weight 3 gets three sends for every one of weight 1, and
+# quota a campaign leaves unused goes to the others. A send costs its transport's
+# quota_units: GMAIL_SEND_QUOTA_UNITS over the REST API, SMTP_SEND_QUOTA_UNITS over SMTP.
+# The bucket only arbitrates between open shares: a campaign running alone is never held
+# back (its transport's AIMD controller deals with 429s), it just drains the bucket.
+
+class SharedRateLimiter:
+    """Token bucket over the account's quota units, handed out through weighted RateShares."""
+
+    def __init__(self, units_per_second=GMAIL_QUOTA_UNITS_PER_SECOND, burst=None):
+        self.rate = units_per_second
+        self.capacity = max(burst or units_per_second * RATE_LIMIT_BURST_SECONDS, GMAIL_SEND_QUOTA_UNITS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+        self.shares = set() # Open RateShares; with one or none there is nothing to divide
+        self.waiting = {} # RateShare -> threads waiting on it
+        self.clock = 0.0 # Virtual time of the latest grant; a share coming back from idle starts here
+
+    def share(self, weight=1):
+        share = RateShare(self, weight)
+        with self.cond:
+            self.shares.add(share)
+        return share
+
+    def release(self, share):
+        with self.cond:
+            self.shares.discard(share)
+            self.cond.notify_all()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, share, units, active=None):
+        with self.cond:
+            if share not in self.waiting:
+                share.vtime = max(share.vtime, self.clock) # No credit saved up while idle
+            self.waiting[share] = self.waiting.get(share, 0) + 1
+            try:
+                while True:
+                    if share.closed or (active and not active()): return False
+                    self.refill()
+                    first = min(self.waiting, key=lambda s: s.vtime)
+                    alone = len(self.shares) <= 1
+                    # A charge larger than the bucket (a packed batch) goes once it is full, leaving a debt
+                    if alone or (first is share and self.tokens >= min(units, self.capacity)):
+                        # Alone, the level still drops so a campaign that starts later finds it right
+                        self.tokens = max(0.0, self.tokens - units) if alone else self.tokens - units
+                        self.clock = share.vtime
+                        share.vtime += units / share.weight
+                        share.granted += units
+                        return True
+                    wait = (min(units, self.capacity) - self.tokens) / self.rate if first is share else RATE_LIMIT_POLL
+                    self.cond.wait(min(max(wait, 0.001), RATE_LIMIT_POLL))
+            finally:
+                self.waiting[share] -= 1
+                if not self.waiting[share]: del self.waiting[share]
+                self.cond.notify_all()
+
+    def notify(self):
+        with self.cond:
+            self.cond.notify_all()
+
+class RateShare:
+    """One campaign's claim on a SharedRateLimiter."""
+
+    def __init__(self, limiter, weight=1):
+        self.limiter = limiter
+        self.weight = max(1, weight)
+        self.vtime = 0.0
+        self.granted = 0 # Quota units used so far
+        self.closed = False
+
+    def acquire(self, units=GMAIL_SEND_QUOTA_UNITS, active=None):
+        """Blocks until `units` may be spent; False once the share is closed or `active()` turns False."""
+        return self.limiter.acquire(self, units, active)
+
+    def set_weight(self, weight):
+        self.weight = max(1, weight)
+        self.limiter.notify()
+
+    def close(self):
+        self.closed = True
+        self.limiter.release(self)
+
+# --- SEND PIPELINE ---
+PIPELINE_DONE = object() # End-of-stream marker passed down the stage queues
+
+class PipelineStage:
+    """
+    `workers` threads that take items (dicts, one per row) from `inbox`, apply `fn` and put
+    the result on `outbox`. Items already carrying an 'outcome' (dropped, skipped, failed,
+    cancelled) pass straight through so every row reaches the record stage; an exception
+    in `fn` becomes that row's failure. Time per item is recorded under the stage name.
+    """
+
+    def __init__(self, name, fn, inbox, outbox, workers=1, metrics=None):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.finished = 0
+        self.threads = [threading.Thread(target=self.work, name=f"{name}-{i}", daemon=True) for i in range(max(1, workers))]
+
+    def start(self):
+        for t in self.threads: t.start()
+
+    def join(self):
+        for t in self.threads: t.join()
+
+    def work(self):
+        with DIAGNOSTICS.profiled_thread(f"stage_{self.name}"):
+            self.process()
+
+    def process(self):
+        while True:
+            item = self.inbox.get()
+            if item is PIPELINE_DONE:
+                with self.lock:
+                    self.finished += 1
+                    last = self.finished == len(self.threads)
+                # The last worker out forwards the marker; the others hand it to a sibling
+                (self.outbox if last else self.inbox).put(PIPELINE_DONE)
+                return
+            if item.get('outcome') is None:
+                started = time.perf_counter()
+                try:
+                    item = self.fn(item)
+                except Exception as e:
+                    item['outcome'], item['error'] = 'error', e
+                if self.metrics:
+                    self.metrics.add_time(self.name, time.perf_counter() - started)
+            if self.metrics:
+                self.metrics.set_gauge(f"queue_{self.name}", self.inbox.qsize())
+            self.outbox.put(item)
+
 # --- WORKER THREAD FOR SENDING EMAILS ---
 class EmailWorker(QThread):
     log_signal = pyqtSignal(str, str) # msg, color
@@ -194,8 +3000,10 @@ class EmailWorker(QThread):
     finished_signal = pyqtSignal(int, int) # sent, failed
     stopped_signal = pyqtSignal(int, int, int) # sent_session, failed_session, pending_total
     error_signal = pyqtSignal(str)
+    metrics_signal = pyqtSignal(dict) # CampaignMetrics snapshot (throttled to ~1/s)
+    dry_run_report_signal = pyqtSignal(dict) # build_dry_run_report() at the end of a dry run
 
-    def __init__(self, service, excel_path, draft_id, start_row, cc_mode, global_cc, bcc_mode, global_bcc, display_name, user_email, total_rows=None, is_resume=False, attachment_mode=True, attachment_empty_rule="yes"):
+    def __init__(self, service, excel_path, draft_id, start_row, cc_mode, global_cc, bcc_mode, global_bcc, display_name, user_email, total_rows=None, is_resume=False, attachment_mode=True, attachment_empty_rule="yes", dedupe=True, fold_plus=False, transport=None, schedule=None, not_before=None, retry_failed=False, pipeline_workers=None, dry_run=False, optimize_html=True, optimize_images=True, sheets=None, rate_limiter=None, progress_files=(PROGRESS_FILE, RESUME_INDEX_FILE)):
         super().__init__()
         self.service = service
         self.excel_path = excel_path
@@ -211,73 +3019,161 @@ class EmailWorker(QThread):
         self.is_resume = is_resume
         self.attachment_mode = attachment_mode # True = Send All, False = Conditional
         self.attachment_empty_rule = attachment_empty_rule # "yes" or "no" for empty cells in conditional mode
+        self.dedupe = dedupe # Skip repeated recipients (normalized address)
+        self.fold_plus = fold_plus # Treat user+tag@domain as user@domain when matching
+        self.transport = transport # None = blocking GmailApiTransport over self.service
+        self.schedule = schedule # SendWindow: release rows through a RowScheduler instead of row order
+        self.not_before = not_before # Scheduled campaign start (aware datetime)
+        self.retry_failed = retry_failed # Resume: send rows that failed last time again
+        self.pipeline_workers = pipeline_workers # Overrides for PIPELINE_WORKERS
+        self.dry_run = dry_run # Run every stage but send nothing and leave the workbook untouched
+        self.optimize_html = optimize_html # Minify / inline CSS in the body once before the row loop
+        self.optimize_images = optimize_images # Merge duplicate inline images, recompress with Pillow
+        self.sheets = sheets # None: active sheet; ALL_SHEETS or [titles]: one campaign over several sheets
+        self.multi_sheet = False # Set once the sheets are resolved
+        self.rate_limiter = rate_limiter # RateShare of a SharedRateLimiter (concurrent campaigns); None = unlimited
+        self.progress_file, self.resume_index_file = progress_files # Where Resume state is kept
         
         self.is_running = True
+        self.metrics = CampaignMetrics("dry_run" if dry_run else "campaign")
+        self.concurrency = None # ConcurrencyController of the running send pipeline
+        self.last_metrics_emit = 0.0
 
+    def emit_metrics(self, force=False):
+        now = time.monotonic()
+        if force or now - self.last_metrics_emit >= 1.0:
+            self.last_metrics_emit = now
+            self.metrics_signal.emit(self.metrics.snapshot())
+
+    def export_metrics(self):
+        try:
+            path = self.metrics.export()
+            self.log_signal.emit(f"📈 Metrics saved: {path}", "#6C757D")
+        except Exception as e:
+            self.log_signal.emit(f"⚠️ Metrics export failed: {e}", "#FFC107")
 
     def run(self):
+        with DIAGNOSTICS.profiled("EmailWorker"):
+            self.run_campaign()
+        DIAGNOSTICS.save_groups() # Pipeline stages and send pools, one merged dump per group
+
+    def run_campaign(self):
         sent_count = 0
         fail_count = 0
+        skip_count = 0
+        metrics = self.metrics
+        for name in ("rows_processed", "sent", "failed", "skipped", "retries", "bytes_sent"):
+            metrics.incr(name, 0)
+        transport = self.transport or (DryRunTransport() if self.dry_run else GmailApiTransport(self.service))
+        checkpoint = None
+        sent_log = None
 
         try:
             # Load Draft Data
-            draft_detail = self.service.users().drafts().get(userId='me', id=self.draft_id).execute()
-            msg0 = draft_detail['message']
-            payload = msg0['payload']
-            subject_tmpl = next((h['value'] for h in payload.get('headers', []) if h['name'] == 'Subject'), '(No Subject)')
-            body_html_tmpl, attachments = extract_body_and_attachments(payload, msg0['id'], self.service)
+            with metrics.stage("draft_download"):
+                draft_detail = self.service.users().drafts().get(userId='me', id=self.draft_id).execute()
+                msg0 = draft_detail['message']
+                payload = msg0['payload']
+                subject_tmpl = next((h['value'] for h in payload.get('headers', []) if h['name'] == 'Subject'), '(No Subject)')
+                body_html_tmpl, attachments = extract_body_and_attachments(payload, msg0['id'], self.service)
+            
+            template_report = None
+            if self.optimize_html:
+                try:
+                    with metrics.stage("template_optimize"):
+                        body_html_tmpl, template_report = optimize_template(body_html_tmpl)
+                except Exception as e:
+                    self.log_signal.emit(f"⚠️ Template optimization skipped: {e}", "#FFC107")
+            
+            image_report = None
+            if self.optimize_images:
+                with metrics.stage("image_optimize"):
+                    body_html_tmpl, attachments, image_report = optimize_inline_images(body_html_tmpl, attachments)
+                if image_report['images'] and Image is None:
+                    self.log_signal.emit("ℹ️ Install Pillow (pip install Pillow) to also recompress inline images.", "#6C757D")
 
             # Load Excel
-            wb = openpyxl.load_workbook(self.excel_path)
+            with metrics.stage("workbook_load"):
+                wb = openpyxl.load_workbook(self.excel_path)
             ws = wb.active
-
-            # Headers & Indexing
-            headers = []
-            visible_indexes = []
-            for idx, cell in enumerate(ws[1]):
-                if not ws.column_dimensions[cell.column_letter].hidden:
-                    headers.append(cell.value)
-                    visible_indexes.append(idx)
-            
-            all_headers = [c.value for c in ws[1]]
-            email_idx = all_headers.index("Email")
+            # Scheduled campaigns stay on the active sheet (their rows are queued by row number)
+            sheets = resolve_campaign_sheets(wb, None if self.schedule else self.sheets)
+            multi_sheet = self.multi_sheet = len(sheets) > 1
             
-            # Status Column Logic (3-Column System)
+            # Statuses journaled by an interrupted run come back before anything else reads them
+            recovered = replay_status_journal(wb, self.excel_path)
+            if recovered and not self.dry_run:
+                save_workbook_atomic(wb, self.excel_path) # Recovered for good: the journal is not replayed again
+                os.remove(status_journal_path(self.excel_path))
+            if recovered:
+                self.log_signal.emit(f"🩹 Recovered {recovered} status cell(s) from an interrupted run.", "#FD7E14")
+            resume_index = ResumeIndex.load(self.excel_path, self.resume_index_file) if self.is_resume else None
+            resumed_from_index = resume_index is not None
+            if resume_index is None:
+                resume_index = ResumeIndex(self.excel_path, ws.max_row)
+            # Several sheets: no row-number Resume; a new run skips rows already marked Sent instead
+            checkpoint = StatusCheckpointer(self.excel_path, metrics, track_progress=not (self.schedule or multi_sheet),
+                                            resume_index=None if multi_sheet else resume_index, enabled=not self.dry_run,
+                                            progress_files=(self.progress_file, self.resume_index_file)).start()
+            sent_log = SentMessageLog(self.excel_path, enabled=not self.dry_run)
+            if not self.dry_run:
+                try:
+                    ResponseTracker(self.service, self.excel_path).mark_start() # Bounce/reply tracking starts here
+                except Exception as e:
+                    self.log_signal.emit(f"⚠️ Bounce/reply tracking unavailable for this campaign: {e}", "#FFC107")
+
+            # Headers & Indexing: resolved once per sheet, then merged into one campaign layout
+            schemas = []
+            for sheet in sheets:
+                schema = SheetSchema(sheet, [c.value for c in sheet[1]],
+                                     [i for i, c in enumerate(sheet[1]) if sheet.column_dimensions[c.column_letter].hidden])
+                schema.email_col = schema.col(['email'])
+                if schema.email_col == -1:
+                    raise ValueError(f"No 'Email' column in sheet '{sheet.title}'.")
+                # Status Column Logic (3-Column System), created when missing
+                schema.col_status = schema.ensure(['status', 'start'], "Status")
+                schema.col_stop = schema.ensure(['stop', 'stopped'], "Stop")
+                schema.col_resume = schema.ensure(['resume', 'resumed'], "Resume")
+                schemas.append(schema)
+            all_headers, visible_indexes = build_campaign_layout(schemas)
+            headers = [all_headers[i] for i in visible_indexes]
             headers_lower = [str(h).strip().lower() for h in all_headers]
+            if multi_sheet:
+                self.log_signal.emit(f"📑 {len(schemas)} sheets in this campaign: {', '.join(s.title for s in schemas)}", "#17A2B8")
             
             def get_col_idx(names):
                 for name in names:
                     if name in headers_lower: return headers_lower.index(name)
                 return -1
 
+            email_idx = get_col_idx(['email'])
             col_status = get_col_idx(['status', 'start'])
-            col_stop = get_col_idx(['stop', 'stopped'])
-            col_resume = get_col_idx(['resume', 'resumed'])
             
             # Attachment Control Column
             col_attachments = get_col_idx(['attachment', 'attachments', 'send attachment', 'send attachments', 'include attachments'])
+            # Per-row files / draft attachment names (overrides the draft's attachments for that row)
+            col_attachment_files = get_col_idx(ATTACHMENT_FILE_COLUMNS)
+            attachment_base_dir = os.path.dirname(os.path.abspath(self.excel_path))
+            # Draft attachments are encoded once per campaign, not once per message
+            draft_parts = [(mime, fname, cid, ATTACHMENT_CACHE.encoded_bytes(fdata)) for mime, fname, fdata, cid in attachments]
+            cache_misses = ATTACHMENT_CACHE.misses
+            
+            # Optional scheduling columns
+            col_send_at = get_col_idx(['send at', 'send_at', 'scheduled'])
+            col_timezone = get_col_idx(['timezone', 'time zone', 'tz'])
             
-            # Ensure Status/Stop/Resume columns exist
-            if col_status == -1:
-                 ws.cell(row=1, column=len(all_headers)+1).value = "Status"
-                 all_headers.append("Status")
-                 col_status = len(all_headers) - 1
-                 headers_lower.append('status')
-            
-            if col_stop == -1:
-                 ws.cell(row=1, column=len(all_headers)+1).value = "Stop"
-                 all_headers.append("Stop")
-                 col_stop = len(all_headers) - 1
-                 headers_lower.append('stop')
-                 
-            if col_resume == -1:
-                 ws.cell(row=1, column=len(all_headers)+1).value = "Resume"
-                 all_headers.append("Resume")
-                 col_resume = len(all_headers) - 1
-                 headers_lower.append('resume')
-
             self.log_signal.emit(f"🚀 Starting from Row {self.start_row}...", "#17A2B8")
 
+            # Recipient index (built once, across every sheet): normalized address -> first (sheet, row), plus the suppression set
+            with metrics.stage("recipient_index"):
+                recipient_index = build_recipient_index(
+                    (((n, r), row[0]) for n, schema in enumerate(schemas)
+                     for r, row in enumerate(schema.ws.iter_rows(min_row=2, min_col=schema.email_col + 1, max_col=schema.email_col + 1, values_only=True), start=2)),
+                    self.fold_plus)
+                suppressed = SuppressionList().load(self.fold_plus)
+            if suppressed:
+                self.log_signal.emit(f"🚫 Suppression list: {len(suppressed)} address(es) will be skipped.", "#6C757D")
+
             # Calculate Total Rows for Progress Bar
             max_row = ws.max_row
             # We use self.total_rows passed from outside for LOGGING consistency, 
@@ -286,282 +3182,777 @@ class EmailWorker(QThread):
             # Let's keep progress bar relative to "this run" but logs absolute "current/total".
             
             total_to_process = max_row - self.start_row + 1
+            if multi_sheet: total_to_process = sum(schema.ws.max_row - 1 for schema in schemas)
             if total_to_process < 1: total_to_process = 1
             
             # If total_rows not provided (e.g. Resume), estimate using Email column
             if not self.total_rows:
-                # Find Email Column
-                email_idx = -1
-                _all_headers = [c.value for c in ws[1]]
-                for i, h in enumerate(_all_headers):
-                     if str(h).strip().lower() == 'email':
-                         email_idx = i
-                         break
-                
-                if email_idx != -1:
-                    # Count non-empty emails
-                    count = 0
-                    try:
-                        for row in ws.iter_rows(min_row=2, min_col=email_idx+1, max_col=email_idx+1):
+                # Count non-empty emails (every sheet of the campaign)
+                count = 0
+                try:
+                    for schema in schemas:
+                        for row in schema.ws.iter_rows(min_row=2, min_col=schema.email_col + 1, max_col=schema.email_col + 1):
                             if row and len(row) > 0 and row[0].value:
                                 count += 1
-                    except Exception as e:
-                        self.log_signal.emit(f"⚠️ Debug: Count Error {e}", "#FFC107")
-                    self.total_rows = count
-                else:
-                    # Fallback
-                    self.total_rows = max_row - 1
+                except Exception as e:
+                    self.log_signal.emit(f"⚠️ Debug: Count Error {e}", "#FFC107")
+                self.total_rows = count
                 
                 if self.total_rows < 1: self.total_rows = 1
+            checkpoint.total_rows = self.total_rows
+            if template_report:
+                metrics.incr("template_bytes_saved", template_report['saved_bytes'])
+                self.log_signal.emit(describe_template_savings(template_report, self.total_rows), "#17A2B8")
+            if image_report and image_report['saved_bytes']:
+                metrics.incr("image_bytes_saved", image_report['saved_bytes'])
+                self.log_signal.emit(describe_image_savings(image_report, self.total_rows), "#17A2B8")
+
+            # Scheduled run: queue every unsent row by due time (rows already Sent/Skipped are done)
+            scheduler = None
+            if self.schedule:
+                scheduler = RowScheduler(self.schedule, self.not_before)
+                for r, values in enumerate(ws.iter_rows(min_row=self.start_row, values_only=True), start=self.start_row):
+                    if len(values) <= email_idx or not values[email_idx]: continue
+                    status = str(values[col_status] or "").strip().lower() if col_status < len(values) else ""
+                    if status.startswith(('sent', 'skipped')): continue
+                    scheduler.add(r, values[col_send_at] if 0 <= col_send_at < len(values) else None,
+                                  values[col_timezone] if 0 <= col_timezone < len(values) else None)
+                total_to_process = max(1, len(scheduler))
+                first_due = scheduler.first_due()
+                self.log_signal.emit(f"⏰ {len(scheduler)} row(s) scheduled, {self.schedule.describe()}."
+                                     + (f" First send {first_due:%Y-%m-%d %H:%M}." if first_due else ""), "#6F42C1")
+
+            # --- Send Pipeline ---
+            # source -> validate -> render -> mime -> send -> record, joined by bounded queues.
+            # validate/render/mime run their own worker threads (PIPELINE_WORKERS), send keeps up to
+            # transport.max_in_flight messages outstanding, and record runs on this thread in row
+            # order because it owns the worksheet, the checkpoint and the progress semantics.
+            workers = dict(PIPELINE_WORKERS, **(self.pipeline_workers or {}))
+            cc_i = next((i for i, h in enumerate(all_headers) if str(h).lower() == "cc"), -1)
+            bcc_i = next((i for i, h in enumerate(all_headers) if str(h).lower() == "bcc"), -1)
+            global_cc = ", ".join(e.strip() for e in re.split(r'[,\n\r]+', self.global_cc or "") if e.strip())
+            global_bcc = ", ".join(e.strip() for e in re.split(r'[,\n\r]+', self.global_bcc or "") if e.strip())
+
+            def position(item):
+                """Row label for the log: 'n/total', prefixed with the sheet on multi-sheet campaigns."""
+                label = f"{item['idx'] - 1}/{self.total_rows}"
+                return f"{schemas[item['sheet']].title} {label}" if multi_sheet else label
+
+            def validate(item):
+                row, idx = item['row'], item['idx']
+                # Rows from other sheets are mapped onto the campaign columns
+                row_values = schemas[item['sheet']].project([cell.value for cell in row]) if row else []
+                if len(row_values) <= email_idx or not row_values[email_idx]:
+                    item['outcome'] = 'drop' # No email
+                    return item
+                recipient = item['recipient'] = row_values[email_idx]
+                
+                # Safety Pad: Ensure row_values matches expected header length
+                if len(row_values) < len(all_headers):
+                     row_values.extend([None] * (len(all_headers) - len(row_values)))
+                item['row_values'] = row_values
+                
+                # Suppression / Duplicate Check (before anything is built)
+                address_key = normalize_address(recipient, self.fold_plus)
+                key = (item['sheet'], idx)
+                if address_key in suppressed:
+                    item['outcome'], item['skip_reason'] = 'skip', "Suppressed"
+                elif self.dedupe and recipient_index.get(address_key, key) != key:
+                    first_sheet, first_row = recipient_index[address_key]
+                    item['outcome'], item['skip_reason'] = 'skip', f"Duplicate of Email #{first_row - 1}" + (f" in {schemas[first_sheet].title}" if multi_sheet else "")
+                return item
+
+            def render(item):
+                idx, row_values = item['idx'], item['row_values']
+                filtered_row = [row_values[i] for i in visible_indexes]
+
+                # Emit "Sending..." status
+                self.live_preview_signal.emit(idx, row_values, "Sending...")
+
+                item['subject'] = personalize(subject_tmpl, filtered_row, headers)
+                item['body'] = personalize(body_html_tmpl, filtered_row, headers)
+
+                # --- DETERMINE CC & BCC ---
+                item['cc'] = item['bcc'] = ""
+                if self.cc_mode == "global" and self.global_cc:
+                    item['cc'] = global_cc
+                elif self.cc_mode == "individual" and cc_i != -1 and row_values[cc_i]:
+                    item['cc'] = str(row_values[cc_i]).strip()
+                if self.bcc_mode == "global" and self.global_bcc:
+                    item['bcc'] = global_bcc
+                elif self.bcc_mode == "individual" and bcc_i != -1 and row_values[bcc_i]:
+                    item['bcc'] = str(row_values[bcc_i]).strip()
+
+                # Attachments Logic
+                # Determine if we should send attachments for this user
+                send_attachments_for_user = True
+                
+                if not self.attachment_mode: # Conditional Mode
+                    # Check Excel Column
+                    if col_attachments != -1:
+                        val = row_values[col_attachments]
+                        str_val = str(val).strip().lower() if val else ""
+                        
+                        if not str_val: # Empty
+                             if self.attachment_empty_rule == "no":
+                                 send_attachments_for_user = False
+                        elif str_val in ['no', 'n', 'false', '0']:
+                            send_attachments_for_user = False
+                    else:
+                        # CRITICAL SAFETY: If conditional mode but column missing, DO NOT SEND.
+                        send_attachments_for_user = False
+                        if idx == self.start_row: # Log once
+                            self.log_signal.emit("⚠️ Formatting Error: 'Send Attachments' column not found. Skipping attachments.", "#FFC107")
+                item['with_attachments'] = send_attachments_for_user
+                
+                item['status_msg'] = "Sent"
+                if attachments:
+                    item['status_msg'] = "Sent with Attachment" if send_attachments_for_user else "Sent without Attachment"
+                
+                if col_attachment_files != -1 and split_attachment_cell(row_values[col_attachment_files]):
+                    item['row_files'] = resolve_row_attachments(row_values[col_attachment_files], attachments, attachment_base_dir)
+                    item['status_msg'] = "Sent with Attachment"
+                return item
+
+            def build_mime(item):
+                msg = MIMEMultipart('related')
+                msg['From'] = f"{self.display_name} <{self.user_email}>"
+                msg['To'] = item['recipient']
+                msg['Subject'] = item['subject']
+                if item['cc']:
+                    msg['Cc'] = item['cc']
+                if item['bcc']:
+                    msg['Bcc'] = item['bcc']
+
+                alt = MIMEMultipart('alternative')
+                alt.attach(MIMEText(item.pop('body'), 'html'))
+                msg.attach(alt)
+
+                if 'row_files' in item:
+                    # Inline images belong to the body; the row's list picks everything else
+                    for mime, fname, cid, encoded in draft_parts:
+                        if mime.startswith('image/') and cid:
+                            msg.attach(encoded_part(mime, fname, encoded, cid))
+                    for kind, ref in item.pop('row_files'):
+                        if kind == 'draft':
+                            mime, fname, cid, encoded = draft_parts[ref]
+                            if not (mime.startswith('image/') and cid):
+                                msg.attach(encoded_part(mime, fname, encoded))
+                        else:
+                            mime = mimetypes.guess_type(ref)[0] or 'application/octet-stream'
+                            msg.attach(encoded_part(mime, os.path.basename(ref), ATTACHMENT_CACHE.encoded_file(ref)))
+                elif item['with_attachments']:
+                    for mime, fname, cid, encoded in draft_parts:
+                        msg.attach(encoded_part(mime, fname, encoded, cid if mime.startswith('image/') else None))
+
+                item['msg'] = msg
+                item['raw'] = msg.as_bytes()
+                item['bytes'] = len(item['raw'])
+                return item
+
+            def on_limit_change(old, new, reason):
+                if new < old:
+                    self.log_signal.emit(f"🚦 Send concurrency {old} → {new}: {reason}", "#FD7E14")
+
+            # Adaptive in-flight limit (AIMD) up to what the transport can carry
+            controller = ConcurrencyController(transport.max_in_flight, getattr(transport, 'initial_in_flight', AIMD_INITIAL_LIMIT),
+                                               metrics=metrics, on_change=on_limit_change)
+            self.concurrency = controller
+
+            quota_units = getattr(transport, 'quota_units', GMAIL_SEND_QUOTA_UNITS)
+            # A batching transport takes quota per packed request: waiting here would space sends out before packing
+            rate_share = None if getattr(transport, 'packs_quota', False) else self.rate_limiter
+            submit_options = {'rate_share': self.rate_limiter} if rate_share is None and self.rate_limiter else {}
+
+            def send(item):
+                # Concurrent campaigns wait their weighted turn for the account's quota
+                if not self.is_running or (rate_share and not rate_share.acquire(quota_units, active=lambda: self.is_running)):
+                    item['outcome'] = 'cancelled' # Stop pressed: nothing new goes out
+                    return item
+                controller.acquire() # Backpressure: at most controller.limit outstanding sends
+                raw, msg = item.pop('raw'), item.pop('msg')
+                result = Future() # Resolves once the send succeeds or runs out of retries
+                item['attempts'] = 0
+
+                def finish(error=None, response=None):
+                    controller.release()
+                    if error is None: result.set_result(response)
+                    else: result.set_exception(error)
+
+                def attempt(retry=False):
+                    # A retried send costs quota too; Stop during its backoff cancels it
+                    if retry and (not self.is_running or (rate_share and not rate_share.acquire(quota_units, active=lambda: self.is_running))):
+                        item['outcome'] = 'cancelled'
+                        finish(response=None)
+                        return
+                    item['submitted_at'] = time.perf_counter()
+                    try:
+                        transport.submit(raw, msg=msg, **submit_options).add_done_callback(done)
+                    except Exception as e:
+                        finish(e)
+
+                def done(future):
+                    item['done_at'] = time.perf_counter()
+                    error = future.exception()
+                    controller.on_result(item['done_at'] - item['submitted_at'], error, item['submitted_at'])
+                    if error is not None and is_throttle_error(error) and item['attempts'] < SEND_MAX_RETRIES and self.is_running:
+                        item['attempts'] += 1
+                        metrics.incr("retries")
+                        threading.Timer(retry_delay(item['attempts']), attempt, kwargs={'retry': True}).start() # Keeps its slot while backing off
+                        return
+                    finish(error, None if error else future.result())
+
+                attempt()
+                item['future'] = result
+                return item
+
+            queues = [queue.Queue(PIPELINE_QUEUE_SIZE) for _ in range(5)]
+            stages = [
+                PipelineStage("validate", validate, queues[0], queues[1], workers['validate'], metrics),
+                PipelineStage("personalize", render, queues[1], queues[2], workers['render'], metrics),
+                PipelineStage("mime_build", build_mime, queues[2], queues[3], workers['mime'], metrics),
+                PipelineStage("submit", send, queues[3], queues[4], 1, metrics),
+            ]
+
+            # --- Row Source (in row order, or in due-time order for a scheduled run) ---
+            if scheduler is not None:
+                row_source = self.scheduled_rows(ws, scheduler)
+            elif multi_sheet:
+                row_source = None # One reader thread per sheet, see source()
+            elif resumed_from_index:
+                # Straight to the rows the index still lists as pending
+                row_source = ((r, ws[r]) for r in resume_index.pending_rows(self.start_row, max_row, self.retry_failed))
+                if self.retry_failed:
+                    self.log_signal.emit(f"🔁 Retrying {resume_index.failed_count()} previously failed row(s).", "#17A2B8")
+            else:
+                row_source = enumerate(ws.iter_rows(min_row=self.start_row), start=self.start_row)
 
+            source_state = {'stop_row': None, 'error': None}
 
-            # Iterate Rows
-            processed_count = 0
-            for idx, row in enumerate(ws.iter_rows(min_row=self.start_row), start=self.start_row):
+            def source():
+                seq = 0
                 try:
-                    if not self.is_running:
-                        self.save_progress_and_stop(idx, wb, sent_count, fail_count)
-                        wb.save(self.excel_path) # CRITICAL FIX: Save on Stop
+                    if multi_sheet:
+                        read_sheets()
                         return
-                        
-                    # Debug Point 1: Row Loaded
-                    # self.log_signal.emit(f"Debug: Row {idx} raw len {len(row)}", "#17A2B8")
+                    for idx, row in row_source:
+                        if not self.is_running:
+                            source_state['stop_row'] = idx
+                            break
+                        metrics.incr("rows_processed")
+                        queues[0].put({'seq': seq, 'idx': idx, 'row': row, 'sheet': 0, 'first_of_resume': self.is_resume and seq == 0})
+                        seq += 1
+                except Exception as e:
+                    source_state['error'] = e
+                finally:
+                    queues[0].put(PIPELINE_DONE)
 
-                    processed_count += 1
-                    
-                    # Update Progress Bar
-                    if self.total_rows and self.total_rows > 0:
-                         progress_percent = int(((idx - 1) / self.total_rows) * 100)
-                    else:
-                         progress_percent = int((processed_count / total_to_process) * 100)
-                    
-                    self.progress_signal.emit(progress_percent)
+            def read_sheets():
+                """Streams every sheet on its own thread into the shared queue; rows already Sent/Skipped are done."""
+                seq_lock = threading.Lock()
+                next_seq = iter(range(sys.maxsize))
 
-                    if not row: continue # Empty row tuple
-                    
-                    # Safe Email Access
+                def read(n, schema):
                     try:
-                         if len(row) > email_idx and row[email_idx].value:
-                             recipient = row[email_idx].value
-                         else:
-                             continue # No email
-                    except IndexError:
-                         continue
-
-                    row_values = [cell.value for cell in row]
-                    
-                    # Safety Pad: Ensure row_values matches expected header length
-                    if len(row_values) < len(all_headers):
-                         row_values.extend([None] * (len(all_headers) - len(row_values)))
-                         
-                    # Debug Point 2: Padding Done
-                    
-                    filtered_row = [row_values[i] for i in visible_indexes]
-
-                    # Emit "Sending..." status
-                    self.live_preview_signal.emit(idx, row_values, "Sending...")
+                        for idx, row in enumerate(schema.ws.iter_rows(min_row=2), start=2):
+                            if not self.is_running:
+                                source_state['stop_row'] = idx
+                                return
+                            status = row[schema.col_status].value if schema.col_status < len(row) else None
+                            if str(status or "").strip().lower().startswith(('sent', 'skipped')): continue
+                            with seq_lock:
+                                metrics.incr("rows_processed")
+                                queues[0].put({'seq': next(next_seq), 'idx': idx, 'row': row, 'sheet': n, 'first_of_resume': False})
+                    except Exception as e:
+                        source_state['error'] = e
 
-                    # Personalize (Potential Crash Point)
-                    subj_p = personalize(subject_tmpl, filtered_row, headers)
-                    body_p = personalize(body_html_tmpl, filtered_row, headers)
+                readers = [threading.Thread(target=read, args=(n, schema), name=f"SheetReader-{n}", daemon=True)
+                           for n, schema in enumerate(schemas)]
+                for reader in readers: reader.start()
+                for reader in readers: reader.join()
 
-                    # --- DETERMINE CC & BCC ---
-                    current_cc = ""
-                    current_bcc = ""
-                    
-                    # CC Logic
-                    if self.cc_mode == "global" and self.global_cc:
-                        raw_cc = self.global_cc
-                        emails = [e.strip() for e in re.split(r'[,\n\r]+', raw_cc) if e.strip()]
-                        current_cc = ", ".join(emails)
-                    elif self.cc_mode == "individual":
-                        try:
-                            # Case-insensitive search for CC
-                            cc_i = next(i for i, h in enumerate(all_headers) if str(h).lower() == "cc")
-                            if len(row_values) > cc_i and row_values[cc_i]: 
-                                current_cc = str(row_values[cc_i]).strip()
-                        except: pass
-
-                    # BCC Logic
-                    if self.bcc_mode == "global" and self.global_bcc:
-                        raw_bcc = self.global_bcc
-                        emails = [e.strip() for e in re.split(r'[,\n\r]+', raw_bcc) if e.strip()]
-                        current_bcc = ", ".join(emails)
-                    elif self.bcc_mode == "individual":
-                        try:
-                            # Case-insensitive search for BCC
-                            bcc_i = next(i for i, h in enumerate(all_headers) if str(h).lower() == "bcc")
-                            if len(row_values) > bcc_i and row_values[bcc_i]:
-                                current_bcc = str(row_values[bcc_i]).strip()
-                        except: pass
-
-
-
-                    # --- SENDING LOGIC ---
-                    msg = MIMEMultipart('related')
-                    msg['From'] = f"{self.display_name} <{self.user_email}>"
-                    msg['To'] = recipient
-                    msg['Subject'] = subj_p
-
-                    # Apply CC
-                    if current_cc:
-                        msg['Cc'] = current_cc
-                    
-                    # Apply BCC
-                    if current_bcc:
-                        msg['Bcc'] = current_bcc
+            # --- Result Recording (runs on this thread, in row order) ---
+            def write_status(schema, idx, col, value, style=None):
+                apply_status_cell(schema.ws, idx, col, value, style)
+                checkpoint.record(idx, col, value, style, sheet=schema.title if multi_sheet else None)
+            
+            def record_success(item, response):
+                nonlocal sent_count
+                idx, recipient, row_values, status_msg = item['idx'], item['recipient'], item['row_values'], item['status_msg']
+                schema = schemas[item['sheet']]
+                
+                send_latency = item.get('done_at', time.perf_counter()) - item['submitted_at']
+                metrics.add_time("http_send", send_latency)
+                metrics.observe("send_latency_seconds", send_latency)
+                metrics.incr("bytes_sent", item['bytes'])
+                
+                log_msg = f"[{position(item)}] ✅ {status_msg} to {recipient}"
+                if self.dry_run: log_msg = f"[{position(item)}] 🧪 Built for {recipient} ({item['bytes'] / 1024:.0f} KB, not sent)"
+                self.log_signal.emit(log_msg, "#28A745")
+                
+                
+                # --- 3-Column Logic ---
+                
+                # 1. Update "Status" Column
+                if schema.col_status != -1:
+                    # Color Logic
+                    if "without Attachment" in status_msg:
+                         write_status(schema, idx, schema.col_status, status_msg, 'sent_no_attachment')
+                    else:
+                         write_status(schema, idx, schema.col_status, status_msg, 'sent')
+
+                # 2. Update "Resume" Column (Yellow "Resumed")
+                # Only for the FIRST processed row if this is a Resume session
+                if item['first_of_resume']:
+                    if schema.col_resume != -1:
+                        write_status(schema, idx, schema.col_resume, "Resumed", 'resumed')
+                    self.live_preview_signal.emit(idx, row_values, "Resumed")
+                else:
+                    self.live_preview_signal.emit(idx, row_values, "Sent")
 
-                    alt = MIMEMultipart('alternative')
-                    alt.attach(MIMEText(body_p, 'html'))
-                    msg.attach(alt)
+                checkpoint.row_done(idx)
+                sent_log.record(idx, recipient, response, sheet=schema.title if multi_sheet else None) # Message id for reconciliation
+                sent_count += 1
+                metrics.incr("sent")
 
-                    # Attachments Logic
-                    # Determine if we should send attachments for this user
-                    send_attachments_for_user = True
-                    
-                    if not self.attachment_mode: # Conditional Mode
-                        # Check Excel Column
-                        if col_attachments != -1:
-                            val = row_values[col_attachments]
-                            str_val = str(val).strip().lower() if val else ""
-                            
-                            if not str_val: # Empty
-                                 if self.attachment_empty_rule == "no":
-                                     send_attachments_for_user = False
-                            elif str_val in ['no', 'n', 'false', '0']:
-                                send_attachments_for_user = False
-                        else:
-                            # CRITICAL SAFETY: If conditional mode but column missing, DO NOT SEND.
-                            send_attachments_for_user = False
-                            if idx == self.start_row: # Log once
-                                self.log_signal.emit("⚠️ Formatting Error: 'Send Attachments' column not found. Skipping attachments.", "#FFC107")
-                                
-                                 
-                    if send_attachments_for_user:
-                        for mime, fname, fdata, cid in attachments:
-                            if mime.startswith('image/') and cid:
-                                img = MIMEImage(fdata, _subtype=mime.split('/')[1])
-                                img.add_header('Content-ID', cid)
-                                img.add_header('Content-Disposition', 'inline', filename=fname)
-                                msg.attach(img)
-                            else:
-                                part = MIMEBase(*mime.split('/', 1))
-                                part.set_payload(fdata)
-                                encoders.encode_base64(part)
-                                part.add_header('Content-Disposition', 'attachment', filename=fname)
-                                msg.attach(part)
-
-
-                    raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-                    self.service.users().messages().send(userId='me', body={'raw': raw}).execute()
-                    
-                    status_msg = "Sent"
-                    if attachments:
-                        status_msg = "Sent with Attachment" if send_attachments_for_user else "Sent without Attachment"
-                    
-                    log_msg = f"[{idx - 1}/{self.total_rows}] ✅ {status_msg} to {recipient}"
-                    self.log_signal.emit(log_msg, "#28A745")
-                    
-                    
-                    # --- 3-Column Logic ---
-                    
-                    # 1. Update "Status" Column
-                    # 1. Update "Status" Column
-                    if col_status != -1:
-                        cell = ws.cell(row=idx, column=col_status + 1)
-                        cell.value = status_msg
-                        
-                        # Color Logic
-                        if "without Attachment" in status_msg:
-                             # Light Green for "Sent without Attachment"
-                             cell.fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-                             cell.font = openpyxl.styles.Font(color="006100") 
-                        else:
-                             # Dark Green for "Sent with Attachment"
-                             cell.fill = PatternFill(start_color="198754", end_color="198754", fill_type="solid")
-                             cell.font = openpyxl.styles.Font(color="FFFFFF", bold=True)
-
-                    # 2. Update "Resume" Column (Yellow "Resumed")
-                    # Only for the FIRST processed row if this is a Resume session
-                    if self.is_resume and processed_count == 1:
-                        if col_resume != -1:
-                            cell = ws.cell(row=idx, column=col_resume + 1)
-                            cell.value = "Resumed"
-                            cell.fill = PatternFill(start_color="FFFFFF99", end_color="FFFFFF99", fill_type="solid") # Yellow
-                        self.live_preview_signal.emit(idx, row_values, "Resumed")
+            def record_failure(schema, idx, recipient, row_values, e):
+                nonlocal fail_count
+                tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+                self.log_signal.emit(f"❌ Failed to {recipient}: {e}\nTraceback:\n{tb}", "#DC3545")
+                
+                # Error in "Status" column? Or Stop? usually Status.
+                if schema.col_status != -1:
+                    write_status(schema, idx, schema.col_status, f"Error: {str(e)}", 'error')
+
+                if row_values is not None:
+                    self.live_preview_signal.emit(idx, row_values, "Error")
+                checkpoint.row_done(idx, ok=False)
+                fail_count += 1
+                metrics.incr("failed")
+
+            def record_skip(item):
+                nonlocal skip_count
+                idx, skip_reason, schema = item['idx'], item['skip_reason'], schemas[item['sheet']]
+                self.log_signal.emit(f"[{position(item)}] ⏭ Skipped {item['recipient']} ({skip_reason})", "#6C757D")
+                if schema.col_status != -1:
+                    write_status(schema, idx, schema.col_status, f"Skipped: {skip_reason}", 'skipped')
+                checkpoint.row_done(idx)
+                self.live_preview_signal.emit(idx, item['row_values'], "Skipped")
+                skip_count += 1
+                metrics.incr("skipped")
+
+            cancelled_rows = []
+            recorded_count = 0
+
+            def record(item):
+                nonlocal recorded_count
+                outcome = item.get('outcome')
+                if outcome == 'drop': return
+                if outcome == 'cancelled':
+                    cancelled_rows.append(item['idx'])
+                    return
+                if outcome == 'skip':
+                    record_skip(item)
+                elif outcome == 'error':
+                    record_failure(schemas[item['sheet']], item['idx'], item.get('recipient', 'Unknown'), item.get('row_values'), item['error'])
+                else:
+                    try:
+                        response = item['future'].result()
+                    except Exception as e:
+                        record_failure(schemas[item['sheet']], item['idx'], item['recipient'], item['row_values'], e)
                     else:
-                        self.live_preview_signal.emit(idx, row_values, "Sent")
-
-                    sent_count += 1
+                        if item.get('outcome') == 'cancelled': # Stop pressed while its retry was backing off
+                            cancelled_rows.append(item['idx'])
+                            return
+                        record_success(item, response)
                 
-                except IndexError as ie:
-                    # Capture exact list error
-                    import traceback
-                    tb = traceback.format_exc()
-                    self.log_signal.emit(f"❌ Index Error Row {idx}: {ie}\nTraceback:\n{tb}", "#DC3545")
-                    fail_count += 1
-                    
-                except Exception as e:
-                    import traceback
-                    tb = traceback.format_exc()
-                    self.log_signal.emit(f"❌ Failed to {recipient if 'recipient' in locals() else 'Unknown'}: {e}\nTraceback:\n{tb}", "#DC3545")
-                    
-                    # Error in "Status" column? Or Stop? usually Status.
-                    if 'col_status' in locals() and col_status != -1:
-                        cell = ws.cell(row=idx, column=col_status + 1)
-                        cell.value = f"Error: {str(e)}"
-                        cell.fill = PatternFill(start_color="FFFF9999", end_color="FFFF9999", fill_type="solid") # Red
+                # Update Progress Bar
+                recorded_count += 1
+                if self.total_rows and self.total_rows > 0 and scheduler is None and not multi_sheet:
+                     progress_percent = int(((item['idx'] - 1) / self.total_rows) * 100)
+                else:
+                     progress_percent = int((recorded_count / total_to_process) * 100)
+                self.progress_signal.emit(progress_percent)
+                self.emit_metrics()
 
-                    if 'row_values' in locals():
-                        self.live_preview_signal.emit(idx, row_values, "Error")
-                    fail_count += 1
+            source_thread = threading.Thread(target=source, name="RowSource", daemon=True)
+            source_thread.start()
+            for stage in stages: stage.start()
+            
+            # Items leave the parallel stages out of order; record them by sequence number
+            expected_seq = 0
+            waiting = {}
+            while True:
+                item = queues[4].get()
+                if item is PIPELINE_DONE: break
+                waiting[item['seq']] = item
+                while expected_seq in waiting:
+                    record(waiting.pop(expected_seq))
+                    expected_seq += 1
+            for seq in sorted(waiting): record(waiting[seq])
+            source_thread.join()
+            for stage in stages: stage.join()
+            if source_state['error']: raise source_state['error']
+
+            # Stop: the first row that was not sent is where Resume starts
+            stop_rows = cancelled_rows + ([source_state['stop_row']] if source_state['stop_row'] is not None else [])
+            if col_attachment_files != -1:
+                self.log_signal.emit(f"📎 Per-row attachments: {ATTACHMENT_CACHE.misses - cache_misses} file(s) encoded, "
+                                     f"{len(ATTACHMENT_CACHE.blobs)} cached for reuse.", "#0D6EFD")
+            batch_stats = transport.describe_stats() if hasattr(transport, 'describe_stats') else ""
+            if batch_stats:
+                self.log_signal.emit(batch_stats, "#0D6EFD")
+            if self.dry_run:
+                self.finish_dry_run(transport, stopped=bool(stop_rows))
+                return
+            if stop_rows:
+                checkpoint.close()
+                if not (self.schedule or multi_sheet): resume_index.save(self.resume_index_file)
+                pending = max(0, self.total_rows - recorded_count) if multi_sheet else None
+                self.save_progress_and_stop(min(stop_rows), wb, sent_count, fail_count, pending) # Saves the workbook (CRITICAL FIX: Save on Stop)
+                checkpoint.discard()
+                self.emit_metrics(force=True)
+                self.export_metrics()
+                return
+
+            checkpoint.close()
 
             # Done
-            wb.save(self.excel_path)
-            if os.path.exists(PROGRESS_FILE): os.remove(PROGRESS_FILE)
+            with metrics.stage("workbook_save"):
+                save_workbook_atomic(wb, self.excel_path)
+            checkpoint.discard()
+            if skip_count:
+                self.log_signal.emit(f"⏭ Skipped {skip_count} duplicate/suppressed recipient(s).", "#6C757D")
+            if not self.schedule:
+                if os.path.exists(self.progress_file): os.remove(self.progress_file)
+                ResumeIndex.discard(self.resume_index_file)
+            self.emit_metrics(force=True)
+            self.export_metrics()
             self.finished_signal.emit(sent_count, fail_count)
 
         except Exception as e:
             self.error_signal.emit(f"Critical Worker Error: {e}")
+        finally:
+            if checkpoint: checkpoint.close() # Flush; the journal is kept for replay unless the workbook was saved
+            if sent_log: sent_log.close()
+            transport.close()
+
+    def finish_dry_run(self, transport, stopped=False):
+        report = build_dry_run_report(self.metrics.snapshot(), getattr(transport, 'sizes', []))
+        self.log_signal.emit(f"🧪 Dry run {'stopped' if stopped else 'complete'}: {report['built']} message(s) built, "
+                             f"{report['messages_per_second']:.1f} msg/s, max {report['max_bytes'] / 1024:.0f} KB. Nothing was sent.", "#6F42C1")
+        self.emit_metrics(force=True)
+        self.export_metrics()
+        self.dry_run_report_signal.emit(report)
+        self.finished_signal.emit(-1, -1) if stopped else self.finished_signal.emit(report['built'], report['failed'])
+
+    def save_progress_and_stop(self, idx, wb, sent_count, fail_count, pending=None):
+        # Mark current row as Stopped if not sent
+        try:
+           ws = wb.active
+           headers = [str(c.value).strip().lower() for c in ws[1]]
+           
+           # Find "Stop" column
+           col_stop = -1
+           for i, h in enumerate(headers):
+               if h in ['stop', 'stopped']:
+                   col_stop = i
+                   break
+           
+           if col_stop != -1 and not self.multi_sheet: # A row number alone is ambiguous across several sheets
+               apply_status_cell(ws, idx, col_stop, "Stopped", 'stopped')
+        except: pass
+        
+        with self.metrics.stage("workbook_save"):
+            save_workbook_atomic(wb, self.excel_path)
+        if self.schedule:
+            # Scheduled rows run out of order; re-running the campaign skips rows already marked Sent
+            self.log_signal.emit("💾 Progress saved. Requeue the scheduled campaign to continue.", "#FD7E14")
+        elif self.multi_sheet:
+            self.log_signal.emit("💾 Progress saved. Start the campaign again to continue; rows already marked Sent are skipped.", "#FD7E14")
+        else:
+            write_json_atomic(self.progress_file, progress_record(idx, self.total_rows, self.excel_path))
+            # Log exactly where we are saving, so the user knows where Resume will start
+            self.log_signal.emit(f"💾 Progress saved. Resume will start from Email #{idx - 1}.", "#FD7E14")
+        
+        # Calculate Pending
+        if pending is None:
+            pending = max(0, self.total_rows - (idx - 2)) if self.total_rows else 0
+
+        self.stopped_signal.emit(sent_count, fail_count, pending)
+        self.finished_signal.emit(-1, -1) # -1 indicates stopped
+
+    def scheduled_rows(self, ws, scheduler):
+        """Yields (row_index, row) as each row comes due."""
+        announced = None
+        while scheduler:
+            if not self.is_running:
+                yield scheduler.peek(), ws[scheduler.peek()] # Let the row loop run its Stop handling
+                return
+            idx, wait = scheduler.pop_due()
+            if idx is not None:
+                yield idx, ws[idx]
+                continue
+            due_at = time.time() + wait
+            if wait > 60 and (announced is None or abs(due_at - announced) > 60):
+                announced = due_at
+                self.log_signal.emit(f"⏰ Waiting for the send window - next send at {datetime.datetime.fromtimestamp(due_at):%Y-%m-%d %H:%M} ({len(scheduler)} queued)", "#6F42C1")
+            self.metrics.set_gauge("scheduled_pending", len(scheduler))
+            self.emit_metrics()
+            time.sleep(min(wait, 1.0))
+
+    def stop(self):
+        self.is_running = False
+
+
+
+
+# --- WORKER FOR DELIVERY RECONCILIATION ---
+class ReconcileWorker(QThread):
+    """
+    Confirms logged sends are in the Sent folder: ids from <excel>.sent.jsonl are checked with
+    batched messages.get(format='minimal') calls, RECONCILE_WORKERS batches at a time (each
+    thread with its own service). While `busy()` is true (a campaign is sending) every batch
+    waits RECONCILE_BUSY_DELAY first, so reconciling never competes with an active send.
+    """
+    log_signal = pyqtSignal(str, str)
+    progress_signal = pyqtSignal(int)
+    finished_signal = pyqtSignal(dict) # format_reconcile_report() input
+
+    def __init__(self, service, excel_path, credentials=None, busy=None, recheck=False, workers=RECONCILE_WORKERS):
+        super().__init__()
+        self.service = service
+        self.excel_path = excel_path
+        self.credentials = credentials
+        self.busy = busy or (lambda: False)
+        self.recheck = recheck # Also re-check rows already confirmed in Sent
+        self.workers = workers if credentials else 1
+        self.local = threading.local()
+        self.is_running = True
+
+    def thread_service(self):
+        if not self.credentials: return self.service
+        if not hasattr(self.local, 'service'):
+            self.local.service = build('gmail', 'v1', credentials=self.credentials.creds, cache_discovery=False)
+        return self.local.service
+
+    def check(self, message_ids):
+        if not self.is_running: return {}, 0
+        while self.busy() and self.is_running:
+            time.sleep(RECONCILE_BUSY_DELAY)
+            if not self.busy(): break
+        return check_sent_batch(self.thread_service(), message_ids)
 
-    def save_progress_and_stop(self, idx, wb, sent_count, fail_count):
-        # Mark current row as Stopped if not sent
+    def run(self):
+        started = time.perf_counter()
+        entries = SentMessageLog.load(self.excel_path)
+        todo = [e for e in entries.values() if self.recheck or e.get('state') != 'sent']
+        report = {'checked': 0, 'sent': 0, 'not_in_sent': 0, 'trashed': 0, 'missing': 0, 'requests': 0,
+                  'unchecked': 0, 'already_confirmed': len(entries) - len(todo)}
         try:
-           ws = wb.active
-           headers = [str(c.value).strip().lower() for c in ws[1]]
-           
-           # Find "Stop" column
-           col_stop = -1
-           for i, h in enumerate(headers):
-               if h in ['stop', 'stopped']:
-                   col_stop = i
-                   break
-           
-           if col_stop != -1:
-               cell = ws.cell(row=idx, column=col_stop + 1)
-               cell.value = "Stopped"
-               cell.fill = PatternFill(start_color="FFFF9999", end_color="FFFF9999", fill_type="solid") # Red
-        except: pass
-        
-        wb.save(self.excel_path)
-        with open(PROGRESS_FILE, 'w') as f:
-            json.dump({"last_row": idx}, f)
-        # Log exactly where we are saving, so the user knows where Resume will start
-        self.log_signal.emit(f"💾 Progress saved. Resume will start from Email #{idx - 1}.", "#FD7E14")
-        
-        # Calculate Pending
-        pending = 0
-        if self.total_rows:
-            pending = max(0, self.total_rows - (idx - 2))
-
-        self.stopped_signal.emit(sent_count, fail_count, pending)
-        self.finished_signal.emit(-1, -1) # -1 indicates stopped
+            resolved, report['requests'] = resolve_message_ids(self.service, todo) # SMTP sends: Message-ID -> Gmail id
+        except Exception as e:
+            resolved = 0
+            self.log_signal.emit(f"⚠️ Could not look up SMTP sends by Message-ID: {e}", "#FFC107")
+        by_id = {e['id']: e for e in todo if not is_header_message_id(e['id'])}
+        chunks = [list(by_id)[i:i + RECONCILE_BATCH] for i in range(0, len(by_id), RECONCILE_BATCH)]
+        self.log_signal.emit(f"🔎 Reconciling {len(by_id)} sent message(s) in {len(chunks)} batch request(s)...", "#17A2B8")
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="Reconcile") as pool:
+                for done, future in enumerate(as_completed([pool.submit(self.check, chunk) for chunk in chunks]), start=1):
+                    results, requests = future.result()
+                    report['requests'] += requests
+                    checked_at = time.time()
+                    for message_id, (state, labels) in results.items():
+                        by_id[message_id].update(state=state, labels=labels, checked_at=checked_at)
+                        report[state] += 1
+                        report['checked'] += 1
+                    self.progress_signal.emit(int(done / len(chunks) * 100))
+        except Exception as e:
+            self.log_signal.emit(f"❌ Reconciliation stopped: {e}", "#DC3545")
+        if report['checked'] or resolved:
+            SentMessageLog.save(self.excel_path, entries)
+        report['unchecked'] = len(todo) - report['checked'] # Including SMTP sends not found by Message-ID yet
+        report['elapsed_seconds'] = time.perf_counter() - started
+        self.log_signal.emit(f"🔎 Reconciled {report['checked']} message(s): {report['sent']} in Sent, "
+                             f"{report['missing'] + report['trashed'] + report['not_in_sent']} need attention.", "#17A2B8")
+        self.finished_signal.emit(report)
 
     def stop(self):
         self.is_running = False
 
+# --- WORKER FOR BOUNCE & REPLY TRACKING ---
+class ResponseTrackerWorker(QThread):
+    """Runs ResponseTracker.sync(), writes the results with one workbook save and suppresses bounced addresses."""
+    log_signal = pyqtSignal(str, str)
+    finished_signal = pyqtSignal(dict)
+
+    def __init__(self, service, excel_path, suppress_bounces=True):
+        super().__init__()
+        self.service = service
+        self.excel_path = excel_path
+        self.suppress_bounces = suppress_bounces
+
+    def run(self):
+        try:
+            tracker = ResponseTracker(self.service, self.excel_path)
+            results, report, commit = tracker.sync()
+            if report['mode'] == 'baseline':
+                self.log_signal.emit("📬 Bounce/reply tracking starts now for this file; check again later.", "#17A2B8")
+                self.finished_signal.emit(report)
+                return
+            if report['mode'] == 'full':
+                self.log_signal.emit("📬 Mailbox history expired; searched messages since the campaign instead.", "#FD7E14")
+            report['suppressed'] = 0
+            if results:
+                bounced = apply_responses(self.excel_path, results)
+                if self.suppress_bounces and bounced:
+                    report['suppressed'] = SuppressionList().add(bounced, reason="bounced")
+            commit()
+            report['rows_updated'] = len(results)
+            self.log_signal.emit(f"📬 {report['new_messages']} new message(s), {report['bounces']} bounce(s), "
+                                 f"{report['replies']} repl(ies); {len(results)} row(s) updated "
+                                 f"({report['requests']} request(s)).", "#17A2B8")
+            self.finished_signal.emit(report)
+        except Exception as e:
+            self.log_signal.emit(f"❌ Bounce/reply check failed: {e}", "#DC3545")
 
+# --- CONCURRENT CAMPAIGNS ---
+class CampaignManager(QObject):
+    """
+    Runs several campaigns (draft + workbook pairs) at once, each in its own EmailWorker with
+    progress files beside its workbook. They share one SharedRateLimiter, weighted per campaign,
+    and one leased transport per sending backend.
+    """
+    log_signal = pyqtSignal(str, str)
+    changed = pyqtSignal(int) # Campaign id whose status or progress moved
 
+    def __init__(self, credentials=None, units_per_second=GMAIL_QUOTA_UNITS_PER_SECOND):
+        super().__init__()
+        self.credentials = credentials
+        self.limiter = SharedRateLimiter(units_per_second)
+        self.campaigns = {}
+        self.next_id = 1
+        self.transports = {} # backend -> [transport, leases]
+        self.lock = threading.Lock()
+
+    def add(self, service, excel_path, draft_id, draft_label, options, weight=1):
+        campaign = {
+            'id': self.next_id, 'service': service, 'excel_path': os.path.abspath(excel_path),
+            'draft_id': draft_id, 'draft_label': draft_label, 'options': options, 'weight': weight,
+            'status': 'ready', 'progress': 0, 'sent': 0, 'failed': 0, 'worker': None, 'share': None,
+        }
+        self.next_id += 1
+        self.campaigns[campaign['id']] = campaign
+        return campaign
+
+    def running(self):
+        return [c for c in self.campaigns.values() if c['status'] in ('running', 'stopping')]
+
+    def is_busy(self, excel_path):
+        """True while a managed campaign sends from this workbook."""
+        path = os.path.abspath(excel_path)
+        return any(c['excel_path'] == path for c in self.running())
+
+    def can_resume(self, campaign_id):
+        c = self.campaigns[campaign_id]
+        return c['status'] in ('stopped', 'error') and os.path.exists(campaign_progress_files(c['excel_path'])[0])
+
+    def lease_transport(self, backend, service, account=None):
+        with self.lock:
+            entry = self.transports.get(backend)
+            if entry is None:
+                entry = self.transports[backend] = [create_transport(backend, service, self.credentials, account), 0]
+            entry[1] += 1
+            return SharedTransport(entry[0], lambda: self.release_transport(backend))
+
+    def release_transport(self, backend):
+        with self.lock:
+            entry = self.transports[backend]
+            entry[1] -= 1
+            if entry[1]: return
+            del self.transports[backend]
+        entry[0].close() # Last campaign on this backend is done with the pool
+
+    def start(self, campaign_id, resume=False):
+        c = self.campaigns[campaign_id]
+        if c['status'] in ('running', 'stopping'): return
+        if c['worker']: c['worker'].wait() # Previous run is past its finished signal
+        opts = c['options']
+        progress_files = campaign_progress_files(c['excel_path'])
+        start_row, total_rows = 2, None
+        resume = resume and os.path.exists(progress_files[0])
+        if resume:
+            with open(progress_files[0]) as f:
+                progress = json.load(f)
+            start_row, total_rows = progress.get("last_row", 2), progress.get("total_rows")
+        try:
+            transport = self.lease_transport(opts.get('send_backend', 'api'), c['service'], opts.get('account'))
+        except Exception as e:
+            self.log_signal.emit(f"[#{campaign_id}] ❌ Sending backend unavailable: {e}", "#DC3545")
+            c['status'] = 'error'
+            self.changed.emit(campaign_id)
+            return
+        share = self.limiter.share(c['weight'])
+        worker = EmailWorker(
+            c['service'], c['excel_path'], c['draft_id'], start_row,
+            opts['cc_mode'], opts['global_cc'], opts['bcc_mode'], opts['global_bcc'],
+            opts['display_name'], opts['user_email'], total_rows, resume,
+            attachment_mode=opts['attachment_mode'], attachment_empty_rule=opts['attachment_empty_rule'],
+            dedupe=opts['dedupe'], fold_plus=opts['fold_plus'], transport=transport,
+            optimize_html=opts['optimize_html'], optimize_images=opts['optimize_images'],
+            sheets=opts.get('sheets'), rate_limiter=share, progress_files=progress_files
+        )
+        worker.log_signal.connect(lambda msg, color: self.log_signal.emit(f"[#{campaign_id}] {msg}", color))
+        worker.progress_signal.connect(lambda percent: self.on_progress(campaign_id, percent))
+        worker.finished_signal.connect(lambda sent, failed: self.on_finished(campaign_id, sent, failed))
+        worker.error_signal.connect(lambda error: self.on_error(campaign_id, error))
+        c.update(worker=worker, share=share, status='running')
+        if not resume: c.update(progress=0, sent=0, failed=0)
+        self.log_signal.emit(f"[#{campaign_id}] {'▶ Resuming' if resume else '🚀 Starting'} {c['draft_label']} "
+                             f"- {os.path.basename(c['excel_path'])} (weight {c['weight']})", "#17A2B8")
+        worker.start()
+        self.changed.emit(campaign_id)
+
+    def stop(self, campaign_id):
+        c = self.campaigns[campaign_id]
+        if c['status'] != 'running': return
+        c['status'] = 'stopping'
+        c['worker'].stop()
+        c['share'].close() # Wakes a send waiting for quota
+        self.changed.emit(campaign_id)
+
+    def stop_all(self):
+        for campaign_id in list(self.campaigns):
+            self.stop(campaign_id)
+
+    def set_weight(self, campaign_id, weight):
+        c = self.campaigns[campaign_id]
+        c['weight'] = weight
+        if c['share']: c['share'].set_weight(weight)
+
+    def on_progress(self, campaign_id, percent):
+        self.campaigns[campaign_id]['progress'] = percent
+        self.changed.emit(campaign_id)
+
+    def on_finished(self, campaign_id, sent, failed):
+        c = self.campaigns[campaign_id]
+        if c['share']: c['share'].close()
+        if sent == -1:
+            c['status'] = 'stopped'
+        else:
+            c.update(status='done', progress=100)
+            c['sent'] += sent
+            c['failed'] += failed
+            self.log_signal.emit(f"[#{campaign_id}] 🏁 Finished: {sent} sent, {failed} failed.", "#198754")
+        self.changed.emit(campaign_id)
+
+    def on_error(self, campaign_id, error):
+        self.log_signal.emit(f"[#{campaign_id}] CRITICAL ERROR: {error}", "#DC3545")
+        c = self.campaigns[campaign_id]
+        if c['share']: c['share'].close()
+        c['status'] = 'error'
+        self.changed.emit(campaign_id)
 
 # --- CUSTOM RESIZABLE INPUT DIALOG ---
 class ResizableInputDialog(QDialog):
@@ -758,24 +4149,50 @@ class ModernAttachmentDialog(QDialog):
 # --- WORKER TO LOAD DATA BEFORE PREVIEW ---
 class DataLoadingWorker(QThread):
     data_loaded = pyqtSignal(object, object, list, list, list) # draft_data, wb, all_headers, visible_headers, rows
+    preflight_ready = pyqtSignal(dict) # pre-flight report (emitted before data_loaded)
     status_signal = pyqtSignal(str)
     error_signal = pyqtSignal(str)
+    metrics_signal = pyqtSignal(dict) # CampaignMetrics snapshot
 
-    def __init__(self, service, draft_id, excel_path):
+    def __init__(self, service, draft_id, excel_path, attachment_mode=True, attachment_empty_rule="yes", fold_plus=False, optimize_html=True, optimize_images=True, sheets=None):
         super().__init__()
         self.service = service
         self.draft_id = draft_id
         self.excel_path = excel_path
+        self.sheets = sheets # Campaign sheet selection (see resolve_campaign_sheets)
+        self.optimize_html = optimize_html
+        self.optimize_images = optimize_images
+        self.attachment_mode = attachment_mode
+        self.attachment_empty_rule = attachment_empty_rule
+        self.fold_plus = fold_plus
+        self.metrics = CampaignMetrics("data_loading")
 
     def run(self):
+        with DIAGNOSTICS.profiled("DataLoadingWorker"):
+            self.load_data()
+
+    def load_data(self):
+        metrics = self.metrics
         try:
             self.status_signal.emit("Downloading Draft...")
             # 1. Load Draft
-            draft_detail = self.service.users().drafts().get(userId='me', id=self.draft_id).execute()
-            msg0 = draft_detail['message']
-            payload = msg0['payload']
-            subject_tmpl = next((h['value'] for h in payload.get('headers', []) if h['name'] == 'Subject'), '(No Subject)')
-            body_html_tmpl, attachments = extract_body_and_attachments(payload, msg0['id'], self.service)
+            with metrics.stage("draft_download"):
+                draft_detail = self.service.users().drafts().get(userId='me', id=self.draft_id).execute()
+                msg0 = draft_detail['message']
+                payload = msg0['payload']
+                subject_tmpl = next((h['value'] for h in payload.get('headers', []) if h['name'] == 'Subject'), '(No Subject)')
+                body_html_tmpl, attachments = extract_body_and_attachments(payload, msg0['id'], self.service)
+            
+            # Preview and pre-flight sizes show the body as it will be sent
+            if self.optimize_html:
+                try:
+                    with metrics.stage("template_optimize"):
+                        body_html_tmpl, _ = optimize_template(body_html_tmpl)
+                except Exception:
+                    pass # The send worker reports it
+            if self.optimize_images:
+                with metrics.stage("image_optimize"):
+                    body_html_tmpl, attachments, _ = optimize_inline_images(body_html_tmpl, attachments)
             
             draft_data = {
                 'id': self.draft_id, # Added ID to fix KeyError
@@ -786,27 +4203,19 @@ class DataLoadingWorker(QThread):
 
             self.status_signal.emit("Reading Excel...")
             # 2. Load Excel (Optimized)
-            wb = openpyxl.load_workbook(self.excel_path, read_only=True, data_only=True)
-            ws = wb.active
+            with metrics.stage("workbook_load"):
+                wb = openpyxl.load_workbook(self.excel_path, read_only=True, data_only=True)
             
-            headers = []
-            visible_indexes = []
-            all_headers = []
-            
-            # Read Headers
-            # ws[1] in read_only mode returns cell objects
-            row1 = next(ws.iter_rows(min_row=1, max_row=1))
-            
-            for idx, cell in enumerate(row1):
-                val = cell.value
-                all_headers.append(val)
-                # In read_only, column_dimensions might not be available or accurate for 'hidden'
-                # fallback to showing all if specific hidden check fails or is complex
-                # For now, let's assume all visible in read_only or check if we can skip logic
-                # To be safe and fast, we'll treat all as visible or just check value
-                if val:
-                    headers.append(val)
-                    visible_indexes.append(idx)
+            # Read Headers (once per sheet)
+            # In read_only, column_dimensions might not be available or accurate for 'hidden'
+            # To be safe and fast, columns with a header value count as visible
+            schemas = []
+            for ws in resolve_campaign_sheets(wb, self.sheets):
+                row1 = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1), ())]
+                schemas.append(SheetSchema(ws, row1, [i for i, val in enumerate(row1) if not val]))
+            all_headers, visible_indexes = build_campaign_layout(schemas)
+            headers = [all_headers[i] for i in visible_indexes]
+            multi_sheet = len(schemas) > 1
             
             # Find Email Index
             email_idx = -1
@@ -831,10 +4240,15 @@ class DataLoadingWorker(QThread):
 
             self.status_signal.emit("Processing rows...")
             # Read All Rows
+            read_started = time.perf_counter()
             rows = []
-            for row in ws.iter_rows(min_row=2, values_only=False):
-                # row is tuple of cells
-                row_values = [c.value for c in row]
+            table = [] # Every data row (incl. missing Email) for the pre-flight check
+            sheet_rows = ((schema, row) for schema in schemas for row in schema.ws.iter_rows(min_row=2, values_only=False))
+            for schema, row in sheet_rows:
+                # row is tuple of cells, mapped onto the campaign columns
+                row_values = schema.project([c.value for c in row])
+                if any(v is not None and str(v).strip() for v in row_values):
+                    table.append({'values': row_values, 'index': row[0].row if row else 0})
                 
                 # Check for Email
                 if email_idx != -1 and len(row_values) > email_idx:
@@ -862,22 +4276,66 @@ class DataLoadingWorker(QThread):
                 rows.append({
                     'values': row_values,
                     'filtered': filtered_row,
-                    'index': row[0].row if row else 0
+                    'index': row[0].row if row else 0,
+                    'sheet': schema.title if multi_sheet else None
                 })
             
             wb.close()
+            metrics.add_time("row_read", time.perf_counter() - read_started)
+            metrics.incr("rows_processed", len(table))
+            
+            self.status_signal.emit("Running pre-flight checks...")
+            with metrics.stage("preflight"):
+                report = run_preflight(draft_data, all_headers, headers, table,
+                                       self.attachment_mode, self.attachment_empty_rule,
+                                       SuppressionList().load(self.fold_plus), self.fold_plus,
+                                       os.path.dirname(os.path.abspath(self.excel_path)))
+                if multi_sheet:
+                    report['sheets'] = [schema.title for schema in schemas]
+                    report['sheet_problems'] = validate_sheet_schemas(schemas, draft_data['subject'], draft_data['body'])
+            self.preflight_ready.emit(report)
+            self.metrics_signal.emit(metrics.snapshot())
+            
             self.data_loaded.emit(draft_data, None, all_headers, headers, rows)
             
         except Exception as e:
             self.error_signal.emit(str(e))
 
+# --- BACKGROUND PREVIEW RENDERER ---
+class PreviewRenderWorker(QThread):
+    rendered = pyqtSignal(int, int, dict) # row position, request generation, rendered preview
+
+    def __init__(self, render_fn):
+        super().__init__()
+        self.render_fn = render_fn
+        self.requests = queue.Queue()
+        self.is_running = True
+
+    def request(self, idx, generation=0):
+        self.requests.put((idx, generation))
+
+    def run(self):
+        while self.is_running:
+            item = self.requests.get()
+            if item is None: break # Shutdown sentinel
+            idx, generation = item
+            try:
+                self.rendered.emit(idx, generation, self.render_fn(idx))
+            except Exception:
+                pass # Row is rendered again (and errors surface) when actually shown
+
+    def stop(self):
+        self.is_running = False
+        self.requests.put(None)
+
 # --- ADVANCED PREVIEW DIALOG ---
 class AdvancedPreviewDialog(QDialog):
     start_sending = pyqtSignal()
 
-    def __init__(self, parent, draft_data, all_headers, visible_headers, rows, cc_mode, global_cc, bcc_mode, global_bcc, attachment_mode=True):
+    def __init__(self, parent, draft_data, all_headers, visible_headers, rows, cc_mode, global_cc, bcc_mode, global_bcc, attachment_mode=True, preflight=None):
         super().__init__(parent)
         self.draft_data = draft_data
+        self.preflight = preflight
         self.all_headers = all_headers
         self.visible_headers = visible_headers
         self.rows = rows
@@ -890,6 +4348,30 @@ class AdvancedPreviewDialog(QDialog):
         self.current_idx = 0
         self.total = len(self.rows)
         
+        # Row-independent work is done once here instead of on every Prev/Next click
+        self.image_dir = tempfile.mkdtemp(prefix="mail_merge_preview_")
+        attachments = self.draft_data.get('attachments', [])
+        self.subject_tmpl = clean_placeholders(self.draft_data['subject'])
+        self.body_tmpl = clean_placeholders(resolve_inline_images(self.draft_data['body'], attachments, self.image_dir))
+        self.att_names = [a[1] for a in attachments]
+        
+        headers_lower = [str(h).strip().lower() for h in self.all_headers]
+        self.col_files = next((headers_lower.index(n) for n in ATTACHMENT_FILE_COLUMNS if n in headers_lower), -1)
+        self.col_att = -1
+        for name in ['attachment', 'attachments', 'send attachments', 'send attachment']:
+            if name in headers_lower:
+                self.col_att = headers_lower.index(name)
+                break
+        
+        # LRU cache of rendered rows, filled ahead of navigation by the background renderer
+        self.preview_cache = OrderedDict()
+        self.pending_prefetch = set()
+        self.render_generation = 0 # Bumped when the headers change; older background renders are dropped
+        self.shown_body = None
+        self.renderer = PreviewRenderWorker(self.render_row)
+        self.renderer.rendered.connect(self.on_row_rendered)
+        self.renderer.start()
+        
         self.setWindowTitle("Preparing to Send - Preview")
         self.resize(900, 750) # Reverted to original spacious size
         # Add Maximize Button
@@ -936,6 +4418,22 @@ class AdvancedPreviewDialog(QDialog):
         self.lbl_att_status = QLabel()
         info_layout.addWidget(self.lbl_att_status, 5, 1)
         
+        # Pre-flight (whole campaign) summary
+        if self.preflight:
+            info_layout.addWidget(QLabel("<b>Pre-flight:</b>"), 6, 0)
+            text, color = preflight_summary(self.preflight)
+            preflight_row = QHBoxLayout()
+            lbl_preflight = QLabel(text)
+            lbl_preflight.setStyleSheet(f"color: {color}; font-weight: bold;")
+            preflight_row.addWidget(lbl_preflight)
+            btn_details = QPushButton("Details")
+            btn_details.setCursor(Qt.PointingHandCursor)
+            btn_details.setStyleSheet("QPushButton { background-color: #E9ECEF; color: #333; border: 1px solid #CED4DA; padding: 2px 10px; }")
+            btn_details.clicked.connect(self.show_preflight_details)
+            preflight_row.addWidget(btn_details)
+            preflight_row.addStretch()
+            info_layout.addLayout(preflight_row, 6, 1)
+        
         layout.addWidget(info_card)
         
         # Browser
@@ -1058,105 +4556,128 @@ class AdvancedPreviewDialog(QDialog):
     def on_confirm_toggled(self, state):
         self.btn_start.setEnabled(state == Qt.Checked)
 
-    def load_preview(self, idx):
-        if not self.rows:
-            self.lbl_to.setText("(No Data)")
-            return
+    def show_preflight_details(self):
+        dlg = ModernInfoDialog(self, "Pre-flight Report", format_preflight_report(self.preflight), "🛫", "#0D6EFD")
+        dlg.resize(560, 420)
+        dlg.exec_()
 
-        self.current_idx = idx
+    def render_row(self, idx):
+        # Pure rendering (no widgets touched) - safe to run on the background renderer
         row_data = self.rows[idx]
         
         # Safety Pad (Same as Worker)
         # Ensure values list is long enough to cover all headers (including Send Attachments at end)
-        if len(row_data['values']) < len(self.all_headers):
-             row_data['values'].extend([None] * (len(self.all_headers) - len(row_data['values'])))
+        values = row_data['values']
+        if len(values) < len(self.all_headers):
+             values = values + [None] * (len(self.all_headers) - len(values))
 
         # Resolve Recipients
         recip, cc, bcc = get_email_recipients(
-            row_data['values'], self.all_headers, 
+            values, self.all_headers, 
             self.cc_mode, self.global_cc, 
             self.bcc_mode, self.global_bcc
         )
         
-        self.lbl_idx.setText(f"Previewing Email #{row_data['index'] - 1}")
-        self.lbl_to.setText(recip)
-        self.lbl_cc.setText(cc)
-        self.lbl_bcc.setText(bcc)
-        
-        # Personalize
-        # We need visible headers for clean_personalization
-        # self.visible_headers should be passed in init, or we use all_headers if strictly matching logic
-        # Assuming visible_headers logic is correct
-        subj_p = clean_personalization(self.draft_data['subject'], row_data['filtered'], self.visible_headers)
-        body_p = clean_personalization(self.draft_data['body'], row_data['filtered'], self.visible_headers)
-        
-        
-        self.lbl_subj.setText(subj_p)
-        self.browser.setHtml(body_p)
+        # Personalize (templates were already cleaned once in __init__)
+        subj_p = personalize(self.subject_tmpl, row_data['filtered'], self.visible_headers)
+        body_p = personalize(self.body_tmpl, row_data['filtered'], self.visible_headers)
         
         # Attachment Status
         if self.attachment_mode:
             # show actual attachments
-            att_names = [a[1] for a in self.draft_data.get('attachments', [])]
-            if att_names:
-                 names_str = ", ".join(att_names)
-                 self.lbl_att_status.setText(f"✅ Yes ({names_str})")
+            if self.att_names:
+                 status_text = f"✅ Yes ({', '.join(self.att_names)})"
             else:
-                 self.lbl_att_status.setText("✅ Yes (No files in draft)")
-            self.lbl_att_status.setStyleSheet("color: #198754; font-weight: bold;")
+                 status_text = "✅ Yes (No files in draft)"
+            status_color = "#198754"
         else:
              # Check Excel Logic
-             # Need headers to find column
-             col_att = -1
-             headers_lower = [str(h).strip().lower() for h in self.all_headers]
-             
-             # DEBUG: Print headers to see what we are working with
-             print(f"DEBUG PREVIEW: Headers: {headers_lower}")
-             
-             for name in ['attachment', 'attachments', 'send attachments', 'send attachment']:
-                  if name in headers_lower: 
-                       col_att = headers_lower.index(name)
-                       print(f"DEBUG PREVIEW: Found '{name}' at index {col_att}")
-                       break
+             names_str = ", ".join(self.att_names) if self.att_names else "No files"
              
-             # Need filenames too
-             att_names = [a[1] for a in self.draft_data.get('attachments', [])]
-             names_str = ", ".join(att_names) if att_names else "No files"
-             
-             status_text = "⚠️ Unresolved (Empty)"
-             status_color = "#FD7E14" # Orange
-             
-             if col_att != -1:
+             if self.col_att != -1:
                  # Check value
-                 if len(row_data['values']) > col_att:
-                     val = row_data['values'][col_att]
-                     str_val = str(val).strip().lower() if val else ""
-                     
-                     if str_val in ['no', 'n', 'false', '0']:
-                          status_text = "❌ No (Skipped)"
-                          status_color = "#DC3545" # Red
-                     elif str_val: # Yes or other value
-                          status_text = f"✅ Yes ({names_str})"
-                          status_color = "#198754" # Green
-                     else:
-                          # Empty value found
-                          status_text = "⚠️ Unresolved (Cell Empty)"
-                          status_color = "#FD7E14"
+                 val = values[self.col_att]
+                 str_val = str(val).strip().lower() if val else ""
+                 
+                 if str_val in ['no', 'n', 'false', '0']:
+                      status_text = "❌ No (Skipped)"
+                      status_color = "#DC3545" # Red
+                 elif str_val: # Yes or other value
+                      status_text = f"✅ Yes ({names_str})"
+                      status_color = "#198754" # Green
                  else:
-                     status_text = "⚠️ Error (Row Short)"
-                     status_color = "#DC3545"
+                      # Empty value found
+                      status_text = "⚠️ Unresolved (Cell Empty)"
+                      status_color = "#FD7E14" # Orange
              else:
                  # Column not found
                  status_text = "⚠️ Error (Column Not Found)"
                  status_color = "#DC3545"
-             
-             self.lbl_att_status.setText(status_text)
-             self.lbl_att_status.setStyleSheet(f"color: {status_color}; font-weight: bold;")
+        
+        # Per-row files override the draft's attachments
+        if self.col_files != -1 and self.col_files < len(values):
+            entries = split_attachment_cell(values[self.col_files])
+            if entries:
+                status_text = f"📎 Row files ({', '.join(os.path.basename(e) for e in entries)})"
+                status_color = "#198754"
+        
+        return {
+            'label': f"Previewing Email #{row_data['index'] - 1}" + (f" ({row_data['sheet']})" if row_data.get('sheet') else ""),
+            'to': recip, 'cc': cc, 'bcc': bcc,
+            'subject': subj_p, 'body': body_p,
+            'att_text': status_text, 'att_color': status_color
+        }
+
+    def cache_row(self, idx, rendered):
+        self.preview_cache[idx] = rendered
+        self.preview_cache.move_to_end(idx)
+        while len(self.preview_cache) > PREVIEW_CACHE_SIZE:
+            self.preview_cache.popitem(last=False)
+
+    def on_row_rendered(self, idx, generation, rendered):
+        if generation != self.render_generation: return # Requested before the headers changed
+        self.pending_prefetch.discard(idx)
+        self.cache_row(idx, rendered)
+
+    def prefetch_neighbours(self, idx):
+        for offset in range(1, PREVIEW_PREFETCH_RADIUS + 1):
+            for n in (idx + offset, idx - offset):
+                if 0 <= n < self.total and n not in self.preview_cache and n not in self.pending_prefetch:
+                    self.pending_prefetch.add(n)
+                    self.renderer.request(n, self.render_generation)
+
+    def load_preview(self, idx):
+        if not self.rows:
+            self.lbl_to.setText("(No Data)")
+            return
+
+        self.current_idx = idx
+        
+        rendered = self.preview_cache.get(idx)
+        if rendered is None:
+            rendered = self.render_row(idx)
+        self.cache_row(idx, rendered)
+        
+        self.lbl_idx.setText(rendered['label'])
+        self.lbl_to.setText(rendered['to'])
+        self.lbl_cc.setText(rendered['cc'])
+        self.lbl_bcc.setText(rendered['bcc'])
+        self.lbl_subj.setText(rendered['subject'])
+        
+        # Skip the web view re-parse when consecutive rows render the same body
+        if rendered['body'] != self.shown_body:
+            self.browser.setHtml(rendered['body'], QUrl.fromLocalFile(self.image_dir + os.sep))
+            self.shown_body = rendered['body']
+        
+        self.lbl_att_status.setText(rendered['att_text'])
+        self.lbl_att_status.setStyleSheet(f"color: {rendered['att_color']}; font-weight: bold;")
         
         self.lbl_counter.setText(f"Email {idx + 1} of {self.total}")
         
         self.btn_prev.setEnabled(idx > 0)
         self.btn_next.setEnabled(idx < self.total - 1)
+        
+        self.prefetch_neighbours(idx)
 
     def prev_mail(self):
         if self.current_idx > 0:
@@ -1168,11 +4689,21 @@ class AdvancedPreviewDialog(QDialog):
             
     def set_visible_headers(self, headers):
         self.visible_headers = headers
+        self.preview_cache.clear() # Rendered rows depend on the headers
+        self.pending_prefetch.clear()
+        self.render_generation += 1
 
     def on_start(self):
         self.start_sending.emit()
         self.accept()
 
+    def done(self, result):
+        # Covers accept, reject and window close
+        self.renderer.stop()
+        self.renderer.wait()
+        shutil.rmtree(self.image_dir, ignore_errors=True)
+        super().done(result)
+
 
 # --- CUSTOM UI DIALOGS ---
 class ModernInfoDialog(QDialog):
@@ -1597,6 +5128,288 @@ class ModernResultDialog(QDialog):
         content_layout.addWidget(btn_done)
 
 
+# --- SHEET SELECTION DIALOG ---
+class SheetSelectionDialog(QDialog):
+    """Picks the worksheets one campaign covers: the active sheet, several, or all of them."""
+
+    def __init__(self, parent, sheet_names, active_name, selection=None):
+        super().__init__(parent)
+        self.setWindowTitle("Campaign Sheets")
+        self.resize(360, 360)
+        self.setStyleSheet("""
+            QDialog { background-color: #F8F9FA; }
+            QLabel { color: #333; font-size: 13px; }
+            QListWidget { background-color: white; border: 1px solid #DEE2E6; border-radius: 6px; font-size: 13px; }
+        """)
+        self.active_name = active_name
+
+        layout = QVBoxLayout(self)
+        lbl_info = QLabel("Rows of every checked sheet are sent as one campaign. Each sheet needs its own header row with an <b>Email</b> column.")
+        lbl_info.setWordWrap(True)
+        layout.addWidget(lbl_info)
+
+        self.list_sheets = QListWidget()
+        chosen = set(sheet_names) if selection == ALL_SHEETS else set(selection or [active_name])
+        for name in sheet_names:
+            item = QListWidgetItem(name + (" (active)" if name == active_name else ""))
+            item.setData(Qt.UserRole, name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if name in chosen else Qt.Unchecked)
+            self.list_sheets.addItem(item)
+        layout.addWidget(self.list_sheets)
+
+        self.chk_all = QCheckBox("All sheets (including sheets added later)")
+        self.chk_all.setChecked(selection == ALL_SHEETS)
+        self.chk_all.toggled.connect(self.list_sheets.setDisabled)
+        self.list_sheets.setDisabled(selection == ALL_SHEETS)
+        layout.addWidget(self.chk_all)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.validate)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def checked_names(self):
+        items = (self.list_sheets.item(i) for i in range(self.list_sheets.count()))
+        return [item.data(Qt.UserRole) for item in items if item.checkState() == Qt.Checked]
+
+    def validate(self):
+        if not self.chk_all.isChecked() and not self.checked_names():
+            QMessageBox.warning(self, "Campaign Sheets", "Check at least one sheet.")
+            return
+        self.accept()
+
+    def get_selection(self):
+        """ALL_SHEETS, a list of sheet names, or None for the active sheet alone."""
+        if self.chk_all.isChecked(): return ALL_SHEETS
+        names = self.checked_names()
+        return None if names == [self.active_name] else names
+
+# --- SCHEDULE DIALOGS ---
+class ScheduleDialog(QDialog):
+    """Start time, send window and hourly cap for a scheduled campaign."""
+
+    def __init__(self, parent, draft_label, excel_path):
+        super().__init__(parent)
+        self.setWindowTitle("Schedule Campaign")
+        self.resize(440, 320)
+        self.setStyleSheet("""
+            QDialog { background-color: #F8F9FA; }
+            QLabel { color: #333; font-size: 13px; }
+            QLineEdit, QSpinBox, QDateTimeEdit {
+                background-color: white; border: 1px solid #DEE2E6;
+                border-radius: 6px; padding: 4px; font-size: 13px;
+            }
+        """)
+
+        layout = QVBoxLayout(self)
+        lbl_info = QLabel(f"<b>Draft:</b> {draft_label}<br><b>Excel:</b> {os.path.basename(excel_path)}")
+        lbl_info.setWordWrap(True)
+        layout.addWidget(lbl_info)
+
+        form = QFormLayout()
+        self.dt_start = QDateTimeEdit(QDateTime.currentDateTime())
+        self.dt_start.setCalendarPopup(True)
+        self.dt_start.setDisplayFormat("yyyy-MM-dd HH:mm")
+        form.addRow("Start at:", self.dt_start)
+
+        self.spin_start = QSpinBox(); self.spin_start.setRange(0, 23); self.spin_start.setValue(9); self.spin_start.setSuffix(":00")
+        self.spin_end = QSpinBox(); self.spin_end.setRange(1, 24); self.spin_end.setValue(17); self.spin_end.setSuffix(":00")
+        hours = QHBoxLayout()
+        hours.addWidget(self.spin_start); hours.addWidget(QLabel("to")); hours.addWidget(self.spin_end)
+        form.addRow("Send window:", hours)
+
+        self.chk_weekdays = QCheckBox("Weekdays only (Mon-Fri)")
+        self.chk_weekdays.setChecked(True)
+        form.addRow("", self.chk_weekdays)
+
+        self.spin_cap = QSpinBox(); self.spin_cap.setRange(0, 100000); self.spin_cap.setValue(0)
+        self.spin_cap.setSpecialValueText("No limit"); self.spin_cap.setSuffix(" / hour")
+        form.addRow("Hourly cap:", self.spin_cap)
+
+        self.txt_timezone = QLineEdit()
+        self.txt_timezone.setPlaceholderText("System local time (e.g. America/New_York)")
+        form.addRow("Time zone:", self.txt_timezone)
+        layout.addLayout(form)
+
+        lbl_hint = QLabel("Optional Excel columns <b>Send At</b> and <b>Timezone</b> override the start time and zone per row.")
+        lbl_hint.setWordWrap(True)
+        lbl_hint.setStyleSheet("color: #6C757D; font-size: 12px;")
+        layout.addWidget(lbl_hint)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.validate)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def validate(self):
+        if self.spin_start.value() >= self.spin_end.value():
+            QMessageBox.warning(self, "Send Window", "The window must end after it starts.")
+            return
+        if self.txt_timezone.text().strip() and resolve_timezone(self.txt_timezone.text()) is None:
+            QMessageBox.warning(self, "Time Zone", f"Unknown time zone: {self.txt_timezone.text().strip()}")
+            return
+        self.accept()
+
+    def get_schedule(self):
+        window = SendWindow(self.spin_start.value(), self.spin_end.value(), self.chk_weekdays.isChecked(),
+                            self.spin_cap.value(), self.txt_timezone.text().strip())
+        start_at = self.dt_start.dateTime().toPyDateTime().astimezone()
+        return start_at, window
+
+class CampaignQueueDialog(QDialog):
+    """Lists scheduled campaigns; lets the user remove one or queue a stopped one again."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setWindowTitle("Scheduled Campaigns")
+        self.resize(640, 360)
+        self.queue = CampaignQueue()
+
+        layout = QVBoxLayout(self)
+        self.list_campaigns = QListWidget()
+        layout.addWidget(self.list_campaigns)
+
+        btn_row = QHBoxLayout()
+        btn_requeue = QPushButton("Requeue")
+        btn_requeue.clicked.connect(self.requeue_selected)
+        btn_remove = QPushButton("Remove")
+        btn_remove.clicked.connect(self.remove_selected)
+        btn_close = QPushButton("Close")
+        btn_close.clicked.connect(self.accept)
+        btn_row.addWidget(btn_requeue); btn_row.addWidget(btn_remove); btn_row.addStretch(); btn_row.addWidget(btn_close)
+        layout.addLayout(btn_row)
+        self.refresh()
+
+    def refresh(self):
+        self.list_campaigns.clear()
+        for c in self.queue.load():
+            start_at = datetime.datetime.fromisoformat(c['start_at']).astimezone()
+            window = SendWindow.from_dict(c['window'])
+            text = (f"[{c['status']}] {start_at:%Y-%m-%d %H:%M}  {c['draft_label']}  -  "
+                    f"{os.path.basename(c['excel_path'])}  -  {window.describe()}")
+            item = QListWidgetItem(text)
+            item.setData(Qt.UserRole, c['id'])
+            self.list_campaigns.addItem(item)
+
+    def selected_id(self):
+        item = self.list_campaigns.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+    def requeue_selected(self):
+        campaign_id = self.selected_id()
+        if campaign_id is None: return
+        if getattr(self.parent(), 'active_campaign_id', None) == campaign_id:
+            QMessageBox.information(self, "Scheduled Campaigns", "This campaign is running.")
+            return
+        self.queue.update(campaign_id, status='queued')
+        self.refresh()
+
+    def remove_selected(self):
+        campaign_id = self.selected_id()
+        if campaign_id is None: return
+        if getattr(self.parent(), 'active_campaign_id', None) == campaign_id:
+            QMessageBox.information(self, "Scheduled Campaigns", "Stop the running campaign before removing it.")
+            return
+        self.queue.remove(campaign_id)
+        self.refresh()
+
+class CampaignManagerDialog(QDialog):
+    """Campaigns running side by side: weight, progress, status and Stop/Resume for each."""
+    COLUMNS = ["Draft", "Excel", "Weight", "Progress", "Status", ""]
+    STATUS_TEXT = {'ready': "Ready", 'running': "Sending", 'stopping': "Stopping...", 'stopped': "Stopped",
+                   'done': "Done", 'error': "Error"}
+
+    def __init__(self, parent, manager):
+        super().__init__(parent)
+        self.setWindowTitle("Campaign Manager")
+        self.resize(860, 380)
+        self.setStyleSheet("""
+            QDialog { background-color: #F8F9FA; }
+            QLabel { color: #333; font-size: 13px; }
+            QTableWidget { background-color: white; border: 1px solid #DEE2E6; border-radius: 6px; font-size: 13px; }
+        """)
+        self.manager = manager
+        self.rows = {} # Campaign id -> table row
+
+        layout = QVBoxLayout(self)
+        lbl_info = QLabel("Campaigns here send at the same time and share your account's sending quota. "
+                          "While both are sending, a campaign with weight 3 sends three emails for every one of a weight-1 campaign.")
+        lbl_info.setWordWrap(True)
+        layout.addWidget(lbl_info)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionMode(QAbstractItemView.NoSelection)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        for col in (2, 5): header.setSectionResizeMode(col, QHeaderView.ResizeToContents)
+        layout.addWidget(self.table)
+
+        btn_row = QHBoxLayout()
+        btn_add = QPushButton("Add Current Draft && Excel")
+        btn_add.clicked.connect(self.add_campaign)
+        btn_close = QPushButton("Close")
+        btn_close.clicked.connect(self.close)
+        btn_row.addWidget(btn_add); btn_row.addStretch(); btn_row.addWidget(btn_close)
+        layout.addLayout(btn_row)
+
+        for campaign_id in manager.campaigns: self.add_row(campaign_id)
+        manager.changed.connect(self.update_row)
+
+    def add_campaign(self):
+        campaign = self.parent().add_managed_campaign()
+        if campaign is None: return
+        self.add_row(campaign['id'])
+        self.manager.start(campaign['id'])
+
+    def add_row(self, campaign_id):
+        c = self.manager.campaigns[campaign_id]
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.rows[campaign_id] = row
+        self.table.setItem(row, 0, QTableWidgetItem(c['draft_label']))
+        self.table.setItem(row, 1, QTableWidgetItem(os.path.basename(c['excel_path'])))
+
+        spin_weight = QSpinBox()
+        spin_weight.setRange(1, CAMPAIGN_MAX_WEIGHT)
+        spin_weight.setValue(c['weight'])
+        spin_weight.valueChanged.connect(lambda value: self.manager.set_weight(campaign_id, value))
+        self.table.setCellWidget(row, 2, spin_weight)
+
+        progress = QProgressBar()
+        progress.setRange(0, 100)
+        self.table.setCellWidget(row, 3, progress)
+        self.table.setItem(row, 4, QTableWidgetItem())
+
+        buttons = QWidget()
+        btn_layout = QHBoxLayout(buttons)
+        btn_layout.setContentsMargins(2, 0, 2, 0)
+        btn_stop = QPushButton("Stop")
+        btn_stop.clicked.connect(lambda: self.manager.stop(campaign_id))
+        btn_resume = QPushButton("Resume")
+        btn_resume.clicked.connect(lambda: self.manager.start(campaign_id, resume=True))
+        btn_layout.addWidget(btn_stop); btn_layout.addWidget(btn_resume)
+        buttons.btn_stop, buttons.btn_resume = btn_stop, btn_resume
+        self.table.setCellWidget(row, 5, buttons)
+        self.update_row(campaign_id)
+
+    def update_row(self, campaign_id):
+        row = self.rows.get(campaign_id)
+        if row is None: return
+        c = self.manager.campaigns[campaign_id]
+        self.table.cellWidget(row, 3).setValue(c['progress'])
+        status = self.STATUS_TEXT[c['status']]
+        if c['status'] == 'done': status += f": {c['sent']} sent, {c['failed']} failed"
+        self.table.item(row, 4).setText(status)
+        buttons = self.table.cellWidget(row, 5)
+        buttons.btn_stop.setEnabled(c['status'] == 'running')
+        # No progress file (finished, or a multi-sheet run): starting again skips rows already marked Sent
+        buttons.btn_resume.setText("Resume" if self.manager.can_resume(campaign_id) else "Start")
+        buttons.btn_resume.setEnabled(c['status'] in ('ready', 'stopped', 'error'))
+
 # --- LOADING OVERLAY & WORKER ---
 
 class LoadingOverlay(QWidget):
@@ -1701,34 +5514,39 @@ class StartupWorker(QThread):
     auth_success = pyqtSignal(object, object, dict) # creds, service, user_info
     drafts_loaded = pyqtSignal(list, list) # draft_list, raw_drafts(optional - internal usage)
     error_signal = pyqtSignal(str)
+    metrics_signal = pyqtSignal(dict) # CampaignMetrics snapshot
     
-    def __init__(self, force_auth=False):
+    def __init__(self, force_auth=False, scopes=None):
         super().__init__()
         self.force_auth = force_auth
+        self.scopes = scopes # Scopes a new login asks for (None: SCOPES)
+        self.metrics = CampaignMetrics("startup")
         
     def run(self):
+        metrics = self.metrics
         try:
             # 1. AUTHENTICATION
             self.status_signal.emit("Authenticating with Google...")
+            auth_started = time.perf_counter()
             
             creds = None
             creds_file = resource_path('token.json')
             cred_json = resource_path('credentials.json')
             
             if os.path.exists(creds_file):
-                creds = Credentials.from_authorized_user_file(creds_file, SCOPES)
+                creds = Credentials.from_authorized_user_file(creds_file, saved_token_scopes(creds_file))
             
             if not creds or not creds.valid:
                 if creds and creds.expired and creds.refresh_token:
                     self.log_signal.emit("Refreshing expired token...", "#17A2B8")
                     creds.refresh(Request())
+                    write_token_file(creds, creds_file)
                 else:
                     if self.force_auth:
                         self.log_signal.emit("Initiating new login flow...", "#0D6EFD")
-                        flow = InstalledAppFlow.from_client_secrets_file(cred_json, SCOPES)
+                        flow = InstalledAppFlow.from_client_secrets_file(cred_json, self.scopes or SCOPES)
                         creds = flow.run_local_server(port=0, prompt='select_account')
-                        with open(creds_file, 'w') as token:
-                            token.write(creds.to_json())
+                        write_token_file(creds, creds_file)
                     else:
                         # Fail silently if not forced; return early
                         self.log_signal.emit("Authentication required - please login.", "#DC3545")
@@ -1736,25 +5554,16 @@ class StartupWorker(QThread):
 
             # Build Service
             service = build('gmail', 'v1', credentials=creds)
+            metrics.add_time("auth", time.perf_counter() - auth_started)
             
             # 2. FETCH PROFILE
             self.status_signal.emit("Fetching user profile...")
-            profile = service.users().getProfile(userId='me').execute()
-            user_info_oauth = build('oauth2', 'v2', credentials=creds).userinfo().get().execute()
-            
-            user_data = {
-                'email': profile.get('emailAddress'),
-                'name': user_info_oauth.get('name'),
-                'picture': user_info_oauth.get('picture'),
-                'avatar_bytes': None
-            }
-            
-            # Optimization: Fetch Avatar Bytes in background
-            if user_data['picture']:
-                try:
-                    user_data['avatar_bytes'] = requests.get(user_data['picture']).content
-                except:
-                    pass
+            profile_started = time.perf_counter()
+            # Profile, send-as aliases and avatar come from the session cache when still fresh
+            user_data, from_cache = load_session_profile(service, creds)
+            if from_cache:
+                metrics.incr("profile_cache_hits")
+            metrics.add_time("profile", time.perf_counter() - profile_started)
             
             # Emit Auth Success
             self.auth_success.emit(creds, service, user_data)
@@ -1762,17 +5571,17 @@ class StartupWorker(QThread):
             # 3. LOAD DRAFTS
             self.status_signal.emit("Loading Gmail drafts...")
             
-            drafts = service.users().drafts().list(userId='me').execute().get('drafts', [])
+            # Incremental: one history.list call when nothing changed since the last session
+            with metrics.stage("drafts_list"):
+                sync = DraftSync(service, account_key(creds))
+                entries, mode = sync.sync()
+            metrics.incr("draft_sync_requests", sync.requests)
             
-            formatted_drafts = []
-            for d in drafts:
-                # We need details for the UI. Fetching details is network heavy.
-                detail = service.users().drafts().get(userId='me', id=d['id']).execute()
-                headers = detail['message']['payload']['headers']
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(No Subject)')
-                formatted_drafts.append(f"{subject} [ID: {d['id']}]")
+            formatted_drafts = [draft_label(d, subject) for d, subject in entries]
+            drafts = [{'id': d} for d, _ in entries]
             
             self.drafts_loaded.emit(formatted_drafts, drafts)
+            self.metrics_signal.emit(metrics.snapshot())
             
             self.status_signal.emit("Ready!")
             
@@ -1943,6 +5752,68 @@ class ModernProgressBar(QProgressBar):
         painter.drawText(rect, Qt.AlignCenter, text)
 
 
+class StatsPanel(QFrame):
+    """Compact live view of a CampaignMetrics snapshot."""
+
+    FIELDS = [("rows", "Rows"), ("sent", "Sent"), ("failed", "Failed"), ("skipped", "Skipped"),
+              ("rate", "Rate"), ("data", "Data Sent"), ("latency", "Send p50 / p95"), ("concurrency", "Concurrency"),
+              ("slowest", "Slowest Stage")]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setStyleSheet("""
+            QFrame { background-color: #FFFFFF; border-radius: 8px; border: 1px solid #DCE0E5; }
+            QLabel { border: none; font-size: 12px; }
+        """)
+        layout = QGridLayout(self)
+        layout.setContentsMargins(12, 8, 12, 8)
+        layout.setHorizontalSpacing(20)
+        
+        self.values = {}
+        for i, (key, title) in enumerate(self.FIELDS):
+            lbl_title = QLabel(title)
+            lbl_title.setStyleSheet("color: #6C757D; font-weight: bold;")
+            lbl_value = QLabel("-")
+            lbl_value.setStyleSheet("color: #212529; font-weight: bold;")
+            layout.addWidget(lbl_title, 0, i)
+            layout.addWidget(lbl_value, 1, i)
+            self.values[key] = lbl_value
+        
+        self.lbl_stages = QLabel("")
+        self.lbl_stages.setStyleSheet("color: #6C757D;")
+        self.lbl_stages.setWordWrap(True)
+        layout.addWidget(self.lbl_stages, 2, 0, 1, len(self.FIELDS))
+
+    def update_snapshot(self, snap):
+        counters = snap.get('counters', {})
+        elapsed = max(snap.get('elapsed_seconds', 0), 0.001)
+        stages = snap.get('stages', {})
+        
+        self.values['rows'].setText(str(counters.get('rows_processed', 0)))
+        self.values['sent'].setText(str(counters.get('sent', 0)))
+        self.values['failed'].setText(str(counters.get('failed', 0)))
+        self.values['skipped'].setText(str(counters.get('skipped', 0)))
+        self.values['rate'].setText(f"{counters.get('sent', 0) / elapsed * 60:.1f}/min")
+        self.values['data'].setText(f"{counters.get('bytes_sent', 0) / (1024 * 1024):.1f} MB")
+        
+        hist = snap.get('histograms', {}).get('send_latency_seconds')
+        if hist and hist['count']:
+            self.values['latency'].setText(f"≤{histogram_percentile(hist, 50)}s / ≤{histogram_percentile(hist, 95)}s")
+        
+        gauges = snap.get('gauges', {})
+        if 'concurrency_limit' in gauges:
+            throttled = counters.get('throttled', 0)
+            self.values['concurrency'].setText(f"{gauges.get('in_flight', 0)} / {gauges['concurrency_limit']}"
+                                               + (f" (⚠ {throttled} throttled)" if throttled else ""))
+            history = snap.get('history', {}).get('concurrency_limit', [])
+            self.values['concurrency'].setToolTip("In flight / limit. Limit history: "
+                                                  + " → ".join(f"{v} @{t:.0f}s" for t, v in history[-12:]))
+        
+        if stages:
+            slowest = max(stages.items(), key=lambda kv: kv[1]['total_seconds'])
+            self.values['slowest'].setText(f"{slowest[0]} ({slowest[1]['total_seconds']:.1f}s)")
+            self.lbl_stages.setText("  •  ".join(f"{k}: {v['total_seconds']:.2f}s" for k, v in stages.items()))
+
 # --- MAIN APPLICATION WINDOW ---
 class MailMergeApp(QMainWindow):
     def __init__(self):
@@ -1959,11 +5830,26 @@ class MailMergeApp(QMainWindow):
         
         # Variables
         self.creds = None
+        self.credential_manager = None # Proactive token refresh for the signed-in session
         self.service = None
         self.excel_path = ""
         self.drafts = []
         self.worker = None
+        self.reconciler = None # Background ReconcileWorker
+        self.response_tracker = None # Background ResponseTrackerWorker
+        self.campaign_manager = CampaignManager() # Campaigns running side by side (Schedule -> Campaign Manager)
+        self.send_share = None # Main window campaign's RateShare of campaign_manager.limiter
+        self.campaign_manager.log_signal.connect(self.log)
+        self.campaign_manager_dialog = None
         self.preview_header_map = {} # Map header name -> col index
+        self.dedupe_recipients = True # Skip repeated addresses in a sheet
+        self.optimize_html = True # Minify the draft HTML and inline its CSS once per campaign
+        self.optimize_images = True # Merge duplicate inline images and recompress them (Pillow)
+        self.campaign_sheets = None # Worksheets sent as one campaign (None: active sheet; see resolve_campaign_sheets)
+        self.fold_plus_addresses = False # user+tag@domain counts as user@domain
+        self.send_backend = 'api' # Key into SEND_BACKENDS
+        self.active_campaign_id = None # Scheduled campaign the current worker belongs to
+        self.dry_run_active = False # Current worker is a dry run
         
         # Track Cumulative Stats
         self.total_sent = 0
@@ -1979,6 +5865,11 @@ class MailMergeApp(QMainWindow):
         # Delayed auto-auth to let UI show up
         from PyQt5.QtCore import QTimer
         QTimer.singleShot(100, self.auto_authenticate)
+        
+        # Scheduled campaigns are started from here once due
+        self.schedule_timer = QTimer(self)
+        self.schedule_timer.timeout.connect(self.check_scheduled_campaigns)
+        self.schedule_timer.start(SCHEDULE_CHECK_MS)
 
     def init_ui(self):
         # --- GLOBAL STYLESHEET (Standard Clean Theme) ---
@@ -2175,6 +6066,13 @@ class MailMergeApp(QMainWindow):
         
         card3_layout.addStretch()
         
+        # From: send-as alias (hidden unless the account has more than one)
+        self.combo_from = QComboBox()
+        self.combo_from.setToolTip("Send this campaign from (Gmail send-as alias)")
+        self.combo_from.setStyleSheet("font-size: 13px; padding: 4px 8px; border: 1px solid #DCE0E5; border-radius: 6px;")
+        self.combo_from.setVisible(False)
+        card3_layout.addWidget(self.combo_from)
+        
         # Attachment Toggle
         self.chk_send_attachments = QCheckBox("Send Attachments")
         self.chk_send_attachments.setChecked(True) # Default: Send to all
@@ -2195,7 +6093,7 @@ class MailMergeApp(QMainWindow):
         self.btn_resume = QPushButton("▶ Resume")
         self.style_standard_button(self.btn_resume, (255, 193, 7)) # Yellow/Amber
         self.btn_resume.clicked.connect(self.resume_mail_merge)
-        self.btn_resume.setEnabled(False) # Initially disabled
+        self.btn_resume.setEnabled(os.path.exists(PROGRESS_FILE)) # Enabled when a stopped or interrupted run left a checkpoint
         card3_layout.addWidget(self.btn_resume)
         
         # Stop Button
@@ -2215,6 +6113,11 @@ class MailMergeApp(QMainWindow):
         self.progress_bar.setValue(0)
         main_layout.addWidget(self.progress_bar)
         
+        # --- STATS PANEL (shown once a campaign runs) ---
+        self.stats_panel = StatsPanel()
+        self.stats_panel.setVisible(False)
+        main_layout.addWidget(self.stats_panel)
+        
         # --- LOG CONSOLE ---
         self.txt_log = QTextEdit()
         self.txt_log.setReadOnly(True)
@@ -2245,11 +6148,108 @@ class MailMergeApp(QMainWindow):
         
         # File Menu
         file_menu = menubar.addMenu('File')
+        
+        suppression_menu = file_menu.addMenu('Suppression List')
+        import_action = QAction('Import Addresses...', self)
+        import_action.triggered.connect(self.import_suppression_list)
+        suppression_menu.addAction(import_action)
+        add_action = QAction('Add Addresses...', self)
+        add_action.triggered.connect(self.add_suppressed_addresses)
+        suppression_menu.addAction(add_action)
+        clear_action = QAction('Clear List', self)
+        clear_action.triggered.connect(self.clear_suppression_list)
+        suppression_menu.addAction(clear_action)
+        file_menu.addSeparator()
+        
         exit_action = QAction('Exit', self)
         exit_action.setShortcut('Ctrl+Q')
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
         
+        # Options Menu
+        options_menu = menubar.addMenu('Options')
+        
+        dedupe_action = QAction('Skip Duplicate Recipients', self, checkable=True)
+        dedupe_action.setChecked(self.dedupe_recipients)
+        dedupe_action.toggled.connect(lambda on: setattr(self, 'dedupe_recipients', on))
+        options_menu.addAction(dedupe_action)
+        
+        fold_action = QAction('Match user+tag@ as user@ (Plus Folding)', self, checkable=True)
+        fold_action.setChecked(self.fold_plus_addresses)
+        fold_action.toggled.connect(lambda on: setattr(self, 'fold_plus_addresses', on))
+        options_menu.addAction(fold_action)
+        
+        optimize_action = QAction('Optimize Email HTML (Minify + Inline CSS)', self, checkable=True)
+        optimize_action.setChecked(self.optimize_html)
+        optimize_action.toggled.connect(lambda on: setattr(self, 'optimize_html', on))
+        options_menu.addAction(optimize_action)
+        
+        images_action = QAction('Optimize Inline Images (Dedupe + Recompress)', self, checkable=True)
+        images_action.setChecked(self.optimize_images)
+        images_action.toggled.connect(lambda on: setattr(self, 'optimize_images', on))
+        options_menu.addAction(images_action)
+        
+        sheets_action = QAction('Campaign Sheets...', self)
+        sheets_action.triggered.connect(self.choose_campaign_sheets)
+        options_menu.addAction(sheets_action)
+        
+        options_menu.addSeparator()
+        backend_menu = options_menu.addMenu('Sending Backend')
+        backend_group = QActionGroup(self)
+        for key, label in SEND_BACKENDS.items():
+            action = QAction(label, self, checkable=True)
+            action.setChecked(key == self.send_backend)
+            action.triggered.connect(lambda checked, key=key: self.set_send_backend(key))
+            backend_group.addAction(action)
+            backend_menu.addAction(action)
+        
+        # Schedule Menu
+        schedule_menu = menubar.addMenu('Schedule')
+        
+        schedule_action = QAction('Schedule Campaign...', self)
+        schedule_action.triggered.connect(self.schedule_campaign)
+        schedule_menu.addAction(schedule_action)
+        
+        queue_action = QAction('Scheduled Campaigns...', self)
+        queue_action.triggered.connect(lambda: CampaignQueueDialog(self).exec_())
+        schedule_menu.addAction(queue_action)
+
+        schedule_menu.addSeparator()
+        manager_action = QAction('Campaign Manager...', self)
+        manager_action.triggered.connect(self.show_campaign_manager)
+        schedule_menu.addAction(manager_action)
+        
+        # Diagnostics Menu
+        diag_menu = menubar.addMenu('Diagnostics')
+        
+        self.act_profile_start = QAction('Start Profiling (Runs Started After This)', self)
+        self.act_profile_start.setStatusTip("Only campaigns, dry runs and previews started after profiling begins are captured")
+        self.act_profile_start.triggered.connect(self.start_profiling)
+        diag_menu.addAction(self.act_profile_start)
+        
+        self.act_profile_stop = QAction('Stop Profiling && Save', self)
+        self.act_profile_stop.setEnabled(False)
+        self.act_profile_stop.triggered.connect(self.stop_profiling)
+        diag_menu.addAction(self.act_profile_stop)
+        
+        diag_menu.addSeparator()
+        dry_run_action = QAction('Dry Run (No Emails Sent)...', self)
+        dry_run_action.triggered.connect(self.start_dry_run)
+        diag_menu.addAction(dry_run_action)
+        
+        reconcile_action = QAction('Reconcile Sent Messages...', self)
+        reconcile_action.triggered.connect(self.start_reconcile)
+        diag_menu.addAction(reconcile_action)
+        
+        responses_action = QAction('Check Bounces && Replies...', self)
+        responses_action.triggered.connect(self.start_response_tracking)
+        diag_menu.addAction(responses_action)
+        
+        diag_menu.addSeparator()
+        open_diag_action = QAction('Open Diagnostics Folder', self)
+        open_diag_action.triggered.connect(lambda: self.open_folder(DIAGNOSTICS_DIR))
+        diag_menu.addAction(open_diag_action)
+        
         # Help Menu
         help_menu = menubar.addMenu('Help')
         
@@ -2261,6 +6261,293 @@ class MailMergeApp(QMainWindow):
         contact_action.triggered.connect(self.show_contact_info)
         help_menu.addAction(contact_action)
 
+    def schedule_campaign(self):
+        if not self.list_drafts.currentItem():
+            ModernInfoDialog(self, "No Draft Selected", "Please select a Gmail draft to schedule.", "⚠️", "#FFC107").exec_()
+            return
+        if not self.excel_path:
+            ModernInfoDialog(self, "No Excel File", "Please select an Excel file with recipients.", "⚠️", "#FFC107").exec_()
+            return
+        
+        draft_label = self.list_drafts.currentItem().text()
+        dlg = ScheduleDialog(self, draft_label, self.excel_path)
+        if dlg.exec_() != QDialog.Accepted: return
+        start_at, window = dlg.get_schedule()
+        
+        cc_mode, global_cc = self.ask_cc_bcc("CC")
+        bcc_mode, global_bcc = self.ask_cc_bcc("BCC")
+        campaign = CampaignQueue().add({
+            'draft_id': self.drafts.get(draft_label),
+            'draft_label': draft_label,
+            'excel_path': os.path.abspath(self.excel_path),
+            'start_at': start_at.isoformat(),
+            'window': window.to_dict(),
+            'options': {
+                'cc_mode': cc_mode, 'global_cc': global_cc,
+                'bcc_mode': bcc_mode, 'global_bcc': global_bcc,
+                'attachment_mode': self.chk_send_attachments.isChecked(),
+                'attachment_empty_rule': getattr(self, 'attachment_empty_rule', 'yes'),
+                'dedupe': self.dedupe_recipients, 'fold_plus': self.fold_plus_addresses,
+                'send_backend': self.send_backend,
+                'optimize_html': self.optimize_html,
+                'optimize_images': self.optimize_images,
+                'sender': self.sender_identity(),
+            },
+        })
+        self.log(f"⏰ Campaign #{campaign['id']} scheduled for {start_at:%Y-%m-%d %H:%M}, {window.describe()}", "#6F42C1")
+        self.check_scheduled_campaigns()
+
+    def check_scheduled_campaigns(self):
+        if self.worker or not self.service: return # One campaign at a time; needs a signed-in session
+        campaign = CampaignQueue().next_due()
+        if campaign and self.campaign_manager.is_busy(campaign['excel_path']): return # Checked again later
+        if campaign: self.run_scheduled_campaign(campaign)
+
+    def show_campaign_manager(self):
+        if self.campaign_manager_dialog is None:
+            self.campaign_manager_dialog = CampaignManagerDialog(self, self.campaign_manager)
+        self.campaign_manager_dialog.show() # Non-modal: the main window keeps working
+        self.campaign_manager_dialog.raise_()
+        self.campaign_manager_dialog.activateWindow()
+
+    def add_managed_campaign(self):
+        if not self.service:
+            QMessageBox.critical(self, "Error", "Authenticate first.")
+            return None
+        if not self.list_drafts.currentItem():
+            ModernInfoDialog(self, "No Draft Selected", "Please select a Gmail draft in the main window.", "⚠️", "#FFC107").exec_()
+            return None
+        if not self.excel_path:
+            ModernInfoDialog(self, "No Excel File", "Please select an Excel file with recipients.", "⚠️", "#FFC107").exec_()
+            return None
+        # One sender per workbook: its status cells and progress files are not shared
+        if self.campaign_manager.is_busy(self.excel_path) or (self.worker and os.path.abspath(self.worker.excel_path) == os.path.abspath(self.excel_path)):
+            ModernInfoDialog(self, "Workbook In Use", "A campaign is already sending from this Excel file.", "⚠️", "#FFC107").exec_()
+            return None
+
+        draft_label = self.list_drafts.currentItem().text()
+        cc_mode, global_cc = self.ask_cc_bcc("CC")
+        bcc_mode, global_bcc = self.ask_cc_bcc("BCC")
+        self.campaign_manager.credentials = self.credential_manager
+        return self.campaign_manager.add(self.service, self.excel_path, self.drafts.get(draft_label), draft_label, {
+            'cc_mode': cc_mode, 'global_cc': global_cc,
+            'bcc_mode': bcc_mode, 'global_bcc': global_bcc,
+            'attachment_mode': self.chk_send_attachments.isChecked(),
+            'attachment_empty_rule': getattr(self, 'attachment_empty_rule', 'yes'),
+            'dedupe': self.dedupe_recipients, 'fold_plus': self.fold_plus_addresses,
+            'send_backend': self.send_backend,
+            'optimize_html': self.optimize_html,
+            'optimize_images': self.optimize_images,
+            'sheets': self.campaign_sheets,
+            'account': self.user_email, # Signed-in address (user_email below may be a send-as alias)
+            **self.sender_identity(),
+        })
+
+    def run_scheduled_campaign(self, campaign):
+        opts = campaign['options']
+        self.pending_send_args = {
+             'service': self.service,
+             'excel_path': campaign['excel_path'],
+             'draft_id': campaign['draft_id'],
+             'start_row': 2,
+             'cc_mode': opts['cc_mode'],
+             'global_cc': opts['global_cc'],
+             'bcc_mode': opts['bcc_mode'],
+             'global_bcc': opts['global_bcc'],
+             **opts.get('sender', self.sender_identity()), # From alias chosen when it was scheduled
+             'total_rows': None,
+             'attachment_mode': opts['attachment_mode'],
+             'attachment_empty_rule': opts['attachment_empty_rule'],
+             'dedupe': opts['dedupe'],
+             'fold_plus': opts['fold_plus'],
+             'send_backend': opts['send_backend'],
+             'optimize_html': opts.get('optimize_html', self.optimize_html),
+             'optimize_images': opts.get('optimize_images', self.optimize_images),
+             'schedule': SendWindow.from_dict(campaign['window']),
+             'not_before': datetime.datetime.fromisoformat(campaign['start_at']),
+        }
+        self.active_campaign_id = campaign['id']
+        CampaignQueue().update(campaign['id'], status='running')
+        self.log(f"⏰ Starting scheduled campaign #{campaign['id']}: {campaign['draft_label']}", "#6F42C1")
+        self.real_start_sending()
+
+    def choose_campaign_sheets(self):
+        if not self.excel_path:
+            ModernInfoDialog(self, "No Excel File", "Please select an Excel file first.", "⚠️", "#FFC107").exec_()
+            return
+        try:
+            wb = openpyxl.load_workbook(self.excel_path, read_only=True)
+            sheet_names, active_name = wb.sheetnames, wb.active.title
+            wb.close()
+        except Exception as e:
+            ModernInfoDialog(self, "Error", f"Could not read the workbook:\n{e}", "❌", "#DC3545").exec_()
+            return
+        dlg = SheetSelectionDialog(self, sheet_names, active_name, self.campaign_sheets)
+        if dlg.exec_() != QDialog.Accepted: return
+        self.campaign_sheets = dlg.get_selection()
+        if self.campaign_sheets is None:
+            self.log(f"📑 Campaign sheet: {active_name}", "#17A2B8")
+        else:
+            names = sheet_names if self.campaign_sheets == ALL_SHEETS else self.campaign_sheets
+            self.log(f"📑 Campaign sheets ({len(names)}): {', '.join(names)}", "#17A2B8")
+
+    def set_send_backend(self, key):
+        self.send_backend = key
+        self.log(f"📡 Sending backend: {SEND_BACKENDS[key]}", "#17A2B8")
+        if key == 'smtp' and self.creds and not self.worker and SMTP_SCOPE not in (self.creds.scopes or []):
+            reply = QMessageBox.question(self, "SMTP Sending",
+                                         "Gmail only accepts SMTP sign-in with full mail access, which this sign-in did not grant.\n\n"
+                                         "Sign in again now to allow it?",
+                                         QMessageBox.Yes | QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                self.logout()
+                self.auto_authenticate(force=True, scopes=SCOPES + [SMTP_SCOPE])
+
+    def start_dry_run(self):
+        if self.worker:
+            ModernInfoDialog(self, "Campaign Running", "Wait for the current campaign to finish or stop it first.", "⚠️", "#FFC107").exec_()
+            return
+        if not self.list_drafts.currentItem():
+            ModernInfoDialog(self, "No Draft Selected", "Please select a Gmail draft for the dry run.", "⚠️", "#FFC107").exec_()
+            return
+        if not self.excel_path:
+            ModernInfoDialog(self, "No Excel File", "Please select an Excel file with recipients.", "⚠️", "#FFC107").exec_()
+            return
+        
+        reply = QMessageBox.question(self, "Dry Run",
+                                     "Every email is built but none is sent, and the Excel file is not changed.\n\n"
+                                     "Also save each message as an .eml file?",
+                                     QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+        if reply == QMessageBox.Cancel: return
+        eml_dir = None
+        if reply == QMessageBox.Yes:
+            eml_dir = QFileDialog.getExistingDirectory(self, "Folder for .eml Files")
+            if not eml_dir: return
+        
+        self.pending_send_args = {
+             'service': self.service,
+             'excel_path': self.excel_path,
+             'draft_id': self.drafts.get(self.list_drafts.currentItem().text()),
+             'start_row': 2,
+             'cc_mode': 'individual', # CC/BCC columns, as in the preview
+             'global_cc': '',
+             'bcc_mode': 'individual',
+             'global_bcc': '',
+             **self.sender_identity(), # display_name + user_email of the chosen From alias
+             'total_rows': None,
+             'attachment_empty_rule': getattr(self, 'attachment_empty_rule', 'yes'),
+             'dry_run': True,
+             'eml_dir': eml_dir,
+        }
+        self.log("🧪 Starting dry run - nothing will be sent.", "#6F42C1")
+        self.real_start_sending()
+
+    def on_dry_run_report(self, report):
+        ModernInfoDialog(self, "Dry Run Report", format_dry_run_report(report), "🧪", "#6F42C1").exec_()
+
+    def start_reconcile(self):
+        if self.reconciler and self.reconciler.isRunning():
+            ModernInfoDialog(self, "Reconciliation Running", "A reconciliation is already checking sent messages.", "⚠️", "#FFC107").exec_()
+            return
+        if not self.service:
+            QMessageBox.critical(self, "Error", "Authenticate first.")
+            return
+        if not self.excel_path:
+            ModernInfoDialog(self, "No Excel File", "Please select the Excel file of the campaign to reconcile.", "⚠️", "#FFC107").exec_()
+            return
+        if not os.path.exists(sent_log_path(self.excel_path)):
+            ModernInfoDialog(self, "Nothing to Reconcile", "No sent message ids are recorded for this Excel file yet.", "ℹ️", "#17A2B8").exec_()
+            return
+        self.reconciler = ReconcileWorker(self.service, self.excel_path, credentials=self.credential_manager,
+                                          busy=lambda: self.worker is not None or bool(self.campaign_manager.running()))
+        self.reconciler.log_signal.connect(self.log)
+        self.reconciler.finished_signal.connect(self.on_reconcile_report)
+        self.reconciler.start()
+
+    def on_reconcile_report(self, report):
+        ModernInfoDialog(self, "Delivery Reconciliation", format_reconcile_report(report), "🔎", "#17A2B8").exec_()
+
+    def start_response_tracking(self):
+        if not self.service:
+            QMessageBox.critical(self, "Error", "Authenticate first.")
+            return
+        if self.worker:
+            ModernInfoDialog(self, "Campaign Running", "Wait for the current campaign to finish or stop it first.", "⚠️", "#FFC107").exec_()
+            return
+        if not self.excel_path:
+            ModernInfoDialog(self, "No Excel File", "Please select the Excel file of the campaign to check.", "⚠️", "#FFC107").exec_()
+            return
+        if not os.path.exists(sent_log_path(self.excel_path)):
+            ModernInfoDialog(self, "Nothing to Check", "No sent message ids are recorded for this Excel file yet.", "ℹ️", "#17A2B8").exec_()
+            return
+        if self.response_tracker and self.response_tracker.isRunning(): return
+        self.response_tracker = ResponseTrackerWorker(self.service, self.excel_path)
+        self.response_tracker.log_signal.connect(self.log)
+        self.response_tracker.finished_signal.connect(self.on_response_report)
+        self.response_tracker.start()
+
+    def on_response_report(self, report):
+        if report['mode'] == 'baseline': return
+        msg = (f"Bounced: {report['bounces']}\nReplied: {report['replies']}\n"
+               f"Rows updated in the Response column: {report['rows_updated']}")
+        if report['suppressed']:
+            msg += f"\n\n{report['suppressed']} bounced address(es) added to the suppression list."
+        ModernInfoDialog(self, "Bounces & Replies", msg, "📬", "#17A2B8").exec_()
+        if report['rows_updated']: self.reload_excel()
+
+    def start_profiling(self):
+        folder = DIAGNOSTICS.start()
+        self.act_profile_start.setEnabled(False)
+        self.act_profile_stop.setEnabled(True)
+        self.log(f"🩺 Profiling enabled - only campaigns and workers started from now on are captured ({folder})", "#6F42C1")
+        if self.worker or self.campaign_manager.running():
+            self.log("ℹ️ Campaigns already running are not profiled; Stop/Resume them to include them.", "#6C757D")
+
+    def stop_profiling(self):
+        folder = DIAGNOSTICS.stop()
+        self.act_profile_start.setEnabled(True)
+        self.act_profile_stop.setEnabled(False)
+        if folder:
+            self.log(f"🩺 Profiling stopped. Profiles saved to {folder}", "#6F42C1")
+
+    def open_folder(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.abspath(folder)))
+
+    def import_suppression_list(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Suppression List", "", "Address Lists (*.txt *.csv *.xlsx)")
+        if not path: return
+        try:
+            if path.lower().endswith('.xlsx'):
+                wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+                text = "\n".join(str(v) for row in wb.active.iter_rows(values_only=True) for v in row if v)
+                wb.close()
+            else:
+                with open(path, encoding='utf-8', errors='ignore') as f:
+                    text = f.read()
+            addresses = re.findall(r'[^@\s<>(),;:"\[\]]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}', text)
+            added = SuppressionList().add(addresses, reason=os.path.basename(path))
+            self.log(f"🚫 Imported {added} address(es) into the suppression list.", "#6C757D")
+        except Exception as e:
+            self.log(f"⚠️ Suppression import failed: {e}", "#FFC107")
+
+    def add_suppressed_addresses(self):
+        dlg = ResizableInputDialog("Suppression List", "Addresses that must never be mailed:", self)
+        if dlg.exec_() == QDialog.Accepted and dlg.get_text():
+            addresses = [e.strip() for e in re.split(r'[,;\n\r]+', dlg.get_text()) if e.strip()]
+            added = SuppressionList().add(addresses)
+            self.log(f"🚫 Added {added} address(es) to the suppression list.", "#6C757D")
+
+    def clear_suppression_list(self):
+        suppression = SuppressionList()
+        count = suppression.count()
+        reply = QMessageBox.question(self, "Clear Suppression List",
+                                     f"Remove all {count} address(es) from the suppression list?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            suppression.clear()
+            self.log("🚫 Suppression list cleared.", "#6C757D")
+
     def show_contact_info(self):
         msg = "<b>Name:</b> Balvant Sharma<br><b>Email:</b> balavantsharma91@gmail.com"
         dlg = ModernInfoDialog(self, "Developer Contact", msg, "👨‍💻", "#17A2B8")
@@ -2334,6 +6621,13 @@ class MailMergeApp(QMainWindow):
     def update_progress(self, val):
         self.progress_bar.setValue(val)
 
+    def update_stats(self, snapshot):
+        self.stats_panel.update_snapshot(snapshot)
+
+    def log_stage_timings(self, snapshot):
+        stages = ", ".join(f"{k} {v['total_seconds']:.2f}s" for k, v in snapshot.get('stages', {}).items())
+        self.log(f"⏱ {snapshot.get('name')}: {stages}", "#6C757D")
+
     def manual_authenticate(self):
         if "Sign Out" in self.btn_auth.text():
             self.logout()
@@ -2349,6 +6643,14 @@ class MailMergeApp(QMainWindow):
             if os.path.exists(creds_file):
                 os.remove(creds_file)
             
+            self.campaign_manager.stop_all() # Managed campaigns belong to the signed-out account
+            if self.credential_manager: self.credential_manager.stop()
+            self.credential_manager = None
+            ProfileCache().clear()
+            DraftSync(None, None).clear()
+            self.combo_from.clear()
+            self.list_drafts.clear()
+            self.drafts = {}
             self.creds = None
             self.service = None
             self.user_email = None
@@ -2367,7 +6669,7 @@ class MailMergeApp(QMainWindow):
         except Exception as e:
             self.log(f"Logout Error: {e}", "#DC3545")
 
-    def auto_authenticate(self, force=False):
+    def auto_authenticate(self, force=False, scopes=None):
         # Show Skeleton Loader (Index 0)
         if hasattr(self, 'stack'):
             self.stack.setCurrentIndex(0)
@@ -2376,18 +6678,21 @@ class MailMergeApp(QMainWindow):
         self.btn_auth.setEnabled(False)
         self.btn_excel.setEnabled(False)
         
-        self.startup_worker = StartupWorker(force_auth=force)
+        self.startup_worker = StartupWorker(force_auth=force, scopes=scopes)
         # self.startup_worker.status_signal.connect(lambda s: self.overlay.show_loading(s)) # Disabled for Skeleton View
         self.startup_worker.log_signal.connect(self.log)
         self.startup_worker.auth_success.connect(self.on_startup_auth_success)
         self.startup_worker.drafts_loaded.connect(self.on_startup_drafts_loaded)
         self.startup_worker.error_signal.connect(self.on_startup_error)
+        self.startup_worker.metrics_signal.connect(self.log_stage_timings)
         self.startup_worker.finished.connect(self.on_startup_finished)
         self.startup_worker.start()
 
     def on_startup_auth_success(self, creds, service, user_data):
         self.creds = creds
         self.service = service
+        if self.credential_manager: self.credential_manager.stop()
+        self.credential_manager = CredentialManager(creds, resource_path('token.json')).start()
         self.display_name = user_data.get('name')
         self.user_email = user_data.get('email')
         
@@ -2396,24 +6701,12 @@ class MailMergeApp(QMainWindow):
         self.lbl_user.setStyleSheet("color: #0D6EFD; font-weight: bold; font-size: 20px; margin-bottom: 10px;")
         
         self.log(f"✅ Authenticated: {self.display_name}", "#0D6EFD")
+        self.set_sender_aliases(user_data.get('send_as', []))
         
         # Avatar
         if user_data.get('avatar_bytes'):
             try:
-                pixmap = QPixmap()
-                pixmap.loadFromData(user_data['avatar_bytes'])
-                
-                size = 50
-                rounded = QPixmap(size, size)
-                rounded.fill(Qt.transparent)
-                painter = QPainter(rounded)
-                painter.setRenderHint(QPainter.Antialiasing)
-                painter.setBrush(QBrush(pixmap.scaled(size, size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)))
-                painter.setPen(QPen(QColor("#DEE2E6"), 1))
-                painter.drawEllipse(0, 0, size-1, size-1)
-                painter.end()
-                
-                self.lbl_avatar.setPixmap(rounded)
+                self.set_avatar(user_data['avatar_bytes'])
             except: pass
             
         # UI State
@@ -2434,7 +6727,9 @@ class MailMergeApp(QMainWindow):
             # Fallback if somehow already dict (unlikely with current worker)
             self.drafts = raw_drafts
             
-        for item in formatted_list:
+        for label, draft_id in self.drafts.items():
+            item = QListWidgetItem(label)
+            item.setData(Qt.UserRole, draft_id)
             self.list_drafts.addItem(item)
         self.log("🔄 Drafts loaded.", "#007BFF")
 
@@ -2450,37 +6745,49 @@ class MailMergeApp(QMainWindow):
         self.btn_excel.setEnabled(True)
         self.startup_worker = None
 
+    def set_avatar(self, data):
+        pixmap = QPixmap()
+        pixmap.loadFromData(data)
+        
+        # Circular Mask (Header Size)
+        size = 50
+        rounded = QPixmap(size, size)
+        rounded.fill(Qt.transparent)
+        painter = QPainter(rounded)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setBrush(QBrush(pixmap.scaled(size, size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)))
+        painter.setPen(QPen(QColor("#DEE2E6"), 1)) # Thinner border
+        painter.drawEllipse(0, 0, size-1, size-1)
+        painter.end()
+        
+        self.lbl_avatar.setPixmap(rounded)
+
+    def set_sender_aliases(self, send_as):
+        self.combo_from.clear()
+        for alias in send_as:
+            label = f"{alias['name']} <{alias['email']}>" if alias.get('name') else alias['email']
+            self.combo_from.addItem(label, {'display_name': alias.get('name') or self.display_name, 'user_email': alias['email']})
+        self.combo_from.setVisible(self.combo_from.count() > 1) # Only worth a choice with more than one address
+
+    def sender_identity(self):
+        """{'display_name', 'user_email'} for the From line of the next campaign (the chosen send-as alias)."""
+        return self.combo_from.currentData() or {'display_name': self.display_name, 'user_email': self.user_email}
+
     def get_user_info(self):
         try:
-            profile = self.service.users().getProfile(userId='me').execute()
-            self.user_email = profile.get('emailAddress')
-            user_info = build('oauth2', 'v2', credentials=self.creds).userinfo().get().execute()
-            self.display_name = user_info.get('name')
+            user_data, _ = load_session_profile(self.service, self.creds)
+            self.user_email = user_data.get('email')
+            self.display_name = user_data.get('name')
             
             self.lbl_user.setText(f"{self.display_name}")
             self.lbl_user.setStyleSheet("color: #007BFF; font-weight: bold; font-size: 20px; margin-bottom: 10px;")
             self.log(f"✅ Authenticated: {self.display_name}", "#007BFF")
+            self.set_sender_aliases(user_data.get('send_as', []))
             
             # Load Profile Picture
-            photo_url = user_info.get('picture')
-            if photo_url:
+            if user_data.get('avatar_bytes'):
                 try:
-                    data = requests.get(photo_url).content
-                    pixmap = QPixmap()
-                    pixmap.loadFromData(data)
-                    
-                    # Circular Mask (Header Size)
-                    size = 50
-                    rounded = QPixmap(size, size)
-                    rounded.fill(Qt.transparent)
-                    painter = QPainter(rounded)
-                    painter.setRenderHint(QPainter.Antialiasing)
-                    painter.setBrush(QBrush(pixmap.scaled(size, size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)))
-                    painter.setPen(QPen(QColor("#DEE2E6"), 1)) # Thinner border
-                    painter.drawEllipse(0, 0, size-1, size-1)
-                    painter.end()
-                    
-                    self.lbl_avatar.setPixmap(rounded)
+                    self.set_avatar(user_data['avatar_bytes'])
                 except Exception as e:
                     self.log(f"⚠️ Failed to load avatar: {e}", "#FFC107")
 
@@ -2492,20 +6799,53 @@ class MailMergeApp(QMainWindow):
     def load_drafts(self):
         if not self.service: return
         try:
-            self.list_drafts.clear()
-            self.drafts = self.service.users().drafts().list(userId='me').execute().get('drafts', [])
-            for d in self.drafts:
-                detail = self.service.users().drafts().get(userId='me', id=d['id']).execute()
-                headers = detail['message']['payload']['headers']
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(No Subject)')
-                self.list_drafts.addItem(f"{subject} [ID: {d['id']}]")
-            self.log("🔄 Drafts refreshed.", "#007BFF")
+            sync = DraftSync(self.service, account_key(self.creds))
+            entries, mode = sync.sync()
+            changed = self.apply_draft_entries(entries)
+            if mode == 'unchanged':
+                self.log(f"🔄 Drafts up to date ({sync.requests} request).", "#007BFF")
+            else:
+                self.log(f"🔄 Drafts refreshed: {changed} changed ({'full resync' if mode == 'full' else 'incremental'}, "
+                         f"{sync.requests} request(s)).", "#007BFF")
         except Exception as e:
             self.log(f"Error loading drafts: {e}", "#DC3545")
 
+    def apply_draft_entries(self, entries):
+        """Patches list_drafts to [(draft_id, subject)], touching only rows that changed. Returns how many did."""
+        items = {}
+        for i in range(self.list_drafts.count()):
+            item = self.list_drafts.item(i)
+            draft_id = item.data(Qt.UserRole) or (self.drafts.get(item.text()) if isinstance(self.drafts, dict) else None)
+            items[draft_id] = item
+        wanted = {d for d, _ in entries}
+        changed = 0
+        for draft_id, item in list(items.items()):
+            if draft_id not in wanted:
+                self.list_drafts.takeItem(self.list_drafts.row(item))
+                changed += 1
+        for row, (draft_id, subject) in enumerate(entries):
+            label = draft_label(draft_id, subject)
+            item = items.get(draft_id)
+            if item is None:
+                item = QListWidgetItem(label)
+                item.setData(Qt.UserRole, draft_id)
+                self.list_drafts.insertItem(row, item)
+                changed += 1
+                continue
+            if item.text() != label:
+                item.setText(label)
+                changed += 1
+            if self.list_drafts.row(item) != row: # Follow Gmail's order
+                selected = item.isSelected()
+                self.list_drafts.insertItem(row, self.list_drafts.takeItem(self.list_drafts.row(item)))
+                item.setSelected(selected)
+        self.drafts = {draft_label(d, subject): d for d, subject in entries}
+        return changed
+
     def choose_excel(self):
         path, _ = QFileDialog.getOpenFileName(self, "Select Excel", "", "Excel Files (*.xlsx)")
         if path:
+            if path != self.excel_path: self.campaign_sheets = None # Sheet names belong to the previous file
             self.excel_path = path
             filename = os.path.basename(path)
             self.btn_excel.setText(f"Selected: {filename}")
@@ -2620,11 +6960,23 @@ class MailMergeApp(QMainWindow):
         draft_text = self.list_drafts.currentItem().text()
         draft_id = self.drafts.get(draft_text)
         
-        self.loader = DataLoadingWorker(self.service, draft_id, self.excel_path)
+        self.preflight_report = None
+        self.loader = DataLoadingWorker(self.service, draft_id, self.excel_path,
+                                        attachment_mode=self.chk_send_attachments.isChecked(),
+                                        attachment_empty_rule=getattr(self, 'attachment_empty_rule', 'yes'),
+                                        fold_plus=self.fold_plus_addresses, optimize_html=self.optimize_html,
+                                        optimize_images=self.optimize_images, sheets=self.campaign_sheets)
+        self.loader.preflight_ready.connect(self.on_preflight_ready)
+        self.loader.metrics_signal.connect(self.log_stage_timings)
         self.loader.data_loaded.connect(self.show_email_preview)
         self.loader.error_signal.connect(self.on_loader_error)
         self.loader.start()
 
+    def on_preflight_ready(self, report):
+        self.preflight_report = report
+        text, color = preflight_summary(report)
+        self.log(f"🛫 Pre-flight: {text} ({report['rows']} rows checked in {report['elapsed'] * 1000:.0f} ms)", color)
+
     def on_loader_error(self, err_msg):
         self.overlay.hide_loading()
         self.btn_process.setEnabled(True)
@@ -2641,7 +6993,8 @@ class MailMergeApp(QMainWindow):
         # Open Preview Dialog
         dlg = AdvancedPreviewDialog(self, draft_data, all_headers, visible_headers, rows, 
                                     cc_mode, global_cc, bcc_mode, global_bcc,
-                                    attachment_mode=self.chk_send_attachments.isChecked())
+                                    attachment_mode=self.chk_send_attachments.isChecked(),
+                                    preflight=getattr(self, 'preflight_report', None))
         
         dlg.start_sending.connect(lambda: self.on_preview_confirmed(draft_data['id'], cc_mode, global_cc, bcc_mode, global_bcc))
         dlg.exec_()
@@ -2659,8 +7012,7 @@ class MailMergeApp(QMainWindow):
              'global_cc': global_cc,
              'bcc_mode': bcc_mode,
              'global_bcc': global_bcc,
-             'display_name': self.display_name,
-             'user_email': self.user_email,
+             **self.sender_identity(), # display_name + user_email of the chosen From alias
              'total_rows': None 
         }
         
@@ -2724,6 +7076,9 @@ class MailMergeApp(QMainWindow):
         if not self.service or not self.excel_path:
             QMessageBox.critical(self, "Error", "Authenticate and select Excel file first.")
             return
+        if self.campaign_manager.is_busy(self.excel_path):
+            ModernInfoDialog(self, "Workbook In Use", "The Campaign Manager is sending from this Excel file. Stop it there first.", "⚠️", "#FFC107").exec_()
+            return
         
         items = self.list_drafts.selectedItems()
         if not items:
@@ -2739,10 +7094,22 @@ class MailMergeApp(QMainWindow):
              return
 
         start_row = 2
+        total_rows = None
+        retry_failed = False
         if resume:
             if os.path.exists(PROGRESS_FILE):
                 with open(PROGRESS_FILE) as f:
-                    start_row = json.load(f).get("last_row", 2)
+                    progress = json.load(f)
+                start_row = progress.get("last_row", 2)
+                if progress.get("excel_path") in (None, os.path.abspath(self.excel_path)):
+                    total_rows = progress.get("total_rows")
+                resume_index = ResumeIndex.load(self.excel_path)
+                failed = resume_index.failed_count() if resume_index else 0
+                if failed:
+                    reply = QMessageBox.question(self, "Retry Failed Emails",
+                                                 f"{failed} email(s) failed in the previous run.\nRetry them as well?",
+                                                 QMessageBox.Yes | QMessageBox.No)
+                    retry_failed = reply == QMessageBox.Yes
             else:
                 QMessageBox.information(self, "Info", "No progress file found. Starting from beginning.")
 
@@ -2771,9 +7138,9 @@ class MailMergeApp(QMainWindow):
              'global_cc': cc_val,
              'bcc_mode': bcc_mode,
              'global_bcc': bcc_val,
-             'display_name': self.display_name,
-             'user_email': self.user_email,
-             'total_rows': None # Will be updated if data loaded
+             **self.sender_identity(), # display_name + user_email of the chosen From alias
+             'total_rows': total_rows, # Will be updated if data loaded
+             'retry_failed': retry_failed
         }
         
         # Add Attachment Rule
@@ -2790,7 +7157,14 @@ class MailMergeApp(QMainWindow):
              self.btn_process.setEnabled(False)
              self.btn_resume.setEnabled(False)
              
-             self.data_loader = DataLoadingWorker(self.service, draft_id, self.excel_path)
+             self.preflight_report = None
+             self.data_loader = DataLoadingWorker(self.service, draft_id, self.excel_path,
+                                                  attachment_mode=self.chk_send_attachments.isChecked(),
+                                                  attachment_empty_rule=self.pending_send_args['attachment_empty_rule'],
+                                                  fold_plus=self.fold_plus_addresses, optimize_html=self.optimize_html,
+                                                  optimize_images=self.optimize_images, sheets=self.campaign_sheets)
+             self.data_loader.preflight_ready.connect(self.on_preflight_ready)
+             self.data_loader.metrics_signal.connect(self.log_stage_timings)
              self.data_loader.data_loaded.connect(self.on_data_loaded)
              self.data_loader.status_signal.connect(lambda s: self.log(f"📋 {s}", "#17A2B8"))
              self.data_loader.error_signal.connect(self.on_error)
@@ -2803,7 +7177,9 @@ class MailMergeApp(QMainWindow):
          
          dlg = AdvancedPreviewDialog(self, draft_data, all_headers, visible_headers, rows, 
                                      args['cc_mode'], args['global_cc'], 
-                                     args['bcc_mode'], args['global_bcc'])
+                                     args['bcc_mode'], args['global_bcc'],
+                                     attachment_mode=self.chk_send_attachments.isChecked(),
+                                     preflight=self.preflight_report)
          
          dlg.start_sending.connect(self.real_start_sending)
          
@@ -2828,15 +7204,37 @@ class MailMergeApp(QMainWindow):
             self.progress_bar.setValue(0) 
             self.apply_progress_style("#0d6efd")
 
+        self.dry_run_active = args.get('dry_run', False)
+        try:
+            if self.dry_run_active:
+                transport = DryRunTransport(args.get('eml_dir'))
+            else:
+                transport = create_transport(args.get('send_backend', self.send_backend), args['service'], self.credential_manager, self.user_email)
+        except Exception as e:
+            ModernInfoDialog(self, "Sending Backend Unavailable", str(e), "❌", "#DC3545").exec_()
+            self.on_finished(-1, -1)
+            return
+        # Same account-wide budget as the Campaign Manager's campaigns (a dry run sends nothing)
+        self.send_share = None if self.dry_run_active else self.campaign_manager.limiter.share()
+        
         self.worker = EmailWorker(
             args['service'], args['excel_path'], args['draft_id'], args['start_row'], 
             args['cc_mode'], args['global_cc'], args['bcc_mode'], args['global_bcc'],
             args['display_name'], args['user_email'], args.get('total_rows'), args.get('is_resume', False),
-            attachment_mode=self.chk_send_attachments.isChecked(),
-            attachment_empty_rule=args.get('attachment_empty_rule', 'yes')
+            attachment_mode=args.get('attachment_mode', self.chk_send_attachments.isChecked()),
+            attachment_empty_rule=args.get('attachment_empty_rule', 'yes'),
+            dedupe=args.get('dedupe', self.dedupe_recipients), fold_plus=args.get('fold_plus', self.fold_plus_addresses),
+            transport=transport, schedule=args.get('schedule'), not_before=args.get('not_before'),
+            retry_failed=args.get('retry_failed', False), dry_run=self.dry_run_active,
+            optimize_html=args.get('optimize_html', self.optimize_html),
+            optimize_images=args.get('optimize_images', self.optimize_images),
+            sheets=args.get('sheets', self.campaign_sheets), rate_limiter=self.send_share
         )
         self.worker.log_signal.connect(self.log)
         self.worker.progress_signal.connect(self.update_progress)
+        self.worker.metrics_signal.connect(self.update_stats)
+        self.worker.dry_run_report_signal.connect(self.on_dry_run_report)
+        self.stats_panel.setVisible(True)
         # Removed preview_signal connection
         self.worker.live_preview_signal.connect(self.handle_live_preview_update)
         self.worker.stopped_signal.connect(self.on_stopped_stats)
@@ -2908,6 +7306,9 @@ class MailMergeApp(QMainWindow):
                 elif display_status == "Sending...":
                     item.setBackground(QColor("#FFF3CD")) # Light Yellow
                     item.setForeground(QColor("#856404"))
+                elif display_status == "Skipped":
+                    item.setBackground(QColor("#E9ECEF")) # Light Grey
+                    item.setForeground(QColor("#6C757D"))
                 
                 self.table_preview.setItem(r_idx, status_col_idx, item)
         
@@ -3024,20 +7425,20 @@ class MailMergeApp(QMainWindow):
         empty_rows = []
         try:
             wb = openpyxl.load_workbook(self.excel_path, data_only=True)
-            ws = wb.active
-            headers = [str(c.value).strip().lower() for c in ws[1]]
-            
-            # Identify columns
-            col_email = -1
-            col_name = -1
-            col_att = -1
-            
-            for i, h in enumerate(headers):
-                if h == 'email': col_email = i
-                if h == 'name': col_name = i
-                if h in ['attachment', 'attachments', 'send attachments', 'send attachment']: col_att = i
-            
-            if col_att != -1:
+            for ws in resolve_campaign_sheets(wb, self.campaign_sheets):
+                headers = [str(c.value).strip().lower() for c in ws[1]]
+                
+                # Identify columns (per sheet: column order may differ)
+                col_email = -1
+                col_name = -1
+                col_att = -1
+                
+                for i, h in enumerate(headers):
+                    if h == 'email': col_email = i
+                    if h == 'name': col_name = i
+                    if h in ['attachment', 'attachments', 'send attachments', 'send attachment']: col_att = i
+                
+                if col_att == -1: continue
                 # Scan
                 for row in ws.iter_rows(min_row=2, values_only=True):
                     # Check Attachment Value
@@ -3052,6 +7453,7 @@ class MailMergeApp(QMainWindow):
                              empty_rows.append([name if name else "(No Name)", email])
                         
                         if len(empty_rows) > 50: break # Limit
+                if len(empty_rows) > 50: break
             
         except: pass
         return empty_rows
@@ -3084,6 +7486,7 @@ class MailMergeApp(QMainWindow):
     def stop_process(self):
         if self.worker:
             self.worker.stop()
+            if self.send_share: self.send_share.close() # Wakes a send waiting for quota
             self.btn_stop.setEnabled(False) # Immediately disable stop button
             self.log("🛑 Stop requested...", "#FFA500")
             
@@ -3107,6 +7510,20 @@ class MailMergeApp(QMainWindow):
             
         self.btn_stop.setEnabled(False)
         self.worker = None # Cleanup worker reference
+        if self.send_share:
+            self.send_share.close() # Its part of the account budget goes back to managed campaigns
+            self.send_share = None
+        
+        if self.active_campaign_id is not None:
+            CampaignQueue().update(self.active_campaign_id, status='done' if sent != -1 else 'stopped')
+            self.active_campaign_id = None
+            QTimer.singleShot(0, self.check_scheduled_campaigns) # Next queued campaign, if due
+        
+        if self.dry_run_active:
+            # Report dialog already shown; session totals only count real sends
+            self.dry_run_active = False
+            self.apply_progress_style("#6F42C1" if sent != -1 else "#DC3545")
+            return
         
         # Change Color to GREEN if finished successfully (sent != -1)
         if sent != -1:
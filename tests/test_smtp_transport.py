@@ -0,0 +1,236 @@
+"""
+SmtpTransport against a local aiosmtpd server: XOAUTH2 sign-in, connection reuse, Message-ID
+stamping and how SMTP replies map onto TransportError.
+
+    pip install pytest aiosmtpd
+    python -m pytest -q tests
+"""
+import base64
+import email
+import importlib.util
+import os
+import socket
+import sys
+import types
+from email.mime.text import MIMEText
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+APP_PATH = Path(__file__).resolve().parent.parent / "Mail_Merge_Pro 14.0.py"
+
+
+@pytest.fixture(scope="session")
+def mm():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+    try:
+        import PyQt5.QtWebEngineWidgets  # noqa: F401
+    except ImportError:
+        # The preview pane is not used here; headless machines often lack QtWebEngine's libraries
+        stand_in = types.ModuleType("PyQt5.QtWebEngineWidgets")
+        stand_in.QWebEngineView = QtWidgets.QTextEdit
+        sys.modules["PyQt5.QtWebEngineWidgets"] = stand_in
+    spec = importlib.util.spec_from_file_location("mail_merge_pro", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Handler:
+    """Records XOAUTH2 logins and delivered mail; `mail_reply` makes MAIL FROM answer with an error."""
+
+    def __init__(self):
+        self.auths = []
+        self.delivered = []
+        self.valid_tokens = {"good"}
+        self.mail_reply = None
+
+    async def auth_XOAUTH2(self, server, args):
+        decoded = base64.b64decode(args[1]).decode() if len(args) > 1 else ""
+        self.auths.append(decoded)
+        token = decoded.split("auth=Bearer ")[-1].split("\x01")[0]
+        return AuthResult(success=token in self.valid_tokens, handled=False)
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        if self.mail_reply: return self.mail_reply
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.append((envelope.mail_from, list(envelope.rcpt_tos), envelope.content))
+        return "250 OK"
+
+
+class FakeCredentials:
+    """The parts of CredentialManager SmtpTransport uses."""
+
+    def __init__(self, token, scopes):
+        self.token = token
+        self.creds = types.SimpleNamespace(scopes=scopes)
+        self.refreshes = 0
+
+    def refresh(self, stale=None):
+        self.refreshes += 1
+        self.token = "good"
+        return self.token
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    handler = Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port(), auth_require_tls=False,
+                            auth_exclude_mechanism=["LOGIN", "PLAIN"])
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+def make_transport(mm, port, token="good", **kwargs):
+    credentials = FakeCredentials(token, mm.SCOPES + [mm.SMTP_SCOPE])
+    transport = mm.SmtpTransport(credentials, "me@example.com", host="127.0.0.1", port=port, starttls=False, **kwargs)
+    return transport, credentials
+
+
+def message(to):
+    msg = MIMEText("hello")
+    msg["From"] = "Me <me@example.com>"
+    msg["To"] = to
+    msg["Subject"] = "Hi"
+    return msg
+
+
+def test_xoauth2_login_and_connection_reuse(mm, server):
+    handler, port = server
+    transport, _ = make_transport(mm, port, pool_size=1)
+    try:
+        for n in range(5):
+            msg = message(f"user{n}@example.com")
+            transport.submit(msg.as_bytes(), msg).result(timeout=10)
+    finally:
+        transport.close()
+    assert handler.auths == ["user=me@example.com\x01auth=Bearer good\x01\x01"]
+    assert transport.stats == {"messages": 5, "sessions": 1, "reconnects": 0}
+    assert [rcpts for _, rcpts, _ in handler.delivered] == [[f"user{n}@example.com"] for n in range(5)]
+
+
+def test_session_reopened_after_per_session_limit(mm, server):
+    handler, port = server
+    transport, _ = make_transport(mm, port, pool_size=1, per_session=2)
+    try:
+        for n in range(5):
+            msg = message(f"user{n}@example.com")
+            transport.submit(msg.as_bytes(), msg).result(timeout=10)
+    finally:
+        transport.close()
+    assert transport.stats["sessions"] == 3
+    assert len(handler.auths) == 3
+
+
+def test_rejected_token_is_refreshed_once(mm, server):
+    handler, port = server
+    transport, credentials = make_transport(mm, port, token="stale", pool_size=1)
+    try:
+        msg = message("user@example.com")
+        transport.submit(msg.as_bytes(), msg).result(timeout=10)
+    finally:
+        transport.close()
+    assert credentials.refreshes == 1
+    assert [a.split("auth=Bearer ")[1].split("\x01")[0] for a in handler.auths] == ["stale", "good"]
+    assert len(handler.delivered) == 1
+
+
+def test_response_id_is_the_stamped_message_id(mm, server):
+    handler, port = server
+    transport, _ = make_transport(mm, port, pool_size=1)
+    try:
+        msg = message("user@example.com")
+        raw = msg.as_bytes()
+        response = transport.submit(raw, msg).result(timeout=10)
+        retried = transport.submit(raw, msg).result(timeout=10) # A retry sends the same bytes again
+    finally:
+        transport.close()
+    delivered = [email.message_from_bytes(content) for _, _, content in handler.delivered]
+    assert response["id"].startswith("<") and response["id"].endswith("@example.com>")
+    assert [m["Message-ID"] for m in delivered] == [response["id"], response["id"]]
+    assert retried["id"] == response["id"]
+    assert mm.is_header_message_id(response["id"])
+
+
+def test_temporary_reply_maps_to_429(mm, server):
+    handler, port = server
+    handler.mail_reply = "451 4.3.0 Try again later"
+    transport, _ = make_transport(mm, port, pool_size=1)
+    try:
+        msg = message("user@example.com")
+        with pytest.raises(mm.TransportError) as caught:
+            transport.submit(msg.as_bytes(), msg).result(timeout=10)
+    finally:
+        transport.close()
+    assert caught.value.status == 429
+    assert caught.value.reason == "smtpTemporaryFailure"
+    assert mm.is_throttle_error(caught.value)
+
+
+def test_permanent_reply_is_a_failure(mm, server):
+    handler, port = server
+    handler.mail_reply = "550 5.7.1 Message rejected"
+    transport, _ = make_transport(mm, port, pool_size=1)
+    try:
+        msg = message("user@example.com")
+        with pytest.raises(mm.TransportError) as caught:
+            transport.submit(msg.as_bytes(), msg).result(timeout=10)
+    finally:
+        transport.close()
+    assert caught.value.status == 400
+    assert caught.value.reason == "smtpRejected"
+    assert not mm.is_throttle_error(caught.value)
+    assert not handler.delivered
+
+
+def test_unreachable_server_is_retried(mm):
+    transport, _ = make_transport(mm, free_port(), pool_size=1) # Nothing listens there
+    try:
+        msg = message("user@example.com")
+        with pytest.raises(mm.TransportError) as caught:
+            transport.submit(msg.as_bytes(), msg).result(timeout=10)
+    finally:
+        transport.close()
+    assert caught.value.status == 503
+    assert mm.is_throttle_error(caught.value)
+
+
+def test_rejected_sign_in_is_not_retried(mm, server):
+    handler, port = server
+    handler.valid_tokens = set() # Even the refreshed token is refused
+    transport, credentials = make_transport(mm, port, token="stale", pool_size=1)
+    try:
+        msg = message("user@example.com")
+        with pytest.raises(mm.TransportError) as caught:
+            transport.submit(msg.as_bytes(), msg).result(timeout=10)
+    finally:
+        transport.close()
+    assert credentials.refreshes == 1
+    assert caught.value.reason == "smtpAuthFailed"
+    assert not mm.is_throttle_error(caught.value)
+    assert not transport.connections
+
+
+def test_smtp_backend_needs_the_account(mm):
+    credentials = FakeCredentials("good", mm.SCOPES + [mm.SMTP_SCOPE])
+    with pytest.raises(RuntimeError):
+        mm.create_transport('smtp', None, credentials)
+    transport = mm.create_transport('smtp', None, credentials, "me@example.com") # No API call to look it up
+    assert transport.account == "me@example.com"
+    transport.close()